@@ -51,6 +51,8 @@ class Base(QtCore.QObject, Fysom):
     _modtype = 'base'
     _in = dict()
     _out = dict()
+    # names of IN connectors which may stay empty
+    _in_optional = ()
 
     def __init__(self, manager, name, config=None, callbacks=None, **kwargs):
         """ Initialise Base class object and set up its state machine.
@@ -114,6 +116,7 @@ class Base(QtCore.QObject, Fysom):
             self.connector['in'][con] = OrderedDict()
             self.connector['in'][con]['class'] = self._in[con]
             self.connector['in'][con]['object'] = None
+            self.connector['in'][con]['optional'] = con in self._in_optional
 
         self.connector['out'] = OrderedDict()
         for con in self._out:
@@ -275,10 +278,11 @@ class Base(QtCore.QObject, Fysom):
         """ Return module connected to the given named connector.
           @param str connector_name: name of the connector
 
-          @return obj: module that is connected to the named connector
+          @return obj: module that is connected to the named connector, None
+                       for an optional connector which is not connected
         """
         obj = self.connector['in'][connector_name]['object']
-        if obj is None:
+        if obj is None and not self.connector['in'][connector_name]['optional']:
             raise TypeError('No module connected')
         return obj
 
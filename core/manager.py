@@ -659,7 +659,7 @@ class Manager(QtCore.QObject):
 
         # check that all IN connectors are connected
         for c, v in self.tree['loaded'][base][mkey].connector['in'].items():
-            if v['object'] is None:
+            if v['object'] is None and not v.get('optional', False):
                 logger.error('IN connector {} of module {}.{} is empty, '
                              'connection not complete.'.format(c, base, mkey))
                 return -1
@@ -298,6 +298,13 @@ class ConfocalGui(GUIBase):
         self.scan_line_plot = pg.PlotDataItem(data, pen=pg.mkPen(palette.c1))
         self._mw.scanLineGraphicsView.addItem(self.scan_line_plot)
 
+        # Hide the projections of the volume scan, they are filled slice by
+        # slice once a volume scan runs
+        self._mw.volumeDockWidget.hide()
+        self.volume_image = pg.ImageItem()
+        self._mw.volume_ViewWidget.addItem(self.volume_image)
+        self._mw.volume_ViewWidget.setAspectLocked(True)
+
         ###################################################################
         #               Configuration of the optimizer tab                #
         ###################################################################
@@ -516,6 +523,8 @@ class ConfocalGui(GUIBase):
         self._mw.action_scan_xy_resume.triggered.connect(self.continue_xy_scan_clicked)
         self._mw.action_scan_depth_start.triggered.connect(self.depth_scan_clicked)
         self._mw.action_scan_depth_resume.triggered.connect(self.continue_depth_scan_clicked)
+        self._mw.action_scan_volume_start.triggered.connect(self.volume_scan_clicked)
+        self._mw.action_scan_volume_resume.triggered.connect(self.continue_volume_scan_clicked)
         #self._mw.actionRotated_depth_scan.triggered.connect(self.rotate_depth_scan_clicked)
 
         self._mw.action_optimize_position.triggered.connect(self.refocus_clicked)
@@ -584,6 +593,8 @@ class ConfocalGui(GUIBase):
         self._optimizer_logic.signal_image_updated.connect(self.refresh_refocus_image)
         self._scanning_logic.sigImageXYInitialized.connect(self.adjust_xy_window)
         self._scanning_logic.sigImageDepthInitialized.connect(self.adjust_depth_window)
+        self._scanning_logic.sigVolumeSliceFinished.connect(self.refresh_volume_projection)
+        self._mw.volume_projection_ComboBox.currentIndexChanged.connect(self.refresh_volume_projection)
 
         # Connect the signal from the logic with an update of the cursor position
         self._scanning_logic.signal_change_position.connect(self.update_crosshair_position_from_logic)
@@ -645,6 +656,7 @@ class ConfocalGui(GUIBase):
         self.xy_image.setLookupTable(self.my_colors.lut)
         self.depth_image.setLookupTable(self.my_colors.lut)
         self.xy_refocus_image.setLookupTable(self.my_colors.lut)
+        self.volume_image.setLookupTable(self.my_colors.lut)
 
         # Create colorbars and add them at the desired place in the GUI. Add
         # also units to the colorbar.
@@ -713,6 +725,8 @@ class ConfocalGui(GUIBase):
         self._osd.rejected.connect(self.keep_former_optimizer_settings)
         self._osd.buttonBox.button(QtWidgets.QDialogButtonBox.Apply).clicked.connect(self.update_optimizer_settings)
 
+        self._osd.xy_refocus_method_ComboBox.addItems(list(self._optimizer_logic.xy_refocus_methods))
+
         # Generation of the fit params tab ##################
         self._osd.fit_tab = FitSettingsWidget(self._optimizer_logic.z_params)
         self._osd.settings_tabWidget.addTab(self._osd.fit_tab, "Fit Params")
@@ -858,6 +872,8 @@ class ConfocalGui(GUIBase):
 
         self._mw.action_scan_xy_resume.setEnabled(False)
         self._mw.action_scan_depth_resume.setEnabled(False)
+        self._mw.action_scan_volume_start.setEnabled(False)
+        self._mw.action_scan_volume_resume.setEnabled(False)
 
         self._mw.action_optimize_position.setEnabled(False)
 
@@ -887,6 +903,7 @@ class ConfocalGui(GUIBase):
         # Enable the scan buttons
         self._mw.action_scan_xy_start.setEnabled(True)
         self._mw.action_scan_depth_start.setEnabled(True)
+        self._mw.action_scan_volume_start.setEnabled(True)
 #        self._mw.actionRotated_depth_scan.setEnabled(True)
 
         self._mw.action_optimize_position.setEnabled(True)
@@ -919,6 +936,9 @@ class ConfocalGui(GUIBase):
         else:
             self._mw.action_scan_xy_resume.setEnabled(False)
 
+        self._mw.action_scan_volume_resume.setEnabled(
+            self._scanning_logic.volume_directory is not None)
+
     def _refocus_finished_wrapper(self, caller_tag, optimal_pos):
         """ Re-enable the scan buttons in the GUI.
           @param str caller_tag: tag showing the origin of the action
@@ -960,6 +980,10 @@ class ConfocalGui(GUIBase):
         self._scanning_logic.set_clock_frequency(self._sd.clock_frequency_InputWidget.value())
         self._scanning_logic.return_slowness = self._sd.return_slowness_InputWidget.value()
         self._scanning_logic.permanent_scan = self._sd.loop_scan_CheckBox.isChecked()
+        if self._scanning_logic.set_bidirectional_scan(
+                self._sd.bidirectional_scan_CheckBox.isChecked(),
+                self._sd.turnaround_points_SpinBox.value()) < 0:
+            self._sd.bidirectional_scan_CheckBox.setChecked(self._scanning_logic.bidirectional_scan)
         self._scanning_logic.depth_scan_dir_is_xz = self._sd.depth_dir_x_radioButton.isChecked()
         self.fixed_aspect_ratio_xy = self._sd.fixed_aspect_xy_checkBox.isChecked()
         self.fixed_aspect_ratio_depth = self._sd.fixed_aspect_depth_checkBox.isChecked()
@@ -974,6 +998,8 @@ class ConfocalGui(GUIBase):
         self._sd.clock_frequency_InputWidget.setValue(int(self._scanning_logic._clock_frequency))
         self._sd.return_slowness_InputWidget.setValue(int(self._scanning_logic.return_slowness))
         self._sd.loop_scan_CheckBox.setChecked(self._scanning_logic.permanent_scan)
+        self._sd.bidirectional_scan_CheckBox.setChecked(self._scanning_logic.bidirectional_scan)
+        self._sd.turnaround_points_SpinBox.setValue(int(self._scanning_logic.turnaround_points))
         if self._scanning_logic.depth_scan_dir_is_xz:
             self._sd.depth_dir_x_radioButton.setChecked(True)
         else:
@@ -999,6 +1025,7 @@ class ConfocalGui(GUIBase):
         self._optimizer_logic.return_slowness = self._osd.return_slow_SpinBox.value()
         self._optimizer_logic.hw_settle_time = self._osd.hw_settle_time_SpinBox.value() / 1000
         self._optimizer_logic.do_surface_subtraction = self._osd.do_surface_subtraction_CheckBox.isChecked()
+        self._optimizer_logic.xy_refocus_method = self._osd.xy_refocus_method_ComboBox.currentText()
 
         self._optimizer_logic.optimization_sequence = str(self._osd.optimization_sequence_lineEdit.text()).upper().replace(" ", "").split(',')
 
@@ -1018,6 +1045,7 @@ class ConfocalGui(GUIBase):
         self._osd.return_slow_SpinBox.setValue(self._optimizer_logic.return_slowness)
         self._osd.hw_settle_time_SpinBox.setValue(self._optimizer_logic.hw_settle_time * 1000)
         self._osd.do_surface_subtraction_CheckBox.setChecked(self._optimizer_logic.do_surface_subtraction)
+        self._osd.xy_refocus_method_ComboBox.setCurrentText(self._optimizer_logic.xy_refocus_method)
 
         self._osd.optimization_sequence_lineEdit.setText(', '.join(self._optimizer_logic.optimization_sequence))
 
@@ -1056,6 +1084,20 @@ class ConfocalGui(GUIBase):
         self.disable_scan_actions()
         self._scanning_logic.start_scanning(zscan=True)
 
+    def volume_scan_clicked(self):
+        """ Start a volume scan over the xy and depth ranges. """
+        self.disable_scan_actions()
+        self._mw.volumeDockWidget.show()
+        if self._scanning_logic.start_volume_scan() < 0:
+            self.enable_scan_actions()
+
+    def continue_volume_scan_clicked(self):
+        """ Continue the last volume scan. """
+        self.disable_scan_actions()
+        self._mw.volumeDockWidget.show()
+        if self._scanning_logic.resume_volume_scan() < 0:
+            self.enable_scan_actions()
+
     def refocus_clicked(self):
         """ Start optimize position. """
         self.disable_scan_actions()
@@ -1541,6 +1583,38 @@ class ConfocalGui(GUIBase):
         if self._scanning_logic.getState() != 'locked':
             self.enable_scan_actions()
 
+    def refresh_volume_projection(self):
+        """ Show the selected maximum intensity projection of the volume scan.
+
+        It is updated after every slice of the volume, slices which are not
+        scanned yet are drawn in the color of the lowest counts.
+        """
+        projections = self._scanning_logic.get_volume_projections()
+        if projections is None:
+            return
+        logic = self._scanning_logic
+        index = self._mw.volume_projection_ComboBox.currentIndex()
+        key, h_range, v_range, h_label, v_label = (
+            ('xy', logic.image_x_range, logic.image_y_range, 'X position', 'Y position'),
+            ('xz', logic.image_x_range, logic.image_z_range, 'X position', 'Z position'),
+            ('yz', logic.image_y_range, logic.image_z_range, 'Y position', 'Z position'))[index]
+        image = np.array(projections[key], dtype=float)
+
+        scanned = np.isfinite(image)
+        if np.any(scanned):
+            cb_min = np.min(image[scanned])
+            cb_max = np.max(image[scanned])
+        else:
+            cb_min, cb_max = 0, 1
+        if cb_max <= cb_min:
+            cb_max = cb_min + 1
+        self.volume_image.setImage(image=np.where(scanned, image, cb_min).transpose(),
+                                   levels=(cb_min, cb_max))
+        self.volume_image.setRect(QtCore.QRectF(h_range[0], v_range[0],
+                                                h_range[1] - h_range[0], v_range[1] - v_range[0]))
+        self._mw.volume_ViewWidget.setLabel('bottom', h_label, units='µm')
+        self._mw.volume_ViewWidget.setLabel('left', v_label, units='µm')
+
     def refresh_depth_image(self):
         """ Update the current Depth image from the logic.
 
@@ -1884,6 +1958,7 @@ class ConfocalGui(GUIBase):
         self._mw.optimizer_dockWidget.show()
         self._mw.tilt_correction_dockWidget.hide()
         self._mw.scanLineDockWidget.hide()
+        self._mw.volumeDockWidget.hide()
 
         # re-dock any floating dock widgets
         self._mw.xy_scan_dockWidget.setFloating(False)
@@ -1892,6 +1967,7 @@ class ConfocalGui(GUIBase):
         self._mw.optimizer_dockWidget.setFloating(False)
         self._mw.tilt_correction_dockWidget.setFloating(False)
         self._mw.scanLineDockWidget.setFloating(False)
+        self._mw.volumeDockWidget.setFloating(False)
 
         self._mw.addDockWidget(QtCore.Qt.DockWidgetArea(1), self._mw.xy_scan_dockWidget)
         self._mw.addDockWidget(QtCore.Qt.DockWidgetArea(8), self._mw.scan_control_dockWidget)
@@ -1899,6 +1975,7 @@ class ConfocalGui(GUIBase):
         self._mw.addDockWidget(QtCore.Qt.DockWidgetArea(2), self._mw.optimizer_dockWidget)
         self._mw.addDockWidget(QtCore.Qt.DockWidgetArea(8), self._mw.tilt_correction_dockWidget)
         self._mw.addDockWidget(QtCore.Qt.DockWidgetArea(2), self._mw.scanLineDockWidget)
+        self._mw.addDockWidget(QtCore.Qt.DockWidgetArea(2), self._mw.volumeDockWidget)
 
         # Resize window to default size
         self._mw.resize(1255, 939)
@@ -97,33 +97,27 @@ class CounterGui(GUIBase):
         self._pw.setLabel('left', 'Fluorescence', units='counts/s')
         self._pw.setLabel('bottom', 'Time', units='s')
 
-        # Create an empty plot curve to be filled later, set its pen
-        self._curve1 = pg.PlotDataItem(pen=pg.mkPen(palette.c1),#, style=QtCore.Qt.DotLine),
-                                       symbol=None
-                                       #symbol='o',
-                                       #symbolPen=palette.c1,
-                                       #symbolBrush=palette.c1,
-                                       #symbolSize=5
-                                       )
-        self._curve2 = pg.PlotDataItem(pen=pg.mkPen(palette.c2, width=3), symbol=None)
-
-        self._pw.addItem(self._curve1)
-        self._pw.addItem(self._curve2)
-
-        # TODO: This is pretty bad, to directly inquire about the HW device from the GUI via the
-        #       logic.  There needs to be a much better way to do this!
-        if hasattr(self._counting_logic._counting_device, '_photon_source2'):
-            if self._counting_logic._counting_device._photon_source2 is not None:
-                self._curve3 = pg.PlotDataItem(pen=pg.mkPen(palette.c3, style=QtCore.Qt.DotLine),
-                                               symbol='s',
-                                               symbolPen=palette.c3,
-                                               symbolBrush=palette.c3,
-                                               symbolSize=5
-                                               )
-                self._curve4 = pg.PlotDataItem(pen=pg.mkPen(palette.c4, width=3), symbol=None)
-
-                self._pw.addItem(self._curve3)
-                self._pw.addItem(self._curve4)
+        # Create empty plot curves to be filled later, one raw and one smoothed
+        # curve for each counter channel. The colors repeat after three channels.
+        colors = [(palette.c1, palette.c2), (palette.c3, palette.c4), (palette.c5, palette.c6)]
+        self._curves = []
+        self._smoothed_curves = []
+        for index, channel in enumerate(self._counting_logic.get_channels()):
+            raw_color, smoothed_color = colors[index % len(colors)]
+            if index == 0:
+                curve = pg.PlotDataItem(pen=pg.mkPen(raw_color), symbol=None)
+            else:
+                curve = pg.PlotDataItem(pen=pg.mkPen(raw_color, style=QtCore.Qt.DotLine),
+                                        symbol='s',
+                                        symbolPen=raw_color,
+                                        symbolBrush=raw_color,
+                                        symbolSize=5
+                                        )
+            smoothed_curve = pg.PlotDataItem(pen=pg.mkPen(smoothed_color, width=3), symbol=None)
+            self._pw.addItem(curve)
+            self._pw.addItem(smoothed_curve)
+            self._curves.append(curve)
+            self._smoothed_curves.append(smoothed_curve)
 
         # setting the x axis length correctly
         self._pw.setXRange(
@@ -178,26 +172,18 @@ class CounterGui(GUIBase):
 
         if self._counting_logic.getState() == 'locked':
             self._mw.count_value_Label.setText(
-                '{0:,.0f}'.format(self._counting_logic.countdata_smoothed[-1])
+                '{0:,.0f}'.format(self._counting_logic.get_current_counts()[0])
             )
 
-            x_vals = (np.arange(0, self._counting_logic.get_count_length())
-                      / self._counting_logic.get_count_frequency()
-                      )
-
-            self._curve1.setData(y=self._counting_logic.countdata, x=x_vals)
-            self._curve2.setData(y=self._counting_logic.countdata_smoothed, x=x_vals)
-
-            # TODO: This is pretty bad, to directly inquire about the HW device from the GUI via
-            #       the logic.  There needs to be a much better way to do this!
-            if hasattr(self._counting_logic._counting_device, '_photon_source2'):
-                if self._counting_logic._counting_device._photon_source2 is not None:
-                    self._curve3.setData(y=self._counting_logic.countdata2,
-                                         x=x_vals
-                                         )
-                    self._curve4.setData(y=self._counting_logic.countdata_smoothed2,
-                                         x=x_vals
-                                         )
+            # only request as many points as the plot has pixels to show them
+            max_points = max(2 * int(self._pw.plotItem.vb.width()), 100)
+            x_vals, countdata, x_vals_smoothed, countdata_smoothed = \
+                self._counting_logic.get_display_data(max_points)
+
+            for curve, smoothed_curve, trace, smoothed_trace in zip(
+                    self._curves, self._smoothed_curves, countdata, countdata_smoothed):
+                curve.setData(y=trace, x=x_vals)
+                smoothed_curve.setData(y=smoothed_trace, x=x_vals_smoothed)
 
         if self._counting_logic.get_saving_state():
             self._mw.record_counts_Action.setText('Save')
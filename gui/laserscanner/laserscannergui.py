@@ -295,7 +295,7 @@ class VoltScanGui(GUIBase):
 #        self.refresh_odmr_colorbar()
 
 
-        odmr_image_data = self._odmr_logic.ODMR_plot_xy.transpose()
+        odmr_image_data = np.nan_to_num(self._odmr_logic.ODMR_plot_xy.transpose())
 
         # If "Centiles" is checked, adjust colour scaling automatically to centiles.
         # Otherwise, take user-defined values.
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains the Qudi gui module to browse the mosaic of confocal scans.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+import os
+import pyqtgraph as pg
+
+from qtpy import QtCore
+from qtpy import QtWidgets
+from qtpy import uic
+
+from gui.guibase import GUIBase
+from gui.guiutils import ColorBar
+from gui.colordefs import ColorScaleInferno
+
+
+class MosaicMainWindow(QtWidgets.QMainWindow):
+
+    """ Create the Main Window based on the *.ui file. """
+
+    def __init__(self):
+        # Get the path to the *.ui file
+        this_dir = os.path.dirname(__file__)
+        ui_file = os.path.join(this_dir, 'ui_mosaicgui.ui')
+
+        # Load it
+        super().__init__()
+        uic.loadUi(ui_file, self)
+        self.show()
+
+
+class MosaicGui(GUIBase):
+
+    """ Shows the part of the mosaic in the current view. Only the tiles in the
+    view are loaded, in the resolution the plot can show.
+    """
+    _modclass = 'mosaicgui'
+    _modtype = 'gui'
+
+    # declare connectors
+    _in = {'mosaiclogic1': 'MosaicLogic'}
+
+    def __init__(self, config, **kwargs):
+        super().__init__(config=config, **kwargs)
+
+        self.log.info('The following configuration was found.')
+
+        # checking for the right configuration
+        for key in config.keys():
+            self.log.info('{0}: {1}'.format(key, config[key]))
+
+    def on_activate(self, e=None):
+        """ Definition and initialisation of the GUI.
+
+        @param object e: Fysom.event object from Fysom class.
+        """
+        self._mosaic_logic = self.get_in_connector('mosaiclogic1')
+
+        self._mw = MosaicMainWindow()
+        self._mw.centralwidget.hide()
+        self._mw.setDockNestingEnabled(True)
+
+        self._pw = self._mw.mosaic_PlotWidget
+        self._pw.setLabel('bottom', 'X position', units='µm')
+        self._pw.setLabel('left', 'Y position', units='µm')
+        self._pw.setAspectLocked(lock=True, ratio=1.0)
+
+        self.my_colors = ColorScaleInferno()
+        self.mosaic_image = pg.ImageItem()
+        self.mosaic_image.setLookupTable(self.my_colors.lut)
+        self._pw.addItem(self.mosaic_image)
+
+        self.mosaic_cb = ColorBar(self.my_colors.cmap_normed, width=100, cb_min=0, cb_max=100)
+        self._mw.mosaic_cb_PlotWidget.addItem(self.mosaic_cb)
+        self._mw.mosaic_cb_PlotWidget.hideAxis('bottom')
+        self._mw.mosaic_cb_PlotWidget.setLabel('left', 'Fluorescence', units='c/s')
+        self._mw.mosaic_cb_PlotWidget.setMouseEnabled(x=False, y=False)
+
+        # zooming and panning emit many range changes, the view is only
+        # loaded once they stop for a moment
+        self._view_timer = QtCore.QTimer()
+        self._view_timer.setSingleShot(True)
+        self._view_timer.setInterval(100)
+        self._view_timer.timeout.connect(self.update_view)
+        self._pw.getViewBox().sigRangeChanged.connect(self._view_timer.start)
+
+        self._mw.add_xy_scan_Action.triggered.connect(self.add_xy_scan_clicked)
+        self._mw.show_all_Action.triggered.connect(self.show_all)
+        self._mw.new_mosaic_Action.triggered.connect(self.new_mosaic_clicked)
+        self._mw.restore_default_view_Action.triggered.connect(self.restore_default_view)
+        self._mw.actionClose.triggered.connect(self._mw.close)
+
+        self._mosaic_logic.sigMosaicUpdated.connect(self.update_view)
+        self.show_all()
+
+    def show(self):
+        """Make window visible and put it above all other windows.
+        """
+        QtWidgets.QMainWindow.show(self._mw)
+        self._mw.activateWindow()
+        self._mw.raise_()
+
+    def on_deactivate(self, e):
+        """ Deactivate the module
+
+        @param object e: Fysom.event object from Fysom class.
+        """
+        self._view_timer.stop()
+        self._mw.close()
+
+    def update_view(self):
+        """ Load the part of the mosaic which is visible.
+        """
+        viewbox = self._pw.getViewBox()
+        x_range, y_range = viewbox.viewRange()
+        max_pixels = max(int(viewbox.width()), int(viewbox.height()), 100)
+        image, extent = self._mosaic_logic.get_view(x_range, y_range, max_pixels)
+
+        scanned = np.isfinite(image)
+        if np.any(scanned):
+            cb_min = np.min(image[scanned])
+            cb_max = np.max(image[scanned])
+        else:
+            cb_min, cb_max = 0, 1
+        if cb_max <= cb_min:
+            cb_max = cb_min + 1
+        self.mosaic_image.setImage(image=np.where(scanned, image, cb_min).transpose(),
+                                   levels=(cb_min, cb_max))
+        self.mosaic_image.setRect(QtCore.QRectF(extent[0], extent[2],
+                                                extent[1] - extent[0], extent[3] - extent[2]))
+        self.mosaic_cb.refresh_colorbar(cb_min, cb_max)
+        self._mw.mosaic_cb_PlotWidget.update()
+
+    def show_all(self):
+        """ Zoom to the whole mosaic.
+        """
+        bounds = self._mosaic_logic.get_bounds()
+        if bounds is None:
+            self.update_view()
+            return
+        self._pw.setRange(xRange=bounds[0:2], yRange=bounds[2:4])
+
+    def add_xy_scan_clicked(self):
+        """ Add the current xy scan at the given stage offset.
+        """
+        self._mosaic_logic.add_xy_image(self._mw.offset_x_DoubleSpinBox.value(),
+                                        self._mw.offset_y_DoubleSpinBox.value())
+        self.show_all()
+
+    def new_mosaic_clicked(self):
+        """ Start an empty mosaic in a new directory.
+        """
+        self._mosaic_logic.new_mosaic()
+        self.show_all()
+
+    def restore_default_view(self):
+        """ Restore the arrangement of DockWidgets to the default
+        """
+        self._mw.mosaic_DockWidget.show()
+        self._mw.offset_DockWidget.show()
+
+        self._mw.mosaic_DockWidget.setFloating(False)
+        self._mw.offset_DockWidget.setFloating(False)
+
+        self._mw.addDockWidget(QtCore.Qt.DockWidgetArea(4), self._mw.mosaic_DockWidget)
+        self._mw.addDockWidget(QtCore.Qt.DockWidgetArea(8), self._mw.offset_DockWidget)
+
+        self._mw.addToolBar(QtCore.Qt.TopToolBarArea, self._mw.mosaic_control_ToolBar)
@@ -169,6 +169,11 @@ class ODMRGui(GUIBase):
             pen=pg.mkPen(palette.c2)
         )
 
+        # every frequency window has its own trace, the first one is
+        # odmr_image, and fit curves of single windows are added on top
+        self.odmr_window_images = [self.odmr_image]
+        self.odmr_window_fit_images = []
+
         # Add the display item to the xy and xz VieWidget, which was defined in
         # the UI file.
         self._mw.odmr_PlotWidget.addItem(self.odmr_image)
@@ -197,6 +202,7 @@ class ODMRGui(GUIBase):
         fit_functions = self._odmr_logic.get_fit_functions()
         self._mw.fit_methods_ComboBox.clear()
         self._mw.fit_methods_ComboBox.addItems(fit_functions)
+        self.update_windows()
 
         ########################################################################
         #                  Configuration of the Colorbar                       #
@@ -286,12 +292,14 @@ class ODMRGui(GUIBase):
 
         # react on an axis change in the logic by adapting the display:
         self._odmr_logic.sigODMRMatrixAxesChanged.connect(self.update_matrix_axes)
+        self._odmr_logic.sigODMRMatrixAxesChanged.connect(self.update_windows)
 
         # connect the clear button:
         self._mw.clear_odmr_PushButton.clicked.connect(self.clear_odmr_plots_clicked)
 
         self._odmr_logic.sigOdmrPlotUpdated.connect(self.refresh_plot)
         self._odmr_logic.sigOdmrFitUpdated.connect(self.refresh_plot_fit)
+        self._odmr_logic.sigBackgroundFitUpdated.connect(self.refresh_background_fit)
         self._odmr_logic.sigOdmrMatrixUpdated.connect(self.refresh_matrix)
         self._odmr_logic.sigOdmrElapsedTimeChanged.connect(self.refresh_elapsedtime)
         # connect settings signals
@@ -299,6 +307,8 @@ class ODMRGui(GUIBase):
         self._sd.accepted.connect(self.update_settings)
         self._sd.rejected.connect(self.reject_settings)
         self._sd.buttonBox.button(QtWidgets.QDialogButtonBox.Apply).clicked.connect(self.update_settings)
+        self._sd.add_window_PushButton.clicked.connect(self.add_frequency_window)
+        self._sd.remove_window_PushButton.clicked.connect(self.remove_frequency_window)
         self.reject_settings()
         # Connect stop odmr
         self._odmr_logic.sigOdmrStarted.connect(self.odmr_started)
@@ -428,8 +438,10 @@ class ODMRGui(GUIBase):
 
     def refresh_plot(self):
         """ Refresh the xy-plot image """
-        self.odmr_image.setData(self._odmr_logic.ODMR_plot_x,
-                                self._odmr_logic.ODMR_plot_y)
+        if len(self.odmr_window_images) != len(self._odmr_logic.window_slices):
+            self.update_windows()
+        for window, image in enumerate(self.odmr_window_images):
+            image.setData(*self._odmr_logic.get_window_data(window))
 
     def refresh_plot_fit(self):
         """ Refresh the xy fit plot image. """
@@ -441,9 +453,62 @@ class ODMRGui(GUIBase):
             if self.odmr_fit_image in self._mw.odmr_PlotWidget.listDataItems():
                 self._mw.odmr_PlotWidget.removeItem(self.odmr_fit_image)
 
+        window_fits = self._odmr_logic.window_fits
+        while len(self.odmr_window_fit_images) < len(window_fits):
+            image = pg.PlotDataItem(pen=pg.mkPen(palette.c3))
+            self._mw.odmr_PlotWidget.addItem(image)
+            self.odmr_window_fit_images.append(image)
+        while len(self.odmr_window_fit_images) > len(window_fits):
+            self._mw.odmr_PlotWidget.removeItem(self.odmr_window_fit_images.pop())
+        for image, window in zip(self.odmr_window_fit_images, sorted(window_fits)):
+            image.setData(x=window_fits[window][0], y=window_fits[window][1])
+
+    def refresh_background_fit(self):
+        """ Show the latest background fit and its parameters. """
+        if self.odmr_fit_image not in self._mw.odmr_PlotWidget.listDataItems():
+            self._mw.odmr_PlotWidget.addItem(self.odmr_fit_image)
+        elapsed_time, fit_param = self._odmr_logic.background_fit_history[-1]
+        self._mw.odmr_fit_results_DisplayWidget.setPlainText(
+            'Background fit after {0:.0f} s:\n{1}'.format(
+                elapsed_time, units.create_formatted_output(fit_param)))
+
+    def update_windows(self):
+        """ Show a trace for each frequency window of the logic and offer the
+        windows to the fit. """
+        windows = len(self._odmr_logic.window_slices)
+        while len(self.odmr_window_images) < windows:
+            image = pg.PlotDataItem(
+                pen=pg.mkPen(palette.c1, style=QtCore.Qt.DotLine),
+                symbol='o',
+                symbolPen=palette.c1,
+                symbolBrush=palette.c1,
+                symbolSize=7
+            )
+            self._mw.odmr_PlotWidget.addItem(image)
+            self.odmr_window_images.append(image)
+        while len(self.odmr_window_images) > windows:
+            self._mw.odmr_PlotWidget.removeItem(self.odmr_window_images.pop())
+
+        # the fits of single windows belong to the previous measurement
+        for image in self.odmr_window_fit_images:
+            self._mw.odmr_PlotWidget.removeItem(image)
+        self.odmr_window_fit_images = []
+
+        selected = self._mw.fit_window_ComboBox.currentIndex()
+        self._mw.fit_window_ComboBox.clear()
+        self._mw.fit_window_ComboBox.addItem('All windows')
+        for window in range(windows):
+            frequencies = self._odmr_logic.get_window_data(window)[0]
+            self._mw.fit_window_ComboBox.addItem(
+                '{0:.6g} - {1:.6g} MHz'.format(frequencies[0] / 1e6, frequencies[-1] / 1e6))
+        if 0 <= selected <= windows:
+            self._mw.fit_window_ComboBox.setCurrentIndex(selected)
+
     def refresh_matrix(self):
         """ Refresh the xy-matrix image """
-        odmr_image_data = self._odmr_logic.ODMR_plot_xy.transpose()
+        # frequencies skipped by the adaptive sampling are NaN, they are shown
+        # like the lines which are not measured yet
+        odmr_image_data = np.nan_to_num(self._odmr_logic.ODMR_plot_xy.transpose())
 
         cb_range = self.get_matrix_cb_range()
 
@@ -456,13 +521,28 @@ class ODMRGui(GUIBase):
     def update_matrix_axes(self):
         """ Adjust the x and y axes in the image according to the input. """
 
-        self.odmr_matrix_image.setRect(
-            QtCore.QRectF(
-                self._odmr_logic.mw_start,
-                0,
-                self._odmr_logic.mw_stop - self._odmr_logic.mw_start,
-                self._odmr_logic.number_of_lines
-            ))
+        if len(self._odmr_logic.window_slices) > 1:
+            # the columns of several windows are not equally spaced in
+            # frequency, so they are shown over the number of the point
+            self.odmr_matrix_image.setRect(
+                QtCore.QRectF(
+                    0,
+                    0,
+                    len(self._odmr_logic.ODMR_plot_x),
+                    self._odmr_logic.number_of_lines
+                ))
+            self._mw.odmr_matrix_PlotWidget.setLabel(axis='bottom', text='Frequency point',
+                                                     units='#')
+        else:
+            self.odmr_matrix_image.setRect(
+                QtCore.QRectF(
+                    self._odmr_logic.mw_start,
+                    0,
+                    self._odmr_logic.mw_stop - self._odmr_logic.mw_start,
+                    self._odmr_logic.number_of_lines
+                ))
+            self._mw.odmr_matrix_PlotWidget.setLabel(axis='bottom', text='Frequency',
+                                                     units='Hz')
 
     def refresh_odmr_colorbar(self):
         """ Update the colorbar to a new scaling.
@@ -508,6 +588,24 @@ class ODMRGui(GUIBase):
         self._odmr_logic.number_of_lines = self._sd.matrix_lines_SpinBox.value()
         self._odmr_logic.set_clock_frequency(self._sd.clock_frequency_DoubleSpinBox.value())
         self._odmr_logic.saveRawData = self._sd.save_raw_data_CheckBox.isChecked()
+        self._odmr_logic.adaptive_sampling = self._sd.adaptive_sampling_CheckBox.isChecked()
+        windows = []
+        table = self._sd.frequency_windows_TableWidget
+        for row in range(table.rowCount()):
+            try:
+                start, stop, step = [float(table.item(row, column).text()) for column in range(3)]
+            except (AttributeError, ValueError):
+                self.log.warning('Frequency window {0} needs a number for start, stop '
+                                 'and step. It is left out.'.format(row + 1))
+                continue
+            if step <= 0 or stop < start:
+                self.log.warning('Frequency window {0} needs a positive step and a stop '
+                                 'above the start. It is left out.'.format(row + 1))
+                continue
+            windows.append([start, stop, step])
+        self._odmr_logic.mw_windows = windows
+        self._odmr_logic.background_fit = self._sd.background_fit_CheckBox.isChecked()
+        self._odmr_logic.background_fit_interval = self._sd.background_fit_interval_DoubleSpinBox.value()
         for name, tab in self._sd.fit_tabs.items():
             self._odmr_logic.use_custom_params[name] = tab.updateFitSettings(
                 self._odmr_logic.fit_models[name][1])
@@ -517,30 +615,60 @@ class ODMRGui(GUIBase):
         self._sd.matrix_lines_SpinBox.setValue(self._odmr_logic.number_of_lines)
         self._sd.clock_frequency_DoubleSpinBox.setValue(self._odmr_logic._clock_frequency)
         self._sd.save_raw_data_CheckBox.setChecked(self._odmr_logic.saveRawData)
+        self._sd.adaptive_sampling_CheckBox.setChecked(self._odmr_logic.adaptive_sampling)
+        table = self._sd.frequency_windows_TableWidget
+        table.setRowCount(len(self._odmr_logic.mw_windows))
+        for row, window in enumerate(self._odmr_logic.mw_windows):
+            for column, value in enumerate(window):
+                table.setItem(row, column, QtWidgets.QTableWidgetItem('{0:.9g}'.format(value)))
+        self._sd.background_fit_CheckBox.setChecked(self._odmr_logic.background_fit)
+        self._sd.background_fit_interval_DoubleSpinBox.setValue(self._odmr_logic.background_fit_interval)
         for name, tab in self._sd.fit_tabs.items():
             tab.keepFitSettings(
                 self._odmr_logic.fit_models[name][1],
                 self._odmr_logic.use_custom_params[name])
 
+    def add_frequency_window(self):
+        """ Add a further frequency window to the table of the settings. """
+        table = self._sd.frequency_windows_TableWidget
+        row = table.rowCount()
+        table.insertRow(row)
+        # start with the values of the main window, to be edited
+        for column, value in enumerate(self._odmr_logic.get_frequency_windows()[0]):
+            table.setItem(row, column, QtWidgets.QTableWidgetItem('{0:.9g}'.format(value)))
+
+    def remove_frequency_window(self):
+        """ Remove the selected frequency window from the table of the settings. """
+        row = self._sd.frequency_windows_TableWidget.currentRow()
+        if row >= 0:
+            self._sd.frequency_windows_TableWidget.removeRow(row)
+
     def update_fit_variable(self, txt):
         """ Set current fit function """
         self._odmr_logic.current_fit_function = txt
 
     def update_fit(self):
         """ Do the configured fit and show it in the sum plot """
-        x_data_fit, y_data_fit, fit_param, fit_result = self._odmr_logic.do_fit(fit_function=self._odmr_logic.current_fit_function)
+        # the first entry fits all windows together
+        window = self._mw.fit_window_ComboBox.currentIndex() - 1
+        if window < 0:
+            window = None
+        x_data_fit, y_data_fit, fit_param, fit_result = self._odmr_logic.do_fit(
+            fit_function=self._odmr_logic.current_fit_function, window=window)
         self._sd.fit_tabs[self._odmr_logic.current_fit_function].keepFitSettings(fit_result.params,0)
         # The fit signal was already emitted in the logic, so there is no need
         # to set the fit data
 
         # check which Fit method is used and remove or add again the
         # odmr_fit_image, check also whether a odmr_fit_image already exists.
-        if self._mw.fit_methods_ComboBox.currentText() == 'No Fit':
-            if self.odmr_fit_image in self._mw.odmr_PlotWidget.listDataItems():
-                self._mw.odmr_PlotWidget.removeItem(self.odmr_fit_image)
-        else:
-            if self.odmr_fit_image not in self._mw.odmr_PlotWidget.listDataItems():
-                self._mw.odmr_PlotWidget.addItem(self.odmr_fit_image)
+        # The fits of single windows are shown by refresh_plot_fit.
+        if window is None:
+            if self._mw.fit_methods_ComboBox.currentText() == 'No Fit':
+                if self.odmr_fit_image in self._mw.odmr_PlotWidget.listDataItems():
+                    self._mw.odmr_PlotWidget.removeItem(self.odmr_fit_image)
+            else:
+                if self.odmr_fit_image not in self._mw.odmr_PlotWidget.listDataItems():
+                    self._mw.odmr_PlotWidget.addItem(self.odmr_fit_image)
 
         self._mw.odmr_PlotWidget.getViewBox().updateAutoRange()
         self._mw.odmr_fit_results_DisplayWidget.clear()
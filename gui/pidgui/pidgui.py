@@ -25,7 +25,6 @@ from gui.colordefs import QudiPalettePale as palette
 from qtpy import QtCore
 from qtpy import QtWidgets
 from qtpy import uic
-import numpy as np
 import pyqtgraph as pg
 import os
 
@@ -225,18 +224,12 @@ class PIDGui(GUIBase):
                 self._mw.labelkI.setText('{0:,.6f}'.format(extra['I']))
             if 'D' in extra:
                 self._mw.labelkD.setText('{0:,.6f}'.format(extra['D']))
-            self._curve1.setData(
-                y=self._pid_logic.history[0],
-                x=np.arange(0, self._pid_logic.getBufferLength()) * self._pid_logic.timestep
-                )
-            self._curve2.setData(
-                y=self._pid_logic.history[1],
-                x=np.arange(0, self._pid_logic.getBufferLength()) * self._pid_logic.timestep
-                )
-            self._curve3.setData(
-                y=self._pid_logic.history[2],
-                x=np.arange(0, self._pid_logic.getBufferLength()) * self._pid_logic.timestep
-                )
+            # only request as many points as the plot has pixels to show them
+            max_points = max(2 * int(self.plot1.vb.width()), 100)
+            x_vals, history = self._pid_logic.get_display_data(max_points)
+            self._curve1.setData(y=history[0], x=x_vals)
+            self._curve2.setData(y=history[1], x=x_vals)
+            self._curve3.setData(y=history[2], x=x_vals)
 
         if self._pid_logic.getSavingState():
             self._mw.record_control_Action.setText('Save')
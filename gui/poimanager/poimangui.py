@@ -703,6 +703,9 @@ class PoiManagerGui(GUIBase):
         # placeholder.setText('{0:.1f}'.format(self._poi_manager_logic.time_left))
 
         #        print(self._poi_manager_logic.time_left)
+        # the interval adapts to the drift of the sample
+        self._mw.time_till_next_update_ProgressBar.setMaximum(
+            int(self._poi_manager_logic.refocus_interval))
         self._mw.time_till_next_update_ProgressBar.setValue(self._poi_manager_logic.time_left)
 
     def change_track_period(self):
@@ -198,9 +198,11 @@ class WavemeterLogGui(GUIBase):
         x_axis = self._wm_logger_logic.histogram_axis
         x_axis_hz = 3.0e17 / (x_axis) - 6.0e17 / (self._wm_logger_logic.get_max_wavelength() + self._wm_logger_logic.get_min_wavelength())
 
-        plotdata = np.array(self._wm_logger_logic.counts_with_wavelength)
-        if len(plotdata.shape) > 1 and plotdata.shape[1] == 3:
-            self._curve1.setData(plotdata[:, 2:0:-1])
+        # only request as many points as the plot has pixels to show them
+        max_points = max(2 * int(self._plot_item.vb.width()), 100)
+        wavelengths, counts = self._wm_logger_logic.get_display_data(max_points)
+        if len(wavelengths) > 0:
+            self._curve1.setData(x=wavelengths, y=counts)
 
         self._curve2.setData(y=self._wm_logger_logic.histogram, x=x_axis)
         self._curve3.setData(y=self._wm_logger_logic.histogram, x=x_axis_hz)
@@ -61,7 +61,31 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
         self._position_range = [[0, 100], [0, 100], [0, 100], [0, 1]]
         self._current_position = [0, 0, 0, 0]
 
-        self._num_points = 500
+        # number of simulated fluorescent emitters in the scan volume
+        if 'num_points' in config.keys():
+            self._num_points = int(config['num_points'])
+        else:
+            self._num_points = 500
+
+        # z range in which the emitters are located
+        if 'emitter_depth_range' in config.keys():
+            self._emitter_depth_range = config['emitter_depth_range']
+        else:
+            self._emitter_depth_range = [45, 55]
+
+        # If True, scan_line takes as long as the real hardware would need for
+        # the given clock frequency. Set to False to scan as fast as possible.
+        if 'simulate_timing' in config.keys():
+            self._simulate_timing = bool(config['simulate_timing'])
+        else:
+            self._simulate_timing = True
+
+        # delay in clock cycles with which the simulated stage follows the
+        # set positions during scan_line_with_return, as a real scanner does
+        if 'scanner_lag' in config.keys():
+            self._scanner_lag = float(config['scanner_lag'])
+        else:
+            self._scanner_lag = 0
 
     def on_activate(self, e):
         """ Initialisation performed during activation of the module.
@@ -106,7 +130,9 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
         self._points_z[:, 0] = np.random.normal(1, 0.05, self._num_points)
 
         # x_zero
-        self._points_z[:, 1] = np.random.uniform(45, 55, self._num_points)
+        self._points_z[:, 1] = np.random.uniform(self._emitter_depth_range[0],
+                                                 self._emitter_depth_range[1],
+                                                 self._num_points)
 
         # sigma
         self._points_z[:, 2] = np.random.normal(0.5, 0.1, self._num_points)
@@ -114,6 +140,8 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
         # offset
         self._points_z[:, 3] = 0
 
+        self._build_spot_grid()
+
     def on_deactivate(self, e):
         """ Deactivate properly the confocal scanner dummy.
 
@@ -320,35 +348,69 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
         if np.shape(line_path)[1] != self._line_length:
             self.set_up_line(np.shape(line_path)[1])
 
-        #print('line',line_path[0,:])
+        start_time = time.time()
+
         count_data = np.random.uniform(0, 2e4, self._line_length)
-        z_data = line_path[2, :]
-
-        #TODO: Change the gaussian function here to the one from fitlogic and delete the local modules to calculate
-        #the gaussian functions
-        if line_path[0, 0] != line_path[0, 1]:
-            x_data,y_data = np.meshgrid(line_path[0, :], line_path[1, 0])
-            for i in range(self._num_points):
-                count_data += self.twoD_gaussian_function((x_data,y_data),
-                              *(self._points[i])) * ((self.gaussian_function(np.array(z_data),
-                              *(self._points_z[i]))))
-        else:
-            x_data,y_data = np.meshgrid(line_path[0, 0], line_path[1, 0])
-            for i in range(self._num_points):
-                count_data += self.twoD_gaussian_function((x_data,y_data),
-                              *(self._points[i])) * ((self.gaussian_function(z_data,
-                              *(self._points_z[i]))))
+        count_data += self._evaluate_line(np.asarray(line_path, dtype=float))
 
+        if self._simulate_timing:
+            # emulate the dwell time of the real hardware for the whole line
+            remaining_time = self._line_length / self._clock_frequency - (time.time() - start_time)
+            if remaining_time > 0:
+                time.sleep(remaining_time)
+
+        # update the scanner position instance variable
+        self._current_position = list(line_path[:, -1])
 
-        time.sleep(self._line_length * 1/self._clock_frequency)
-        time.sleep(self._line_length * 1/self._clock_frequency)
+        return count_data
 
-#        self.log.warning('ConfocalScannerInterfaceDummy>scan_line: length {0:d}.'.format(self._line_length))
+    def scan_line_with_return(self, line_path=None, return_path=None, start_path=None):
+        """ Moves along the start path, the line and the return path in a single
+        scan and returns the counts on the line only.
 
-        #self.unlock()
+        @param float[][4] line_path: array of 4-part tuples defining the
+                                     positions of the pixels of the line
+        @param float[][4] return_path: positions passed after the line
+        @param float[][4] start_path: positions passed before the line
+
+        @return float[]: the photon counts per second of the line pixels
+        """
+        paths = [path for path in (start_path, line_path, return_path) if path is not None]
+        for path in paths:
+            if not isinstance(path, (frozenset, list, set, tuple, np.ndarray, )):
+                self.log.error('Given voltage list is no array type.')
+                return np.array([-1.])
+        if line_path is None:
+            self.log.error('No line given to scan.')
+            return np.array([-1.])
+
+        if np.shape(line_path)[1] != self._line_length:
+            self.set_up_line(np.shape(line_path)[1])
+
+        start_time = time.time()
+
+        line_path = np.asarray(line_path, dtype=float)
+        if self._scanner_lag > 0:
+            # the stage lags behind the set positions of the whole trajectory
+            trajectory = np.hstack([np.asarray(path, dtype=float) for path in paths])
+            start = 0 if start_path is None else np.shape(start_path)[1]
+            steps = np.arange(trajectory.shape[1])
+            delayed = np.vstack([np.interp(steps - self._scanner_lag, steps, axis)
+                                 for axis in trajectory])
+            line_path = delayed[:, start:start + self._line_length]
+
+        count_data = np.random.uniform(0, 2e4, self._line_length)
+        count_data += self._evaluate_line(line_path)
+
+        if self._simulate_timing:
+            # emulate the dwell time of the real hardware for the whole trajectory
+            pixels = sum(np.shape(path)[1] for path in paths)
+            remaining_time = pixels / self._clock_frequency - (time.time() - start_time)
+            if remaining_time > 0:
+                time.sleep(remaining_time)
 
         # update the scanner position instance variable
-        self._current_position = list(line_path[:, -1])
+        self._current_position = list(np.asarray(paths[-1])[:, -1])
 
         return count_data
 
@@ -373,6 +435,89 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
         self.log.debug('ConfocalScannerDummy>close_scanner_clock')
         return 0
 
+    def _build_spot_grid(self):
+        """ Sort the simulated emitters into a regular xy grid of cells.
+
+        The cell size is chosen such that emitters further away than one cell
+        from a pixel do not contribute noticeably to its counts. Only the
+        emitters in the cells around a scan line have to be evaluated then.
+        """
+        sigma_max = np.max(np.abs(self._points[:, 3:5]))
+        self._spot_cutoff = 5 * sigma_max
+        self._grid_origin = np.array([self._position_range[0][0], self._position_range[1][0]])
+        self._grid_cell_size = self._spot_cutoff
+
+        cell_xy = np.floor((self._points[:, 1:3] - self._grid_origin) /
+                           self._grid_cell_size).astype(int)
+        self._grid_shape = cell_xy.max(axis=0) + 1
+        cell_index = cell_xy[:, 0] * self._grid_shape[1] + cell_xy[:, 1]
+
+        # store the emitters ordered by cell, so that each cell is a slice
+        order = np.argsort(cell_index, kind='mergesort')
+        self._points = self._points[order]
+        self._points_z = self._points_z[order]
+        self._grid_cell_index = cell_index[order]
+
+        # precompute the coefficients of the elliptical gaussians
+        theta = self._points[:, 5]
+        sigma_x = self._points[:, 3]
+        sigma_y = self._points[:, 4]
+        self._spot_a = np.cos(theta)**2 / (2 * sigma_x**2) + np.sin(theta)**2 / (2 * sigma_y**2)
+        self._spot_b = -np.sin(2 * theta) / (4 * sigma_x**2) + np.sin(2 * theta) / (4 * sigma_y**2)
+        self._spot_c = np.sin(theta)**2 / (2 * sigma_x**2) + np.cos(theta)**2 / (2 * sigma_y**2)
+
+    def _get_spots_in_box(self, x_min, x_max, y_min, y_max):
+        """ Indices of all emitters in the grid cells covering a box.
+
+        @param float x_min: lower x limit of the box
+        @param float x_max: upper x limit of the box
+        @param float y_min: lower y limit of the box
+        @param float y_max: upper y limit of the box
+
+        @return numpy.array: indices into the emitter arrays
+        """
+        lower = np.floor((np.array([x_min, y_min]) - self._spot_cutoff - self._grid_origin) /
+                         self._grid_cell_size).astype(int)
+        upper = np.floor((np.array([x_max, y_max]) + self._spot_cutoff - self._grid_origin) /
+                         self._grid_cell_size).astype(int)
+        lower = np.clip(lower, 0, self._grid_shape - 1)
+        upper = np.clip(upper, 0, self._grid_shape - 1)
+        if np.any(upper < lower):
+            return np.array([], dtype=int)
+
+        indices = []
+        for cell_x in range(lower[0], upper[0] + 1):
+            first = cell_x * self._grid_shape[1] + lower[1]
+            last = cell_x * self._grid_shape[1] + upper[1]
+            start = np.searchsorted(self._grid_cell_index, first, side='left')
+            stop = np.searchsorted(self._grid_cell_index, last, side='right')
+            indices.append(np.arange(start, stop))
+        return np.concatenate(indices)
+
+    def _evaluate_line(self, line_path):
+        """ Fluorescence of the simulated emitters along a scan line.
+
+        @param float[4][n] line_path: positions (x, y, z, a) of the n pixels
+
+        @return numpy.array: the fluorescence for each pixel in counts/s
+        """
+        x = line_path[0, :]
+        y = line_path[1, :]
+        z = line_path[2, :]
+        spots = self._get_spots_in_box(x.min(), x.max(), y.min(), y.max())
+        if spots.size == 0:
+            return np.zeros(x.size)
+
+        # (pixels, spots) matrices of the distance to every nearby emitter
+        dx = x[:, np.newaxis] - self._points[spots, 1]
+        dy = y[:, np.newaxis] - self._points[spots, 2]
+        dz = z[:, np.newaxis] - self._points_z[spots, 1]
+        exponent = (self._spot_a[spots] * dx**2 + 2 * self._spot_b[spots] * dx * dy +
+                    self._spot_c[spots] * dy**2 +
+                    dz**2 / (2 * self._points_z[spots, 2]**2))
+        amplitude = self._points[spots, 0] * self._points_z[spots, 0]
+        return np.exp(-exponent).dot(amplitude)
+
 ############################################################################
 #                                                                          #
 #    the following two functions are needed to fluoreschence signal        #
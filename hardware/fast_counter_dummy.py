@@ -42,6 +42,7 @@ class FastCounterDummy(Base, FastCounterInterface):
     _modclass = 'fastcounterinterface'
     _modtype = 'hardware'
     # connectors
+    _in = {'simulator': 'PulsedNVSimulator'}
     _out = {'fastcounter': 'FastCounterInterface'}
 
     def __init__(self, config, **kwargs):
@@ -83,6 +84,12 @@ class FastCounterDummy(Base, FastCounterInterface):
         self.statusvar = 0
         self._binwidth = 1
         self._gate_length_bins = 8192
+
+        # The simulator connection is optional. Without it the demo timetrace
+        # from file is returned.
+        self._simulator = self.connector['in']['simulator']['object']
+        if self._simulator is not None:
+            self.log.info('Fast counter dummy is coupled to the pulsed NV simulator.')
         return
 
     def on_deactivate(self, e):
@@ -175,7 +182,10 @@ class FastCounterDummy(Base, FastCounterInterface):
         time.sleep(1)
         self.statusvar = 2
 
-        if self._choose_trace:
+        if self._simulator is not None:
+            self._simulator.start_measure(self.get_binwidth(), self._gate_length_bins,
+                                          self._gated)
+        elif self._choose_trace:
             defaultconfigpath = os.path.join(self.get_main_dir())
 
             # choose the filename via the Qt Dialog window:
@@ -207,6 +217,8 @@ class FastCounterDummy(Base, FastCounterInterface):
         """
         time.sleep(1)
         self.statusvar = 3
+        if self._simulator is not None:
+            self._simulator.pause_measure()
         return 0
 
     def stop_measure(self):
@@ -214,6 +226,8 @@ class FastCounterDummy(Base, FastCounterInterface):
 
         time.sleep(1)
         self.statusvar = 1
+        if self._simulator is not None:
+            self._simulator.stop_measure()
         return 0
 
     def continue_measure(self):
@@ -223,6 +237,8 @@ class FastCounterDummy(Base, FastCounterInterface):
         """
 
         self.statusvar = 2
+        if self._simulator is not None:
+            self._simulator.continue_measure()
         return 0
 
     def is_gated(self):
@@ -257,6 +273,8 @@ class FastCounterDummy(Base, FastCounterInterface):
 
         # include an artificial waiting time
         time.sleep(0.5)
+        if self._simulator is not None:
+            return self._simulator.get_data_trace()
         return self._count_data
 
     def get_frequency(self):
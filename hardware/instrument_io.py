@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains a shared transport layer for message based instruments
+(VISA and serial) with command batching, a write-through state cache and
+latency statistics, as well as a loopback instrument for testing.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+from core.util.mutex import Mutex
+
+# common commands which wipe the complete instrument state
+_RESET_COMMANDS = ('*RST', '*RCL', 'SYST:PRES', 'SYSTEM:PRESET')
+# common commands which only synchronize with the instrument
+_SYNC_COMMANDS = ('*WAI', '*OPC')
+
+
+def _split_command(command):
+    """ Split a SCPI command into its normalized header and its argument.
+
+    @param str command: command like ':SOUR:FREQ 2.87e9' or ':FREQ?'
+
+    @return tuple(str, str): header without leading colon in upper case and
+                             the argument string (None for commands without
+                             argument)
+    """
+    command = command.strip()
+    parts = command.split(None, 1)
+    header = parts[0].lstrip(':').upper()
+    argument = parts[1].strip() if len(parts) > 1 else None
+    return header, argument
+
+
+def _normalize_argument(argument):
+    """ Bring a command argument into a form which compares equal for all
+    spellings of the same setting.
+
+    Numbers are compared by value, so '1e9' equals '1000000000.0', and
+    unquoted mnemonics ignore the case, so 'on' equals 'ON'. Lists like
+    'f1, f2, f3' become tuples of these values.
+
+    @param str argument: argument string of a command
+
+    @return tuple: normalized values, None for None
+    """
+    if argument is None:
+        return None
+    values = list()
+    for part in argument.split(','):
+        part = part.strip()
+        try:
+            values.append(float(part))
+        except ValueError:
+            values.append(part if part[:1] in ('"', "'") else part.upper())
+    return tuple(values)
+
+
+class LatencyHistogram:
+    """ Histogram of round trip times with logarithmic bins from 1 us to 100 s. """
+
+    bin_edges = np.logspace(-6, 2, 41)
+
+    def __init__(self):
+        self.counts = np.zeros(len(self.bin_edges) + 1, dtype=np.int64)
+        self.number = 0
+        self.total = 0.
+        self.maximum = 0.
+
+    def add(self, latency):
+        self.counts[np.searchsorted(self.bin_edges, latency)] += 1
+        self.number += 1
+        self.total += latency
+        self.maximum = max(self.maximum, latency)
+
+    def to_dict(self):
+        return OrderedDict([
+            ('count', self.number),
+            ('mean', self.total / self.number if self.number > 0 else 0.),
+            ('max', self.maximum),
+            ('bin_edges', self.bin_edges),
+            ('histogram', self.counts.copy())])
+
+
+class SerialTransport:
+    """ Message based access to a pyserial port with the write/read/query
+    methods of a VISA resource.
+    """
+    def __init__(self, port, write_termination='\n', read_termination='\n', encoding='ascii'):
+        """
+        @param serial.Serial port: opened serial port
+        @param str write_termination: appended to every written command
+        @param str read_termination: end of every reply
+        @param str encoding: encoding of the exchanged strings
+        """
+        self.port = port
+        self.write_termination = write_termination
+        self.read_termination = read_termination
+        self.encoding = encoding
+
+    def write(self, command):
+        self.port.write((command + self.write_termination).encode(self.encoding))
+
+    def read(self):
+        termination = self.read_termination.encode(self.encoding)
+        reply = self.port.read_until(termination)
+        return reply.decode(self.encoding)[:-len(self.read_termination) or None]
+
+    def query(self, command):
+        self.write(command)
+        return self.read()
+
+    def close(self):
+        self.port.close()
+
+
+class LoopbackInstrument:
+    """ Simulated SCPI instrument which answers queries from the values set
+    before.
+
+    Every setting 'HEADER value' is stored and returned by 'HEADER?'. Commands
+    separated by ';' are processed in one round trip and the replies to all
+    contained queries are joined by ';'. Each round trip takes the configured
+    latency, so the effect of batching and caching can be measured without
+    hardware.
+    """
+    def __init__(self, idn='Qudi,Loopback,0,1.0', latency=0., initial_state=None):
+        """
+        @param str idn: reply to '*IDN?'
+        @param float latency: duration of each write or query round trip in s
+        @param dict initial_state: header as key and reply string as item
+        """
+        self.idn = idn
+        self.latency = latency
+        self.initial_state = dict() if initial_state is None else dict(initial_state)
+        self.state = dict(self.initial_state)
+        self.round_trips = 0
+        self.received = list()
+        self._reply = None
+
+    def _process(self, message):
+        replies = list()
+        for command in message.split(';'):
+            if not command.strip():
+                continue
+            self.received.append(command.strip())
+            header, argument = _split_command(command)
+            if header.endswith('?'):
+                key = header[:-1]
+                if key == '*IDN':
+                    replies.append(self.idn)
+                elif key == '*OPC':
+                    replies.append('1')
+                elif key.endswith(':POIN') and key[:-5] in self.state:
+                    # length of a list setting like ':LIST:FREQ f1, f2, ...'
+                    replies.append(str(len(self.state[key[:-5]].split(','))))
+                else:
+                    replies.append(self.state.get(key, '0'))
+            elif header in _RESET_COMMANDS:
+                self.state = dict(self.initial_state)
+            elif header.endswith('DEL:ALL'):
+                # e.g. ':LIST:DEL:ALL' deletes all settings below ':LIST'
+                prefix = header[:-len('DEL:ALL')]
+                self.state = {key: value for key, value in self.state.items()
+                              if not key.startswith(prefix)}
+            elif argument is not None:
+                self.state[header] = argument
+        return replies
+
+    def _round_trip(self):
+        self.round_trips += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def write(self, message):
+        self._round_trip()
+        replies = self._process(message)
+        if replies:
+            self._reply = ';'.join(replies)
+
+    def read(self):
+        self._round_trip()
+        reply, self._reply = self._reply, None
+        return '' if reply is None else reply
+
+    def query(self, message):
+        self._round_trip()
+        return ';'.join(self._process(message))
+
+    def close(self):
+        pass
+
+
+class InstrumentConnection:
+    """ Transport layer between an instrument driver and a VISA resource,
+    a SerialTransport or a LoopbackInstrument.
+
+    * Settings which do not change the known instrument state are not sent.
+      The state is learned from every setting written through this object and
+      discarded by reset commands or invalidate(). Commands without argument,
+      like ':LIST:DEL:ALL', discard the state of their whole subsystem.
+      Arguments are compared by value, so ':FREQ 1e9' after
+      ':FREQ 1000000000.0' is not sent again.
+    * Replies to queries are cached until the next state changing command, so
+      repeated queries of e.g. the frequency cost no round trip.
+    * '*WAI' and '*OPC?' are skipped if nothing was sent since the last
+      synchronization.
+    * Inside a batch() context the commands are queued and sent together,
+      separated by ';', in a single round trip with the next query or at the
+      end of the batch.
+    * The duration of every round trip is recorded per command header.
+    """
+    def __init__(self, resource, separator=';', cache=True, volatile=()):
+        """
+        @param object resource: object with write(str), read() and query(str)
+        @param str separator: joins batched commands; None sends every queued
+                              command on its own (still without waiting for
+                              the caller in between)
+        @param bool cache: enable the state and query cache
+        @param iterable volatile: headers of settings and queries which change
+                                  on the instrument by themselves and are
+                                  never cached, e.g. ('LIST:FREQ:POIN',)
+        """
+        self.resource = resource
+        self.separator = separator
+        self.cache_enabled = cache
+        self.volatile = set(_split_command(header)[0] for header in volatile)
+        self._lock = Mutex(recursive=True)
+        self._state = dict()
+        self._replies = dict()
+        self._queue = list()
+        self._batch_depth = 0
+        self._unsynchronized = False
+        self.reset_statistics()
+
+    # ========================= cache handling ==============================
+
+    def invalidate(self, header=None):
+        """ Forget the known instrument state.
+
+        @param str header: only forget this setting and all settings below it,
+                           e.g. ':LIST' forgets ':LIST:FREQ' as well, all if
+                           None
+        """
+        with self._lock:
+            self._replies.clear()
+            if header is None:
+                self._state.clear()
+            else:
+                header = _split_command(header)[0]
+                for key in list(self._state):
+                    if key == header or key.startswith(header + ':'):
+                        del self._state[key]
+
+    def get_cached_state(self):
+        """ Settings which are known to be active on the instrument.
+
+        @return dict: header as key and argument string as item
+        """
+        return dict(self._state)
+
+    # ============================ statistics ===============================
+
+    def reset_statistics(self):
+        """ Clear latency histograms and command counters. """
+        self._histograms = OrderedDict()
+        self.round_trips = 0
+        self.skipped_commands = 0
+        self.cached_replies = 0
+
+    def get_latency_statistics(self):
+        """ Round trip time statistics.
+
+        @return OrderedDict: header of the last command of each round trip as
+                             key and a dict with count, mean and max latency in
+                             s as well as histogram counts and bin_edges as item
+        """
+        return OrderedDict((header, histogram.to_dict())
+                           for header, histogram in self._histograms.items())
+
+    def _record(self, header, start):
+        latency = time.perf_counter() - start
+        if header not in self._histograms:
+            self._histograms[header] = LatencyHistogram()
+        self._histograms[header].add(latency)
+        self.round_trips += 1
+
+    # ============================= transport ===============================
+
+    @contextmanager
+    def batch(self):
+        """ Queue all commands written in this context and send them together. """
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.flush()
+
+    def flush(self):
+        """ Send all queued commands. """
+        with self._lock:
+            if not self._queue:
+                return
+            queue, self._queue = self._queue, list()
+            if self.separator is None:
+                for command in queue:
+                    start = time.perf_counter()
+                    self.resource.write(command)
+                    self._record(_split_command(command)[0], start)
+            else:
+                start = time.perf_counter()
+                self.resource.write(self.separator.join(queue))
+                self._record(_split_command(queue[-1])[0], start)
+
+    def write(self, command):
+        """ Send a command unless it is known to be redundant.
+
+        @param str command: the command
+
+        @return bool: True if the command was sent or queued, False if skipped
+        """
+        with self._lock:
+            # a trailing separator like in ':POW -20;' would end up as an empty
+            # command inside a batch
+            command = command.strip().rstrip(';').strip()
+            header, argument = _split_command(command)
+            if header in _SYNC_COMMANDS:
+                if not self._unsynchronized and not self._queue:
+                    self.skipped_commands += 1
+                    return False
+                self._unsynchronized = False
+            elif header in _RESET_COMMANDS:
+                self.invalidate()
+                self._unsynchronized = True
+            elif argument is None:
+                # actions like ':LIST:DEL:ALL' or ':LIST:LEARN' may change any
+                # setting of their subsystem
+                self.invalidate(header.split(':')[0])
+                self._unsynchronized = True
+            elif not self.cache_enabled or header in self.volatile:
+                self._replies.clear()
+                self._unsynchronized = True
+            elif (header in self._state and _normalize_argument(self._state[header])
+                    == _normalize_argument(argument)):
+                self.skipped_commands += 1
+                return False
+            else:
+                self._state[header] = argument
+                self._replies.clear()
+                self._unsynchronized = True
+
+            self._queue.append(command)
+            if self._batch_depth == 0:
+                self.flush()
+            return True
+
+    def query(self, command):
+        """ Ask the instrument, or the cache if the answer is known.
+
+        @param str command: the query, ending with '?'
+
+        @return str: the reply
+        """
+        with self._lock:
+            header, argument = _split_command(command)
+            key = header.rstrip('?')
+            if key == '*OPC' and not self._unsynchronized and not self._queue:
+                self.skipped_commands += 1
+                return '1'
+            cacheable = (self.cache_enabled and argument is None and key not in self.volatile
+                         and (key == '*IDN' or not key.startswith('*')))
+            if cacheable and header in self._replies:
+                self.cached_replies += 1
+                return self._replies[header]
+
+            self._queue.append(command.strip())
+            queue, self._queue = self._queue, list()
+            start = time.perf_counter()
+            if self.separator is None:
+                for queued in queue[:-1]:
+                    self.resource.write(queued)
+                reply = self.resource.query(queue[-1])
+            else:
+                reply = self.resource.query(self.separator.join(queue))
+            self._record(header, start)
+            reply = reply.strip()
+            if key == '*OPC':
+                self._unsynchronized = False
+            if cacheable:
+                self._replies[header] = reply
+            return reply
+
+    # name of query() in older pyvisa versions, which several drivers still use
+    ask = query
+
+    def read(self):
+        """ Read a pending reply from the instrument.
+
+        @return str: the reply
+        """
+        with self._lock:
+            self.flush()
+            start = time.perf_counter()
+            reply = self.resource.read()
+            self._record('READ', start)
+            return reply
+
+    def close(self):
+        """ Send all queued commands and close the resource. """
+        with self._lock:
+            self.flush()
+            self.resource.close()
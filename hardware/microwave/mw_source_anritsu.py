@@ -26,6 +26,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 import visa
 
 from core.base import Base
+from hardware.instrument_io import InstrumentConnection
 from interface.microwave_interface import MicrowaveInterface
 from interface.microwave_interface import MicrowaveLimits
 from interface.microwave_interface import MicrowaveMode
@@ -71,8 +72,12 @@ class MicrowaveAnritsu(Base, MicrowaveInterface):
         # trying to load the visa connection to the module
         self.rm = visa.ResourceManager()
         try:
-            self._gpib_connection = self.rm.open_resource(self._gpib_address,
-                                                          timeout=self._gpib_timeout*1000)
+            # the list index moves with every trigger and the number of sweep
+            # points follows from start, stop and step, so both are never cached
+            self._gpib_connection = InstrumentConnection(
+                self.rm.open_resource(self._gpib_address,
+                                      timeout=self._gpib_timeout*1000),
+                volatile=(':LIST:IND', ':SWE:POIN'))
         except:
             self.log.error('This is MWanritsu: could not connect to the GPIB '
                         'address >>{}<<.'.format(self._gpib_address))
@@ -249,7 +254,7 @@ class MicrowaveAnritsu(Base, MicrowaveInterface):
         @return int: error code (0:OK, -1:error)
         """
         self._gpib_connection.write(':FREQ:MODE LIST')
-        self._gpib_connection.write(':OUTP ON')
+        self._gpib_connection.write('OUTP:STAT ON')
         self._gpib_connection.write('*WAI')
 
         return 0
@@ -307,6 +312,6 @@ class MicrowaveAnritsu(Base, MicrowaveInterface):
         @return int: error code (0:OK, -1:error)
         """
         self._gpib_connection.write(':FREQ:MODE SWEEP')
-        self._gpib_connection.write(':OUTP ON')
+        self._gpib_connection.write('OUTP:STAT ON')
         self._gpib_connection.write('*WAI')
         return 0
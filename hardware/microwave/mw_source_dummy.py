@@ -22,6 +22,8 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 
 import random
 
+import numpy as np
+
 from core.base import Base
 from interface.microwave_interface import MicrowaveInterface
 from interface.microwave_interface import MicrowaveLimits
@@ -54,6 +56,10 @@ class MicrowaveDummy(Base, MicrowaveInterface):
         except:
             self.log.error('No visa connection installed. Please install pyvisa.')
 
+        # frequencies of the last list or sweep, the dummy ODMR counter
+        # simulates its spectrum at these frequencies
+        self._frequency_list = None
+
     def on_activate(self, e):
         """ Initialisation performed during activation of the module.
 
@@ -173,6 +179,7 @@ class MicrowaveDummy(Base, MicrowaveInterface):
 
         self.log.warning(
             'MicrowaveDummy>set_list,\nfrequency: {0}Hz\npower : {1}dBm'.format(freq, power))
+        self._frequency_list = np.array(freq, dtype=float)
         return 0
 
     def reset_listpos(self):
@@ -215,8 +222,16 @@ class MicrowaveDummy(Base, MicrowaveInterface):
         """
         self.log.warning(
             'MicrowaveDummy>set_sweep {0} {1} {2} {3}'.format(start, stop, step, power))
+        self._frequency_list = np.arange(start, stop + step, step)
         return 0
 
+    def get_frequency_list(self):
+        """ Frequencies of the last list or sweep, only for dummy hardware.
+
+        @return numpy.ndarray: the frequencies in Hz, None if none was set
+        """
+        return self._frequency_list
+
     def reset_sweep(self):
         """ Reset of MW sweep position to start
 
@@ -27,6 +27,8 @@ import visa
 import numpy as np
 
 from core.base import Base
+from hardware.instrument_io import InstrumentConnection
+from hardware.instrument_io import LoopbackInstrument
 from interface.microwave_interface import MicrowaveInterface
 from interface.microwave_interface import MicrowaveLimits
 from interface.microwave_interface import MicrowaveMode
@@ -71,11 +73,23 @@ class MicrowaveSmiq(Base, MicrowaveInterface):
                 'This is MWSMIQ: did not find >>gpib_timeout<< in '
                 'configration. I will set it to 10 seconds.')
 
+        if 'loopback' in config.keys() and config['loopback']:
+            # simulated instrument answering with the last settings
+            self.rm = None
+            self._gpib_connection = InstrumentConnection(
+                LoopbackInstrument(idn='Rohde&Schwarz,SMIQ06B,0,5.90'))
+            self.model = self._gpib_connection.query('*IDN?').split(',')[1]
+            self.log.info('MWSMIQ initialised with a loopback connection.')
+            return
+
         # trying to load the visa connection to the module
         self.rm = visa.ResourceManager()
         try:
-            self._gpib_connection = self.rm.open_resource(self._gpib_address,
-                                                          timeout=self._gpib_timeout)
+            # redundant settings and synchronizations are skipped by the
+            # connection, queries for the list length are always sent
+            self._gpib_connection = InstrumentConnection(
+                self.rm.open_resource(self._gpib_address, timeout=self._gpib_timeout),
+                volatile=(':LIST:FREQ:POIN', ':SWE:FREQ:POIN'))
         except:
             self.log.error(
                 'This is MWSMIQ: could not connect to the GPIB '
@@ -93,7 +107,8 @@ class MicrowaveSmiq(Base, MicrowaveInterface):
         """
 
         self._gpib_connection.close()
-        self.rm.close()
+        if self.rm is not None:
+            self.rm.close()
 
     def get_limits(self):
         limits = MicrowaveLimits()
@@ -140,8 +155,9 @@ class MicrowaveSmiq(Base, MicrowaveInterface):
         @return int: error code (0:OK, -1:error)
         """
 
-        self._gpib_connection.write(':OUTP ON')
-        self._gpib_connection.write('*WAI')
+        with self._gpib_connection.batch():
+            self._gpib_connection.write(':OUTP ON')
+            self._gpib_connection.write('*WAI')
 
         return 0
 
@@ -151,10 +167,11 @@ class MicrowaveSmiq(Base, MicrowaveInterface):
         @return int: error code (0:OK, -1:error)
         """
 
-        if self._gpib_connection.query(':FREQ:MODE?') != 'CW':
-            self._gpib_connection.write(':FREQ:MODE CW')
-        self._gpib_connection.write(':OUTP OFF')
-        self._gpib_connection.write('*WAI')
+        with self._gpib_connection.batch():
+            if self._gpib_connection.query(':FREQ:MODE?') != 'CW':
+                self._gpib_connection.write(':FREQ:MODE CW')
+            self._gpib_connection.write(':OUTP OFF')
+            self._gpib_connection.write('*WAI')
 
         return 0
 
@@ -210,16 +227,14 @@ class MicrowaveSmiq(Base, MicrowaveInterface):
         Interleave option is used for arbitrary waveform generator devices.
         """
         error = 0
-        self._gpib_connection.write(':FREQ:MODE CW')
+        if freq is None or power is None:
+            return -1
 
-        if freq is not None:
+        with self._gpib_connection.batch():
+            self._gpib_connection.write(':FREQ:MODE CW')
             error = self.set_frequency(freq)
-        else:
-            return -1
-        if power is not None:
-            error = self.set_power(power)
-        else:
-            return -1
+            if error == 0:
+                error = self.set_power(power)
         return error
 
     def set_list(self, freq=None, power=None):
@@ -233,35 +248,37 @@ class MicrowaveSmiq(Base, MicrowaveInterface):
         error = 0
 #        if self.set_cw(freq[0],power) != 0:
 #            error = -1
-        self._gpib_connection.write('*WAI')
-        self._gpib_connection.write(':LIST:DEL:ALL')
-        self._gpib_connection.write('*WAI')
-        self._gpib_connection.write(":LIST:SEL 'ODMR'")
-
-        # put al frequencies into a string, first element is doubled
-        # so there are n+1 list entries for scanning n frequencies
-        # due to counter/trigger issues
-        freqstring = ' {0:f},'.format(freq[0])
-        for f in freq[:-1]:
-            freqstring += ' {0:f},'.format(f)
-        freqstring += ' {0:f}'.format(freq[-1])
-
-        freqcommand = ':LIST:FREQ' + freqstring
-        #print(freqcommand)
-        self._gpib_connection.write(freqcommand)
-        self._gpib_connection.write('*WAI')
-
-        # there are n+1 list entries for scanning n frequencies
-        # due to counter/trigger issues
-        powcommand = ':LIST:POW {0}{1}'.format(power, (', ' + str(power)) * len(freq))
-        #print(powcommand)
-        self._gpib_connection.write(powcommand)
-
-        self._gpib_connection.write('*WAI')
-        self._gpib_connection.write(':LIST:MODE STEP')
-        self._gpib_connection.write('*WAI')
-
-        n = int(np.round(float(self._gpib_connection.query(':LIST:FREQ:POIN?'))))
+        # all settings are sent in one go together with the final query
+        with self._gpib_connection.batch():
+            self._gpib_connection.write('*WAI')
+            self._gpib_connection.write(':LIST:DEL:ALL')
+            self._gpib_connection.write('*WAI')
+            self._gpib_connection.write(":LIST:SEL 'ODMR'")
+
+            # put al frequencies into a string, first element is doubled
+            # so there are n+1 list entries for scanning n frequencies
+            # due to counter/trigger issues
+            freqstring = ' {0:f},'.format(freq[0])
+            for f in freq[:-1]:
+                freqstring += ' {0:f},'.format(f)
+            freqstring += ' {0:f}'.format(freq[-1])
+
+            freqcommand = ':LIST:FREQ' + freqstring
+            #print(freqcommand)
+            self._gpib_connection.write(freqcommand)
+            self._gpib_connection.write('*WAI')
+
+            # there are n+1 list entries for scanning n frequencies
+            # due to counter/trigger issues
+            powcommand = ':LIST:POW {0}{1}'.format(power, (', ' + str(power)) * len(freq))
+            #print(powcommand)
+            self._gpib_connection.write(powcommand)
+
+            self._gpib_connection.write('*WAI')
+            self._gpib_connection.write(':LIST:MODE STEP')
+            self._gpib_connection.write('*WAI')
+
+            n = int(np.round(float(self._gpib_connection.query(':LIST:FREQ:POIN?'))))
 
         if n != len(freq) + 1:
             error = -1
@@ -272,8 +289,9 @@ class MicrowaveSmiq(Base, MicrowaveInterface):
 
         @return int: error code (0:OK, -1:error)
         """
-        self._gpib_connection.write(':ABOR:LIST')
-        self._gpib_connection.write('*WAI')
+        with self._gpib_connection.batch():
+            self._gpib_connection.write(':ABOR:LIST')
+            self._gpib_connection.write('*WAI')
         return 0
 
     def set_sweep(self, start, stop, step, power):
@@ -285,18 +303,19 @@ class MicrowaveSmiq(Base, MicrowaveInterface):
         @param power:
         @return:
         """
-        self._gpib_connection.write(':SOUR:POW ' + str(power))
-        self._gpib_connection.write('*WAI')
-
-        self._gpib_connection.write(':SWE:MODE STEP')
-        self._gpib_connection.write(':SOUR:FREQ:STAR ' + str(start-step))
-        self._gpib_connection.write(':SOUR:FREQ:STOP ' + str(stop))
-        self._gpib_connection.write(':SOUR:SWE:SPAC LIN')
-        self._gpib_connection.write(':SOUR:SWE:STEP ' + str(step))
-        self._gpib_connection.write(':TRIG1:SWE:SOUR EXT')
-        self._gpib_connection.write(':TRIG1:SLOP POS')
-        self._gpib_connection.write('*WAI')
-        n = int(np.round(float(self._gpib_connection.query(':SWE:FREQ:POIN?'))))
+        with self._gpib_connection.batch():
+            self._gpib_connection.write(':SOUR:POW ' + str(power))
+            self._gpib_connection.write('*WAI')
+
+            self._gpib_connection.write(':SWE:MODE STEP')
+            self._gpib_connection.write(':SOUR:FREQ:STAR ' + str(start-step))
+            self._gpib_connection.write(':SOUR:FREQ:STOP ' + str(stop))
+            self._gpib_connection.write(':SOUR:SWE:SPAC LIN')
+            self._gpib_connection.write(':SOUR:SWE:STEP ' + str(step))
+            self._gpib_connection.write(':TRIG1:SWE:SOUR EXT')
+            self._gpib_connection.write(':TRIG1:SLOP POS')
+            self._gpib_connection.write('*WAI')
+            n = int(np.round(float(self._gpib_connection.query(':SWE:FREQ:POIN?'))))
         # print(n)
         # if n != len(self._mw_frequency_list):
         #     return -1
@@ -307,8 +326,9 @@ class MicrowaveSmiq(Base, MicrowaveInterface):
 
         @return int: error code (0:OK, -1:error)
         """
-        self._gpib_connection.write(':ABOR:SWE')
-        self._gpib_connection.write('*WAI')
+        with self._gpib_connection.batch():
+            self._gpib_connection.write(':ABOR:SWE')
+            self._gpib_connection.write('*WAI')
         return 0
 
     def sweep_on(self):
@@ -316,30 +336,32 @@ class MicrowaveSmiq(Base, MicrowaveInterface):
 
         @return int: error code (1: ready, 0:not ready, -1:error)
         """
-        self._gpib_connection.write(':FREQ:MODE SWE')
-        self._gpib_connection.write('*WAI')
-        self._gpib_connection.write(':OUTP ON')
-        self._gpib_connection.write('*WAI')
-        # If there are timeout  problems after this command, update the smiq
-        # firmware to > 5.90 as there was a problem with excessive wait times
-        # after issuing :LIST:LEARN over a GPIB connection in firmware 5.88
-        return int(self._gpib_connection.query('*OPC?'))
+        with self._gpib_connection.batch():
+            self._gpib_connection.write(':FREQ:MODE SWE')
+            self._gpib_connection.write('*WAI')
+            self._gpib_connection.write(':OUTP ON')
+            self._gpib_connection.write('*WAI')
+            # If there are timeout  problems after this command, update the smiq
+            # firmware to > 5.90 as there was a problem with excessive wait times
+            # after issuing :LIST:LEARN over a GPIB connection in firmware 5.88
+            return int(self._gpib_connection.query('*OPC?'))
 
     def list_on(self):
         """ Switches on the list mode.
 
         @return int: error code (1: ready, 0:not ready, -1:error)
         """
-        self._gpib_connection.write(':OUTP ON')
-        self._gpib_connection.write('*WAI')
-        self._gpib_connection.write(':LIST:LEARN')
-        self._gpib_connection.write('*WAI')
-        # If there are timeout  problems after this command, update the smiq
-        # firmware to > 5.90 as there was a problem with excessive wait times
-        # after issuing :LIST:LEARN over a GPIB connection in firmware 5.88
-        self._gpib_connection.write(':FREQ:MODE LIST')
-        self._gpib_connection.write('*WAI')
-        return int(self._gpib_connection.query('*OPC?'))
+        with self._gpib_connection.batch():
+            self._gpib_connection.write(':OUTP ON')
+            self._gpib_connection.write('*WAI')
+            self._gpib_connection.write(':LIST:LEARN')
+            self._gpib_connection.write('*WAI')
+            # If there are timeout  problems after this command, update the smiq
+            # firmware to > 5.90 as there was a problem with excessive wait times
+            # after issuing :LIST:LEARN over a GPIB connection in firmware 5.88
+            self._gpib_connection.write(':FREQ:MODE LIST')
+            self._gpib_connection.write('*WAI')
+            return int(self._gpib_connection.query('*OPC?'))
 
     def set_ext_trigger(self, pol=TriggerEdge.RISING):
         """ Set the external trigger for this device with proper polarization.
@@ -24,6 +24,7 @@ import visa
 import numpy as np
 
 from core.base import Base
+from hardware.instrument_io import InstrumentConnection
 from interface.microwave_interface import MicrowaveInterface
 from interface.microwave_interface import MicrowaveLimits
 from interface.microwave_interface import MicrowaveMode
@@ -77,8 +78,9 @@ class MicrowaveSMR20(Base, MicrowaveInterface):
         # trying to load the visa connection to the module
         self.rm = visa.ResourceManager()
         try:
-            self._gpib_connection = self.rm.open_resource(self._gpib_address,
-                                                          timeout=self._gpib_timeout)
+            self._gpib_connection = InstrumentConnection(
+                self.rm.open_resource(self._gpib_address, timeout=self._gpib_timeout),
+                volatile=(':SOUR:LIST:FREQ:POIN',))
             #self._gpib_connection.term_chars = "\r\n"
 
             self.log.info('MicrowaveSMR20: initialised and connected to '
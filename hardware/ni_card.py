@@ -23,9 +23,13 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 import numpy as np
 import re
 
-import PyDAQmx as daq
+try:
+    import PyDAQmx as daq
+except ImportError:
+    daq = None
 
 from core.base import Base
+from hardware import ni_daqmx_simulator
 from interface.slow_counter_interface import SlowCounterInterface
 from interface.odmr_counter_interface import ODMRCounterInterface
 from interface.confocal_scanner_interface import ConfocalScannerInterface
@@ -178,6 +182,9 @@ class NICard(Base, SlowCounterInterface, ConfocalScannerInterface, ODMRCounterIn
                                                 # mainly used for gated counter
 
         config = self.getConfiguration()
+        self._select_daq_backend(config)
+        # count on rising edge mainly used for gated counter
+        self._counting_edge_default = daq.DAQmx_Val_Rising
 
         # handle all the parameters given by the config
         # FIXME: Suggestion: and  partially set the parameters to default values
@@ -414,6 +421,49 @@ class NICard(Base, SlowCounterInterface, ConfocalScannerInterface, ODMRCounterIn
         """
         self.reset_hardware()
 
+    def _select_daq_backend(self, config):
+        """ Use either the PyDAQmx driver or its software simulation.
+
+        @param dict config: configuration of the module. With 'simulate: True'
+                            all DAQmx calls go to the module
+                            hardware.ni_daqmx_simulator, which emulates counters,
+                            clocks and analog outputs with realistic timing.
+                            The optional parameters 'simulated_count_rate',
+                            'simulated_gate_frequency' and
+                            'simulated_gate_length' set the emulated signals.
+
+        Since the DAQmx calls of this module go through the module wide name
+        daq, the selected backend applies to all NICard instances.
+        """
+        global daq
+        if 'simulate' in config.keys() and config['simulate']:
+            daq = ni_daqmx_simulator
+            daq.configure(
+                count_rate=config.get('simulated_count_rate'),
+                gate_frequency=config.get('simulated_gate_frequency'),
+                gate_length=config.get('simulated_gate_length'))
+            self.log.info('NICard runs on the simulated DAQmx backend.')
+        elif daq is None or daq is ni_daqmx_simulator:
+            try:
+                import PyDAQmx
+            except ImportError:
+                self.log.error('PyDAQmx is not installed. Install it or set "simulate: True" '
+                               'in the config to use the simulated NI card.')
+                raise
+            daq = PyDAQmx
+
+    def get_daq_statistics(self):
+        """ Read statistics of the simulated DAQmx backend.
+
+        @return OrderedDict: per task number of reads, samples read, time spent
+                             waiting for samples, maximum read latency, buffer
+                             overflows, underruns and timeouts. Empty if the
+                             real driver is used.
+        """
+        if daq is ni_daqmx_simulator:
+            return daq.get_statistics()
+        return {}
+
     # =================== SlowCounterInterface Commands ========================
 
     def set_up_clock(self, clock_frequency=None, clock_channel=None, scanner=False, idle=False):
@@ -845,6 +895,17 @@ class NICard(Base, SlowCounterInterface, ConfocalScannerInterface, ODMRCounterIn
         # normalize to counts per second and return data
         return count_data * self._clock_frequency
 
+    def get_counter_channels(self):
+        """ Returns the photon sources of the counter channels.
+
+        @return list(str): the photon sources in the order of the rows returned
+                           by get_counter
+        """
+        channels = [self._photon_source]
+        if self._photon_source2 is not None:
+            channels.append(self._photon_source2)
+        return channels
+
     def close_counter(self, scanner=False):
         """ Closes the counter or scanner and cleans up afterwards.
 
@@ -1074,7 +1135,7 @@ class NICard(Base, SlowCounterInterface, ConfocalScannerInterface, ODMRCounterIn
 
             # create the actual analog output task on the hardware device. Via
             # byref you pass the pointer of the object to the TaskCreation function:
-        daq.DAQmxCreateTask('ScannerAnalogOutput', daq.byref(self._scanner_ao_task))
+            daq.DAQmxCreateTask('ScannerAnalogOutput', daq.byref(self._scanner_ao_task))
 
             # Assign and configure the created task to an analog output voltage channel.
             daq.DAQmxCreateAOVoltageChan(
@@ -1558,6 +1619,39 @@ class NICard(Base, SlowCounterInterface, ConfocalScannerInterface, ODMRCounterIn
 
         return self._real_data*(self._scanner_clock_frequency)
 
+    def scan_line_with_return(self, line_path=None, return_path=None, start_path=None):
+        """ Moves along the start path, the line and the return path in a single
+        scan and returns the counts on the line only.
+
+        @param float[][n] line_path: array of n-part tuples defining the
+                                     positions of the pixels of the line
+        @param float[][n] return_path: positions passed after the line
+        @param float[][n] start_path: positions passed before the line
+
+        @return float[]: the photon counts per second of the line pixels
+
+        All paths are written to the analog output at once, so the tasks are
+        configured, started and read only once for the whole trajectory instead
+        of once for every part of it.
+        """
+        paths = [path for path in (start_path, line_path, return_path) if path is not None]
+        for path in paths:
+            if not isinstance(path, (frozenset, list, set, tuple, np.ndarray, )):
+                self.log.error('Given line_path list is not array type.')
+                return np.array([-1.])
+        if line_path is None:
+            self.log.error('No line given to scan.')
+            return np.array([-1.])
+
+        trajectory = np.hstack([np.asarray(path, dtype=float) for path in paths])
+        count_data = self.scan_line(trajectory)
+        if count_data[0] == -1:
+            return count_data
+
+        # only the counts on the line are of interest
+        start_length = 0 if start_path is None else np.shape(start_path)[1]
+        return count_data[start_length:start_length + np.shape(line_path)[1]]
+
     def close_scanner(self):
         """ Closes the scanner and cleans up afterwards.
 
@@ -1856,7 +1950,7 @@ class NICard(Base, SlowCounterInterface, ConfocalScannerInterface, ODMRCounterIn
             if ret_v != 0:
                 return ret_v
 
-            if task_done.value() == 0:
+            if task_done.value == 0:
                 return 1
             else:
                 return 2
@@ -2115,6 +2209,7 @@ class SlowGatedNICard(NICard):
         self._counter_channel = '/NIDAQ/Ctr0'
 
         config = self.getConfiguration()
+        self._select_daq_backend(config)
 
         if 'photon_source' in config.keys():
             self._photon_source=config['photon_source']
@@ -2203,6 +2298,13 @@ class SlowGatedNICard(NICard):
         """
         return self.get_gated_counts(samples=samples)
 
+    def get_counter_channels(self):
+        """ Returns the photon source of the gated counter.
+
+        @return list(str): the photon source of the counts returned by get_counter
+        """
+        return [self._photon_source]
+
     def close_counter(self):
         """ Closes the counter and cleans up afterwards.
 
@@ -0,0 +1,515 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains a software emulation of the part of the PyDAQmx API which
+is used by the Qudi NICard hardware module.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import ctypes
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# The module is used in place of PyDAQmx, i.e. as
+#     from hardware import ni_daqmx_simulator as daq
+# Therefore all names below follow the PyDAQmx naming.
+
+TaskHandle = ctypes.c_void_p
+int32 = ctypes.c_int32
+uInt32 = ctypes.c_uint32
+bool32 = ctypes.c_uint32
+byref = ctypes.byref
+
+DAQmx_Val_Rising = 10280
+DAQmx_Val_Falling = 10171
+DAQmx_Val_High = 10192
+DAQmx_Val_Low = 10214
+DAQmx_Val_Hz = 10373
+DAQmx_Val_Ticks = 10304
+DAQmx_Val_Volts = 10348
+DAQmx_Val_ContSamps = 10123
+DAQmx_Val_FiniteSamps = 10178
+DAQmx_Val_OnDemand = 10390
+DAQmx_Val_SampClk = 10388
+DAQmx_Val_CurrReadPos = 10425
+DAQmx_Val_DoNotOverwriteUnreadSamps = 10159
+DAQmx_Val_OverwriteUnreadSamps = 10252
+DAQmx_Val_GroupByChannel = 0
+DAQmx_Val_DoNotInvertPolarity = 0
+
+# error codes of the real driver for the emulated failure modes
+_ERR_TIMEOUT = -200284
+_ERR_OVERFLOW = -200279
+_ERR_INVALID_TASK = -200088
+_ERR_RESOURCE_RESERVED = -50103
+
+
+class DAQError(Exception):
+    """ Error raised by the emulated DAQmx functions, like PyDAQmx.DAQError. """
+    def __init__(self, error, mess, fname):
+        self.error = error
+        self.mess = mess
+        self.fname = fname
+        super().__init__('In function {0}: {1} ({2})'.format(fname, mess, error))
+
+
+class _SimulatedTask:
+    """ State of a single emulated DAQmx task. """
+    def __init__(self, name):
+        self.name = name
+        self.channel = None
+        self.kind = None
+        self.frequency = None
+        self.term = None
+        self.source = None
+        self.sample_mode = DAQmx_Val_ContSamps
+        self.samples_per_channel = 1000
+        self.read_offset = 0
+        self.overwrite = DAQmx_Val_DoNotOverwriteUnreadSamps
+        self.read_all_available = False
+        self.timing_type = DAQmx_Val_OnDemand
+        self.running = False
+        self.start_time = None
+        self.stop_time = None
+        self.read_position = 0
+        self.ao_buffer = None
+
+
+class _SimulatedDevice:
+    """ Software model of an NI card with counters, clocks and analog outputs.
+
+    Counter input tasks produce one sample per semi period of the clock task
+    they are connected to, i.e. twice per clock period, or one sample per
+    external gate. The number of available samples is derived from the time
+    which has elapsed since the tasks were started. Reads block like the real
+    driver until the requested samples are acquired or the timeout expires.
+    """
+    def __init__(self):
+        self.count_rate = 1e5
+        self.gate_frequency = 1e3
+        self.gate_length = 1e-4
+        self.reset()
+
+    def reset(self):
+        self.tasks = OrderedDict()
+        self.routes = dict()
+        self.ao_position = dict()
+        self._next_handle = 1
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        self.statistics = OrderedDict()
+
+    def _stats(self, task):
+        if task.name not in self.statistics:
+            self.statistics[task.name] = OrderedDict([
+                ('reads', 0),
+                ('samples_read', 0),
+                ('read_wait_time', 0.),
+                ('max_read_latency', 0.),
+                ('overflows', 0),
+                ('underruns', 0),
+                ('timeouts', 0)])
+        return self.statistics[task.name]
+
+    def task(self, handle, fname):
+        key = handle.value if isinstance(handle, TaskHandle) else handle
+        if key not in self.tasks:
+            raise DAQError(_ERR_INVALID_TASK, 'Task specified is invalid or does not exist.', fname)
+        return self.tasks[key]
+
+    def create_task(self, name, handle_ref):
+        handle = handle_ref._obj
+        handle.value = self._next_handle
+        self.tasks[self._next_handle] = _SimulatedTask(name)
+        self._next_handle += 1
+
+    def clock_for(self, task):
+        """ Clock task whose internal output drives the given task. """
+        if task.term is None or not task.term.endswith('InternalOutput'):
+            return None
+        channel = task.term[:-len('InternalOutput')]
+        for other in self.tasks.values():
+            if other.kind == 'co' and other.channel == channel:
+                return other
+        return None
+
+    def clock_pulses(self, clock, now):
+        """ Number of pulses a clock task has generated until now. """
+        if clock.start_time is None:
+            return 0
+        end = now if clock.running else clock.stop_time
+        pulses = int(max(end - clock.start_time, 0) * clock.frequency)
+        if clock.sample_mode == DAQmx_Val_FiniteSamps:
+            pulses = min(pulses, clock.samples_per_channel)
+        return pulses
+
+    def sample_rate(self, task):
+        """ Samples per second produced by a counter input task. """
+        if task.kind == 'ci_pulse_width':
+            return self.gate_frequency
+        clock = self.clock_for(task)
+        if clock is None:
+            return 0.
+        return 2 * clock.frequency
+
+    def acquired_samples(self, task, now):
+        """ Number of samples an input task has acquired until now. """
+        if task.start_time is None:
+            return 0
+        end = now if task.running else task.stop_time
+        if task.kind == 'ci_pulse_width':
+            samples = int(max(end - task.start_time, 0) * self.gate_frequency)
+        else:
+            clock = self.clock_for(task)
+            if clock is None or clock.start_time is None:
+                return 0
+            if clock.running:
+                clock_end = end
+            else:
+                clock_end = min(end, clock.stop_time)
+            start = max(task.start_time, clock.start_time)
+            samples = int(max(clock_end - start, 0) * 2 * clock.frequency)
+            if clock.sample_mode == DAQmx_Val_FiniteSamps:
+                samples = min(samples, 2 * clock.samples_per_channel)
+        if task.sample_mode == DAQmx_Val_FiniteSamps:
+            samples = min(samples, task.samples_per_channel)
+        return samples
+
+    def finite_end_time(self, task):
+        """ Time at which a finite task is done, None for continuous tasks. """
+        if task.start_time is None:
+            return None
+        if task.kind == 'co':
+            if task.sample_mode != DAQmx_Val_FiniteSamps:
+                return None
+            return task.start_time + task.samples_per_channel / task.frequency
+        if task.kind in ('ci_semi', 'ci_pulse_width'):
+            if task.sample_mode != DAQmx_Val_FiniteSamps:
+                return None
+            rate = self.sample_rate(task)
+            if rate <= 0:
+                return None
+            start = task.start_time
+            clock = self.clock_for(task)
+            if clock is not None and clock.start_time is not None:
+                start = max(start, clock.start_time)
+            return start + task.samples_per_channel / rate
+        return task.start_time
+
+    def counts_per_sample(self, task):
+        """ Expected photon counts in one sample of a counter input task. """
+        if task.kind == 'ci_pulse_width':
+            return self.count_rate * self.gate_length
+        rate = self.sample_rate(task)
+        if rate <= 0:
+            return 0.
+        return self.count_rate / rate
+
+
+_device = _SimulatedDevice()
+
+
+def configure(count_rate=None, gate_frequency=None, gate_length=None):
+    """ Set the parameters of the emulated signals.
+
+    @param float count_rate: photon count rate at every photon source in counts/s
+    @param float gate_frequency: rate of the external gates for gated counting in Hz
+    @param float gate_length: length of each external gate in s
+    """
+    if count_rate is not None:
+        _device.count_rate = float(count_rate)
+    if gate_frequency is not None:
+        _device.gate_frequency = float(gate_frequency)
+    if gate_length is not None:
+        _device.gate_length = float(gate_length)
+
+
+def get_statistics():
+    """ Per task statistics of all read operations since the last reset.
+
+    @return OrderedDict: task name as key and a dict with the number of reads,
+                         samples read, total time spent waiting for samples,
+                         maximum read latency, buffer overflows, underruns and
+                         timeouts as item.
+    """
+    return OrderedDict((name, OrderedDict(stats)) for name, stats in _device.statistics.items())
+
+
+def reset_statistics():
+    """ Clear the recorded read statistics. """
+    _device.reset_statistics()
+
+
+def get_ao_position(channel=None):
+    """ Last voltages written to the analog outputs.
+
+    @param str channel: optional, the channel string of an analog output task
+
+    @return dict or numpy.ndarray: voltages of all tasks or of the given one
+    """
+    if channel is None:
+        return dict(_device.ao_position)
+    return _device.ao_position.get(channel)
+
+
+# ============================ task configuration =============================
+
+def DAQmxResetDevice(device):
+    for handle in list(_device.tasks):
+        task = _device.tasks[handle]
+        if task.channel is None or ('/' + device + '/') in task.channel:
+            del _device.tasks[handle]
+    return 0
+
+
+def DAQmxCreateTask(name, handle_ref):
+    _device.create_task(name, handle_ref)
+    return 0
+
+
+def DAQmxClearTask(handle):
+    task = _device.task(handle, 'DAQmxClearTask')
+    for key, value in list(_device.tasks.items()):
+        if value is task:
+            del _device.tasks[key]
+    return 0
+
+
+def DAQmxCreateCOPulseChanFreq(handle, channel, name, units, idle_state, initial_delay,
+                               frequency, duty_cycle):
+    task = _device.task(handle, 'DAQmxCreateCOPulseChanFreq')
+    for other in _device.tasks.values():
+        if other is not task and other.kind == 'co' and other.channel == channel:
+            raise DAQError(_ERR_RESOURCE_RESERVED, 'Resource {0} is reserved.'.format(channel),
+                           'DAQmxCreateCOPulseChanFreq')
+    task.kind = 'co'
+    task.channel = channel
+    task.frequency = float(frequency)
+    return 0
+
+
+def DAQmxCreateCISemiPeriodChan(handle, channel, name, min_val, max_val, units, scale):
+    task = _device.task(handle, 'DAQmxCreateCISemiPeriodChan')
+    task.kind = 'ci_semi'
+    task.channel = channel
+    return 0
+
+
+def DAQmxCreateCIPulseWidthChan(handle, channel, name, min_val, max_val, units, edge, scale):
+    task = _device.task(handle, 'DAQmxCreateCIPulseWidthChan')
+    task.kind = 'ci_pulse_width'
+    task.channel = channel
+    return 0
+
+
+def DAQmxCreateAOVoltageChan(handle, channels, name, min_val, max_val, units, scale):
+    task = _device.task(handle, 'DAQmxCreateAOVoltageChan')
+    task.kind = 'ao'
+    task.channel = channels
+    return 0
+
+
+def DAQmxSetCISemiPeriodTerm(handle, channel, term):
+    _device.task(handle, 'DAQmxSetCISemiPeriodTerm').term = term
+    return 0
+
+
+def DAQmxSetCIPulseWidthTerm(handle, channel, term):
+    _device.task(handle, 'DAQmxSetCIPulseWidthTerm').term = term
+    return 0
+
+
+def DAQmxSetCICtrTimebaseSrc(handle, channel, source):
+    _device.task(handle, 'DAQmxSetCICtrTimebaseSrc').source = source
+    return 0
+
+
+def DAQmxCfgImplicitTiming(handle, sample_mode, samples_per_channel):
+    task = _device.task(handle, 'DAQmxCfgImplicitTiming')
+    task.sample_mode = sample_mode
+    task.samples_per_channel = int(samples_per_channel)
+    return 0
+
+
+def DAQmxCfgSampClkTiming(handle, source, rate, active_edge, sample_mode, samples_per_channel):
+    task = _device.task(handle, 'DAQmxCfgSampClkTiming')
+    task.term = source
+    task.sample_mode = sample_mode
+    task.samples_per_channel = int(samples_per_channel)
+    task.timing_type = DAQmx_Val_SampClk
+    return 0
+
+
+def DAQmxSetSampTimingType(handle, timing_type):
+    _device.task(handle, 'DAQmxSetSampTimingType').timing_type = timing_type
+    return 0
+
+
+def DAQmxSetReadRelativeTo(handle, relative_to):
+    _device.task(handle, 'DAQmxSetReadRelativeTo')
+    return 0
+
+
+def DAQmxSetReadOffset(handle, offset):
+    _device.task(handle, 'DAQmxSetReadOffset').read_offset = int(offset)
+    return 0
+
+
+def DAQmxSetReadOverWrite(handle, overwrite):
+    _device.task(handle, 'DAQmxSetReadOverWrite').overwrite = overwrite
+    return 0
+
+
+def DAQmxSetReadReadAllAvailSamp(handle, read_all):
+    _device.task(handle, 'DAQmxSetReadReadAllAvailSamp').read_all_available = bool(read_all)
+    return 0
+
+
+def DAQmxGetTaskNumChans(handle, number_ref):
+    task = _device.task(handle, 'DAQmxGetTaskNumChans')
+    number_ref._obj.value = len(task.channel.split(',')) if task.channel else 0
+    return 0
+
+
+def DAQmxConnectTerms(source, destination, polarity):
+    _device.routes[destination] = source
+    return 0
+
+
+def DAQmxDisconnectTerms(source, destination):
+    _device.routes.pop(destination, None)
+    return 0
+
+
+# ============================== task execution ===============================
+
+def DAQmxStartTask(handle):
+    task = _device.task(handle, 'DAQmxStartTask')
+    if not task.running:
+        task.running = True
+        task.start_time = time.perf_counter()
+        task.stop_time = None
+        task.read_position = 0
+        if task.kind == 'ao' and task.ao_buffer is not None:
+            _device.ao_position[task.channel] = task.ao_buffer[:, -1]
+    return 0
+
+
+def DAQmxStopTask(handle):
+    task = _device.task(handle, 'DAQmxStopTask')
+    if task.running:
+        task.running = False
+        task.stop_time = time.perf_counter()
+    return 0
+
+
+def DAQmxIsTaskDone(handle, done_ref):
+    task = _device.task(handle, 'DAQmxIsTaskDone')
+    end = _device.finite_end_time(task)
+    done = (not task.running) or (end is not None and time.perf_counter() >= end)
+    done_ref._obj.value = int(done)
+    return 0
+
+
+def DAQmxWaitUntilTaskDone(handle, timeout):
+    task = _device.task(handle, 'DAQmxWaitUntilTaskDone')
+    if not task.running:
+        return 0
+    end = _device.finite_end_time(task)
+    now = time.perf_counter()
+    if end is None or end - now > timeout >= 0:
+        if timeout >= 0:
+            time.sleep(timeout)
+        _device._stats(task)['timeouts'] += 1
+        raise DAQError(_ERR_TIMEOUT, 'Wait Until Done did not indicate that the task was '
+                                     'done within the specified timeout.',
+                       'DAQmxWaitUntilTaskDone')
+    if end > now:
+        time.sleep(end - now)
+    return 0
+
+
+def DAQmxWriteAnalogF64(handle, samples, autostart, timeout, data_layout, data, written_ref,
+                        reserved):
+    task = _device.task(handle, 'DAQmxWriteAnalogF64')
+    data = np.asarray(data, dtype=float)
+    task.ao_buffer = data.reshape(data.shape[0], -1)[:, :int(samples)]
+    if task.timing_type == DAQmx_Val_SampClk and task.samples_per_channel > task.ao_buffer.shape[1]:
+        _device._stats(task)['underruns'] += 1
+    if autostart or task.timing_type == DAQmx_Val_OnDemand:
+        _device.ao_position[task.channel] = task.ao_buffer[:, -1]
+    written_ref._obj.value = task.ao_buffer.shape[1]
+    return 0
+
+
+def DAQmxReadCounterU32(handle, samples, timeout, data, array_size, read_ref, reserved):
+    task = _device.task(handle, 'DAQmxReadCounterU32')
+    stats = _device._stats(task)
+    call_time = time.perf_counter()
+
+    start = task.read_position + task.read_offset
+    if samples < 0:
+        # read everything which is or will be acquired by a finite task
+        end_time = _device.finite_end_time(task)
+        if end_time is not None and end_time > call_time:
+            time.sleep(min(end_time - call_time, max(timeout, 0)))
+        samples = max(_device.acquired_samples(task, time.perf_counter()) - start, 0)
+    elif task.read_all_available:
+        samples = min(samples, max(_device.acquired_samples(task, call_time) - start, 0))
+    samples = min(int(samples), int(array_size))
+
+    # wait until the requested samples are acquired or the timeout is reached
+    needed = start + samples
+    acquired = _device.acquired_samples(task, call_time)
+    if acquired < needed:
+        rate = _device.sample_rate(task)
+        wait = (needed - acquired) / rate if rate > 0 else np.inf
+        if task.running and wait <= timeout:
+            time.sleep(wait)
+            acquired = _device.acquired_samples(task, time.perf_counter())
+        if acquired < needed:
+            if timeout > 0:
+                time.sleep(timeout)
+            stats['timeouts'] += 1
+            if task.sample_mode == DAQmx_Val_FiniteSamps or not task.running:
+                stats['underruns'] += 1
+            raise DAQError(_ERR_TIMEOUT, 'Some or all of the samples requested have not yet '
+                                         'been acquired.', 'DAQmxReadCounterU32')
+
+    # samples which were acquired but not read and did not fit into the buffer
+    if (task.sample_mode == DAQmx_Val_ContSamps and
+            task.overwrite == DAQmx_Val_DoNotOverwriteUnreadSamps and
+            acquired - start > task.samples_per_channel):
+        stats['overflows'] += 1
+        raise DAQError(_ERR_OVERFLOW, 'Attempted to read samples that are no longer available. '
+                                      'The requested sample was previously available, but has '
+                                      'since been overwritten.', 'DAQmxReadCounterU32')
+
+    data[:samples] = np.random.poisson(_device.counts_per_sample(task), samples)
+    task.read_position += samples
+    read_ref._obj.value = samples
+
+    latency = time.perf_counter() - call_time
+    stats['reads'] += 1
+    stats['samples_read'] += samples
+    stats['read_wait_time'] += latency
+    stats['max_read_latency'] = max(stats['max_read_latency'], latency)
+    return 0
@@ -31,8 +31,21 @@ class ODMRCounterDummy(Base, ODMRCounterInterface):
     _modclass = 'ODMRCounterDummy'
     _modtype = 'hardware'
 
+    # offsets in Hz and relative depths of the lines of a single resonance
+    _hyperfine_lines = {'lorentzian': ([0.], [1.]),
+                        'gaussian': ([0.], [1.]),
+                        'N14': ([-2.16e6, 0., 2.16e6], [1/3, 1/3, 1/3]),
+                        'N15': ([-1.515e6, 1.515e6], [0.5, 0.5])}
+
     # connectors
-    _in = {'fitlogic': 'FitLogic'}
+    # the spectrum is simulated at the frequencies of the list of the
+    # microwave source, or at the pixels if no source is connected or no list
+    # of the right length is set.
+    # The fit logic is not needed any more, the connector is kept so that
+    # existing configurations stay valid.
+    _in = {'fitlogic': 'FitLogic',
+           'microwave1': 'mwsourceinterface'}
+    _in_optional = ('microwave1', )
     _out = {'odmrcounter': 'ODMRCounterInterface'}
 
     def __init__(self, config, **kwargs):
@@ -51,8 +64,50 @@ class ODMRCounterDummy(Base, ODMRCounterInterface):
             self.log.warning('No clock_frequency configured taking 100 Hz '
                     'instead.')
 
+        # centers and half width at half maximum of the simulated resonances
+        # in Hz, used if the microwave source is connected
+        if 'resonances' in config.keys():
+            self._resonances = [float(center) for center in config['resonances']]
+        else:
+            self._resonances = [2865e6, 2875e6]
+        if 'linewidth' in config.keys():
+            self._linewidth = float(config['linewidth'])
+        else:
+            self._linewidth = 1e6
+
+        # shape of each resonance: 'lorentzian', 'gaussian' or a Lorentzian
+        # triplet ('N14') or doublet ('N15') of the nitrogen hyperfine lines
+        if 'line_shape' in config.keys():
+            self._line_shape = config['line_shape']
+        else:
+            self._line_shape = 'lorentzian'
+        if self._line_shape not in self._hyperfine_lines:
+            self.log.warning('Unknown line_shape {0}, taking lorentzian '
+                    'instead.'.format(self._line_shape))
+            self._line_shape = 'lorentzian'
+
+        # depth of the resonances relative to the count rate far from them
+        if 'contrast' in config.keys():
+            self._contrast = float(config['contrast'])
+        else:
+            self._contrast = 0.6
+        if 'count_rate' in config.keys():
+            self._count_rate = float(config['count_rate'])
+        else:
+            self._count_rate = 5e4
+
+        # linear drift of all resonances in Hz/s, the spectrum is recalculated
+        # whenever the resonances moved by another 1 % of the linewidth
+        if 'drift' in config.keys():
+            self._drift = float(config['drift'])
+        else:
+            self._drift = 0.
+
         self._scanner_counter_daq_task = None
         self._odmr_length = None
+        self._drift_start = time.time()
+        self._spectrum_key = None
+        self._spectrum = None
 
     def on_activate(self, e):
         """ Initialisation performed during activation of the module.
@@ -66,6 +121,9 @@ class ODMRCounterDummy(Base, ODMRCounterInterface):
                          had happened.
         """
         self._fit_logic = self.get_in_connector('fitlogic')
+        self._mw_device = self.get_in_connector('microwave1')
+        self._drift_start = time.time()
+        self._spectrum_key = None
 
     def on_deactivate(self, e):
         """ Deinitialisation performed during deactivation of the module.
@@ -150,30 +208,69 @@ class ODMRCounterDummy(Base, ODMRCounterInterface):
 
         self._odmr_length = length
 
-        count_data = np.empty((self._odmr_length,), dtype=np.uint32)
+        frequencies = None
+        if self._mw_device is not None:
+            frequencies = self._mw_device.get_frequency_list()
+        if frequencies is not None and len(frequencies) == length:
+            spectrum = self._get_spectrum(np.asarray(frequencies, dtype=float))
+        else:
+            spectrum = self._get_spectrum(None, length)
 
-        count_data = np.random.uniform(0, 5e4, length)
+        # photon shot noise of the counts in each pixel
+        counts_per_pixel = self._count_rate / self._clock_frequency
+        count_data = np.random.poisson(spectrum * counts_per_pixel) * float(self._clock_frequency)
 
-        lorentians,params = self._fit_logic.make_multiplelorentzian_model(no_of_lor=2)
+        time.sleep(self._odmr_length*1./self._clock_frequency)
 
-        sigma = 3.
+        self.unlock()
 
-        params.add('lorentz0_amplitude', value=-30000.*np.pi*sigma)
-        params.add('lorentz0_center', value=length/3)
-        params.add('lorentz0_sigma', value=sigma)
-        params.add('lorentz1_amplitude', value=-30000*np.pi*sigma)
-        params.add('lorentz1_center', value=2*length/3)
-        params.add('lorentz1_sigma', value=sigma)
-        params.add('c', value=50000.)
+        return count_data
 
-        count_data += lorentians.eval(x=np.arange(1, length+1, 1), params=params)
 
-        time.sleep(self._odmr_length*1./self._clock_frequency)
+    def _get_spectrum(self, frequencies, length=None):
+        """ Noise free spectrum relative to the count rate far from the
+        resonances.
 
-        self.unlock()
+        The spectrum is only calculated again if the frequencies changed or
+        the resonances drifted by more than 1 % of the linewidth.
 
-        return count_data
+        @param numpy.ndarray frequencies: frequency of each pixel, None to
+                                          simulate two resonances at a third
+                                          and two thirds of the pixels
+        @param int length: number of pixels if no frequencies are given
+
+        @return numpy.ndarray: the spectrum
+        """
+        if frequencies is None:
+            x = np.arange(1, length+1, 1)
+            centers = np.array([length/3, 2*length/3])
+            width = 3.
+            offsets, depths = self._hyperfine_lines['lorentzian']
+            key = (length, )
+        else:
+            x = frequencies
+            width = self._linewidth
+            offsets, depths = self._hyperfine_lines[self._line_shape]
+            step = 0.01 * width
+            drift_steps = int(round(self._drift * (time.time() - self._drift_start) / step))
+            centers = np.array(self._resonances) + drift_steps * step
+            key = (frequencies.tobytes(), drift_steps)
+        if key == self._spectrum_key:
+            return self._spectrum
+
+        # distance of every pixel from every line in units of the linewidth
+        lines = (centers[:, np.newaxis] + np.array(offsets)).ravel()
+        distance = (x[np.newaxis, :] - lines[:, np.newaxis]) / width
+        if self._line_shape == 'gaussian' and frequencies is not None:
+            profiles = np.exp(-np.log(2) * distance**2)
+        else:
+            profiles = 1 / (1 + distance**2)
+        weights = np.tile(depths, len(centers))
+        spectrum = 1 - self._contrast * weights.dot(profiles)
 
+        self._spectrum_key = key
+        self._spectrum = np.clip(spectrum, 0, None)
+        return self._spectrum
 
     def close_odmr(self):
         """ Closes the odmr and cleans up afterwards.
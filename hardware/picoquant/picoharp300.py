@@ -1038,6 +1038,13 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         time.sleep(0.05)
         return [self.get_count_rate(self._count_channel)]
 
+    def get_counter_channels(self):
+        """ Returns the name of the counter channel.
+
+        @return list(str): the channel of the count rate returned by get_counter
+        """
+        return ['Ch{0}'.format(self._count_channel)]
+
     def close_counter(self):
         """ Closes the counter and cleans up afterwards. Actually, you do not
         have to do anything with the picoharp. Therefore this command will do
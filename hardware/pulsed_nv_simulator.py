@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains a simulation backend which couples the pulser dummy and the
+fast counter dummy by evolving a simple NV spin model.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import time
+import numpy as np
+
+from core.base import Base
+
+
+class PulsedNVSimulator(Base):
+    """ Simulates the photon statistics of a single NV center driven by the
+    ensemble which is currently loaded into the pulser dummy.
+
+    The spin is treated as a two level system (ms=0 and ms=-1) described by a
+    Bloch vector. Each ensemble is evolved once element by element when it is
+    loaded; the resulting ms=0 population at the beginning of each laser pulse
+    determines the spin dependent fluorescence of that readout. The fast
+    counter histogram is then filled by drawing Poissonian counts for all
+    sweeps which happened since the last poll in a single vectorized step.
+
+    Example config:
+
+    mysimulator:
+        module.Class: 'pulsed_nv_simulator.PulsedNVSimulator'
+        count_rate: 200e3
+        contrast: 0.3
+        resonance_frequency: 2870e6
+        rabi_frequency_per_volt: 10e6
+        connect:
+            pulser: 'mydummypulser.pulser'
+    """
+    _modclass = 'PulsedNVSimulator'
+    _modtype = 'hardware'
+
+    # connectors
+    _in = {'pulser': 'PulserInterface'}
+    _out = {'simulator': 'PulsedNVSimulator'}
+
+    def __init__(self, config, **kwargs):
+        super().__init__(config=config, **kwargs)
+
+        # default values of the NV model. Every one of them can be overwritten
+        # in the config.
+        defaults = {'count_rate': 200e3,              # bright state count rate in counts/s
+                    'dark_count_rate': 200.,          # counts/s without laser
+                    'contrast': 0.3,                  # relative fluorescence drop of ms=-1
+                    'pumping_time': 250e-9,           # time constant of the optical spin pumping
+                    'resonance_frequency': 2870e6,    # spin transition in Hz
+                    'rabi_frequency_per_volt': 10e6,  # Rabi frequency for 1 V amplitude
+                    'digital_rabi_frequency': 10e6,   # Rabi frequency of a switched MW source
+                    't2': 2e-6,                       # coherence time in s
+                    't1': 5e-3}                       # longitudinal relaxation time in s
+
+        for key, value in defaults.items():
+            if key in config.keys():
+                setattr(self, '_' + key, float(config[key]))
+            else:
+                setattr(self, '_' + key, value)
+
+        if 'mw_switch_channel' in config.keys():
+            self._mw_switch_channel = config['mw_switch_channel']
+        else:
+            self._mw_switch_channel = None
+
+        self._ensemble_name = None
+        self._laser_start_times = np.array([])
+        self._laser_lengths = np.array([])
+        self._laser_populations = np.array([])
+        self._sweep_length = 0.
+
+        self._count_data = None
+        self._binwidth = 1e-9
+        self._record_length_bins = 0
+        self._gated = False
+        self._running = False
+        self._last_poll_time = 0.
+
+    def on_activate(self, e):
+        """ Initialisation performed during activation of the module.
+
+        @param object e: Event class object from Fysom.
+                         An object created by the state machine module Fysom,
+                         which is connected to a specific event (have a look in
+                         the Base Class). This object contains the passed event,
+                         the state before the event happened and the destination
+                         of the state which should be reached after the event
+                         had happened.
+        """
+        self._pulser = self.get_in_connector('pulser')
+
+    def on_deactivate(self, e):
+        """ Deinitialisation performed during deactivation of the module.
+
+        @param object e: Event class object from Fysom. A more detailed
+                         explanation can be found in method activation.
+        """
+        self._running = False
+        self._count_data = None
+
+    def start_measure(self, binwidth_s, record_length_bins, gated=False):
+        """ Reset the simulated histogram and start accumulating sweeps.
+
+        @param float binwidth_s: width of a single histogram bin in seconds
+        @param int record_length_bins: number of bins of the trace (ungated) or
+                                       of each gate (gated)
+        @param bool gated: return one row per laser pulse if True
+
+        @return int: error code (0:OK, -1:error)
+        """
+        self._binwidth = float(binwidth_s)
+        self._record_length_bins = int(record_length_bins)
+        self._gated = gated
+        self._update_ensemble()
+        self._count_data = np.zeros(self._get_trace_shape(), dtype='int64')
+        self._last_poll_time = time.time()
+        self._running = True
+        return 0
+
+    def stop_measure(self):
+        """ Stop accumulating sweeps. The histogram is kept until the next start.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        self._accumulate()
+        self._running = False
+        return 0
+
+    def pause_measure(self):
+        """ Pause the accumulation of sweeps.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        self._accumulate()
+        self._running = False
+        return 0
+
+    def continue_measure(self):
+        """ Continue the accumulation of sweeps after a pause.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        self._last_poll_time = time.time()
+        self._running = True
+        return 0
+
+    def get_data_trace(self):
+        """ Return the histogram accumulated since start_measure.
+
+        @return numpy.ndarray: 1D array (ungated) or 2D array with shape
+                               (number_of_lasers, record_length_bins) (gated)
+                               of dtype int64.
+        """
+        self._accumulate()
+        if self._count_data is None:
+            return np.zeros(self._get_trace_shape(), dtype='int64')
+        return self._count_data.copy()
+
+    def get_laser_populations(self):
+        """ Return the simulated ms=0 population in front of each laser pulse.
+
+        @return numpy.ndarray: one population value per laser pulse
+        """
+        return self._laser_populations.copy()
+
+    def _get_trace_shape(self):
+        """ Shape of the histogram for the current fast counter settings.
+
+        @return tuple: shape of the histogram array
+        """
+        if self._gated:
+            return max(len(self._laser_start_times), 1), self._record_length_bins
+        return self._record_length_bins,
+
+    def _accumulate(self):
+        """ Add the counts of all sweeps since the last poll to the histogram.
+
+        Sweeps are only simulated while the pulser is running. Since the sum of
+        Poissonian variables is again Poissonian, any number of sweeps is drawn
+        at once from the expected counts per sweep.
+        """
+        if not self._running or self._count_data is None:
+            return
+        now = time.time()
+        elapsed = now - self._last_poll_time
+        self._last_poll_time = now
+
+        if self._pulser.get_status()[0] != 1:
+            return
+        if self._ensemble_name != self._pulser.get_loaded_asset():
+            self._update_ensemble()
+            if self._count_data.shape != self._get_trace_shape():
+                self._count_data = np.zeros(self._get_trace_shape(), dtype='int64')
+        if self._sweep_length <= 0:
+            return
+
+        sweeps = elapsed / self._sweep_length
+        self._count_data += np.random.poisson(self._expected_counts() * sweeps)
+
+    def _expected_counts(self):
+        """ Expected number of counts per histogram bin for a single sweep.
+
+        @return numpy.ndarray: expected counts with the shape of the histogram
+        """
+        dark = self._dark_count_rate * self._binwidth
+        if self._laser_start_times.size == 0:
+            return np.full(self._get_trace_shape(), dark)
+
+        bin_centers = (np.arange(self._record_length_bins) + 0.5) * self._binwidth
+        if self._gated:
+            # every gate starts at the rising edge of its laser pulse
+            time_in_laser = np.broadcast_to(bin_centers,
+                                            (self._laser_start_times.size, bin_centers.size))
+            laser_index = np.arange(self._laser_start_times.size)[:, np.newaxis]
+        else:
+            laser_index = np.searchsorted(self._laser_start_times, bin_centers, side='right') - 1
+            before_first = laser_index < 0
+            laser_index[before_first] = 0
+            time_in_laser = bin_centers - self._laser_start_times[laser_index]
+            time_in_laser[before_first] = -1.
+
+        laser_on = (time_in_laser >= 0) & (time_in_laser < self._laser_lengths[laser_index])
+        dark_population = 1. - self._laser_populations[laser_index]
+        rate = self._count_rate * (1. - self._contrast * dark_population *
+                                   np.exp(-np.clip(time_in_laser, 0, None) / self._pumping_time))
+        return np.where(laser_on, rate * self._binwidth, dark)
+
+    def _update_ensemble(self):
+        """ Read the currently loaded ensemble from the pulser and evolve the
+        spin through it once.
+        """
+        self._ensemble_name = self._pulser.get_loaded_asset()
+        ensemble = None
+        if hasattr(self._pulser, 'get_loaded_ensemble'):
+            ensemble = self._pulser.get_loaded_ensemble()
+
+        if ensemble is None:
+            if self._ensemble_name is not None:
+                self.log.warning('No pulse block ensemble object found for loaded asset "{0}". '
+                                 'Only dark counts will be simulated.'.format(self._ensemble_name))
+            self._laser_start_times = np.array([])
+            self._laser_lengths = np.array([])
+            self._laser_populations = np.array([])
+            self._sweep_length = 0.
+            return
+
+        self._evolve_ensemble(ensemble)
+
+    def _evolve_ensemble(self, ensemble):
+        """ Propagate the Bloch vector through all elements of an ensemble.
+
+        The sweep is repeated twice so that the populations of the second pass
+        reflect the steady state of a periodically repeated ensemble.
+
+        @param PulseBlockEnsemble ensemble: the ensemble to simulate
+        """
+        digital_channels = [chnl for chnl in ensemble.activation_config if 'd_ch' in chnl]
+        analog_channels = [chnl for chnl in ensemble.activation_config if 'a_ch' in chnl]
+        laser_channel = ensemble.laser_channel
+
+        elements = []
+        for block, reps in ensemble.block_list:
+            for rep in range(reps + 1):
+                for elem in block.element_list:
+                    length = elem.init_length_s + rep * elem.increment_s
+                    elements.append((length, elem))
+
+        bloch = np.array([0., 0., 1.])
+        detuning = 0.
+        for sweep in range(2):
+            start_times = []
+            lengths = []
+            populations = []
+            current_time = 0.
+            for length, elem in elements:
+                laser_on = self._is_channel_high(elem, laser_channel, digital_channels,
+                                                 analog_channels)
+                drive = self._get_mw_drive(elem, laser_channel, digital_channels,
+                                           analog_channels)
+                if laser_on:
+                    # directly consecutive laser elements form a single pulse
+                    if start_times and np.isclose(start_times[-1] + lengths[-1], current_time):
+                        lengths[-1] += length
+                    else:
+                        start_times.append(current_time)
+                        lengths.append(length)
+                        populations.append((1. + bloch[2]) / 2.)
+                    pumped = np.exp(-length / self._pumping_time)
+                    bloch = np.array([bloch[0] * pumped, bloch[1] * pumped,
+                                      1. - (1. - bloch[2]) * pumped])
+                elif drive is not None:
+                    rabi, phase, detuning = drive
+                    bloch = self._rotate(bloch, rabi, phase, detuning, length)
+                else:
+                    bloch = self._free_evolution(bloch, detuning, length)
+                current_time += length
+
+        self._laser_start_times = np.array(start_times)
+        self._laser_lengths = np.array(lengths)
+        self._laser_populations = np.array(populations)
+        self._sweep_length = current_time
+
+    def _is_channel_high(self, elem, channel, digital_channels, analog_channels):
+        """ Check whether a channel is switched on during an element.
+
+        @return bool: True if the channel is high (digital) or carries a DC
+                      level (analog)
+        """
+        if channel is None:
+            return False
+        if channel in digital_channels:
+            index = digital_channels.index(channel)
+            return elem.digital_high is not None and index < len(elem.digital_high) and bool(
+                elem.digital_high[index])
+        if channel in analog_channels:
+            index = analog_channels.index(channel)
+            if elem.pulse_function is None or index >= len(elem.pulse_function):
+                return False
+            return elem.pulse_function[index] == 'DC' and \
+                   elem.parameters[index].get('amplitude1', 0) > 0
+        return False
+
+    def _get_mw_drive(self, elem, laser_channel, digital_channels, analog_channels):
+        """ Extract the microwave drive of an element.
+
+        @return tuple|None: (rabi frequency in Hz, phase in rad, detuning in Hz)
+                            or None if no microwave is applied
+        """
+        if self._mw_switch_channel is not None and self._is_channel_high(
+                elem, self._mw_switch_channel, digital_channels, analog_channels):
+            return self._digital_rabi_frequency, 0., 0.
+
+        if elem.pulse_function is None:
+            return None
+        for index, function in enumerate(elem.pulse_function):
+            if index < len(analog_channels) and analog_channels[index] == laser_channel:
+                continue
+            if function in ('Idle', 'DC'):
+                continue
+            params = elem.parameters[index]
+            amplitude = params.get('amplitude1', 0.)
+            if amplitude <= 0:
+                continue
+            rabi = self._rabi_frequency_per_volt * amplitude
+            # a gaussian envelope with sigma = length/6 only has this fraction
+            # of the pulse area of a rectangular pulse
+            if 'Gauss' in function:
+                rabi *= np.sqrt(2 * np.pi) / 6
+            phase = np.deg2rad(params.get('phase1', 0.))
+            if function.startswith('Cos'):
+                phase += np.pi / 2
+            detuning = params.get('frequency1', self._resonance_frequency) - \
+                       self._resonance_frequency
+            return rabi, phase, detuning
+        return None
+
+    def _rotate(self, bloch, rabi, phase, detuning, duration):
+        """ Rotate the Bloch vector under a microwave drive (Rodrigues formula).
+
+        @return numpy.ndarray: the new Bloch vector
+        """
+        axis = np.array([rabi * np.cos(phase), rabi * np.sin(phase), detuning])
+        eff_rabi = np.linalg.norm(axis)
+        if eff_rabi == 0:
+            return bloch
+        axis = axis / eff_rabi
+        angle = 2 * np.pi * eff_rabi * duration
+        bloch = (bloch * np.cos(angle) + np.cross(axis, bloch) * np.sin(angle) +
+                 axis * np.dot(axis, bloch) * (1 - np.cos(angle)))
+        return self._relax(bloch, duration)
+
+    def _free_evolution(self, bloch, detuning, duration):
+        """ Precession about z with the last microwave detuning plus relaxation.
+
+        @return numpy.ndarray: the new Bloch vector
+        """
+        angle = 2 * np.pi * detuning * duration
+        cos, sin = np.cos(angle), np.sin(angle)
+        bloch = np.array([bloch[0] * cos - bloch[1] * sin,
+                          bloch[0] * sin + bloch[1] * cos,
+                          bloch[2]])
+        return self._relax(bloch, duration)
+
+    def _relax(self, bloch, duration):
+        """ Apply T2 dephasing and T1 relaxation towards the mixed state.
+
+        @return numpy.ndarray: the new Bloch vector
+        """
+        dephasing = np.exp(-duration / self._t2)
+        return np.array([bloch[0] * dephasing, bloch[1] * dephasing,
+                         bloch[2] * np.exp(-duration / self._t1)])
@@ -21,6 +21,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 import os
+import pickle
 from collections import OrderedDict
 from fnmatch import fnmatch
 
@@ -353,6 +354,29 @@ class PulserDummy(Base, PulserInterface):
         """
         return self.current_loaded_asset
 
+    def get_loaded_ensemble(self):
+        """ Retrieve the PulseBlockEnsemble object of the currently loaded asset.
+
+        @return PulseBlockEnsemble: the ensemble object or None if the loaded
+                                    asset is no saved ensemble.
+
+        This is not part of the pulser interface. It is used by simulation
+        modules which need to know the actual content of the loaded asset.
+        """
+        if self.current_loaded_asset is None:
+            return None
+        ensemble_file = os.path.join(self.pulsed_file_dir, 'pulse_ensemble_objects',
+                                     'ensemble_dict.ens')
+        if not os.path.isfile(ensemble_file):
+            return None
+        try:
+            with open(ensemble_file, 'rb') as infile:
+                saved_ensembles = pickle.load(infile)
+        except:
+            self.log.error('Failed to deserialize ensembles from "{0}".'.format(ensemble_file))
+            return None
+        return saved_ensembles.get(self.current_loaded_asset)
+
     def clear_all(self):
         """ Clears all loaded waveform from the pulse generators RAM.
 
@@ -20,9 +20,8 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 import numpy as np
-
-import random
 import time
+from scipy.signal import lfilter
 
 from core.base import Base
 from interface.slow_counter_interface import SlowCounterInterface
@@ -82,6 +81,17 @@ class SlowCounterDummy(Base, SlowCounterInterface):
         else:
             self._photon_source2 = None
 
+        # number of simulated counter channels. Defaults to two channels if a
+        # second photon source is configured for compatibility.
+        if 'counter_channels' in config.keys():
+            self._channel_number = int(config['counter_channels'])
+        elif self._photon_source2 is not None:
+            self._channel_number = 2
+        else:
+            self._channel_number = 1
+        if self._channel_number > 1:
+            self._photon_source2 = 1
+
         if 'count_distribution' in config.keys():
             self.dist = config['count_distribution']
         else:
@@ -108,13 +118,42 @@ class SlowCounterDummy(Base, SlowCounterInterface):
         self.mean_signal2 = self.mean_signal - self.contrast * self.mean_signal
         self.noise_amplitude = self.mean_signal * 0.1
 
-        self.life_time_bright = 0.08  # 80 millisecond
-        self.life_time_dark = 0.04  # 40 milliseconds
+        # blinking of the emitter (telegraph noise) for the dark_bright
+        # distributions
+        if 'life_time_bright' in config.keys():
+            self.life_time_bright = float(config['life_time_bright'])
+        else:
+            self.life_time_bright = 0.08  # 80 millisecond
+        if 'life_time_dark' in config.keys():
+            self.life_time_dark = float(config['life_time_dark'])
+        else:
+            self.life_time_dark = 0.04  # 40 milliseconds
+
+        # slow drift of the count rate, modelled as a random process with a
+        # relative standard deviation drift_amplitude and a correlation time
+        # drift_time (in s).
+        if 'drift_amplitude' in config.keys():
+            self.drift_amplitude = float(config['drift_amplitude'])
+        else:
+            self.drift_amplitude = 0.0
+        if 'drift_time' in config.keys():
+            self.drift_time = float(config['drift_time'])
+        else:
+            self.drift_time = 10.0
+
+        # if True, get_counter blocks until the simulated samples would have
+        # been acquired by real hardware. Otherwise data is returned at once.
+        if 'simulate_timing' in config.keys():
+            self._simulate_timing = bool(config['simulate_timing'])
+        else:
+            self._simulate_timing = True
 
-        # needed for the life time simulation
-        self.current_dec_time = self.life_time_bright
-        self.curr_state_b = True
-        self.total_time = 0.0
+        # needed for the life time simulation, one entry per channel
+        self._bright_state = np.ones(self._channel_number, dtype=bool)
+        self._time_to_switch = np.random.exponential(self.life_time_bright,
+                                                     self._channel_number)
+        self._drift_state = np.zeros(self._channel_number)
+        self._next_read_time = None
 
     def on_deactivate(self, e):
         """ Deinitialisation performed during deactivation of the module.
@@ -161,6 +200,7 @@ class SlowCounterDummy(Base, SlowCounterInterface):
         self.log.warning('slowcounterdummy>set_up_counter')
 
         time.sleep(0.1)
+        self._next_read_time = None
 
         return 0
 
@@ -169,27 +209,42 @@ class SlowCounterDummy(Base, SlowCounterInterface):
 
         @param int samples: if defined, number of samples to read in one go
 
-        @return float: the photon counts per second
+        @return numpy.array((n, samples), uint32): the photon counts per second
+                                                   for each of the n channels
         """
+        if samples is None:
+            samples = int(self._samples_number)
+        else:
+            samples = int(samples)
 
-        count_data_1 = self._simulate_counts(samples)
+        count_data = self._simulate_counts(samples)
 
-        count_data = count_data_1
+        if self._simulate_timing:
+            # Sleep only for the time which is left until the samples would be
+            # available. This keeps the mean sample rate at the clock frequency
+            # independent of the time needed for simulation and processing.
+            now = time.time()
+            if self._next_read_time is None or now - self._next_read_time > 1.:
+                self._next_read_time = now
+            self._next_read_time += samples / self._clock_frequency
+            if self._next_read_time > now:
+                time.sleep(self._next_read_time - now)
 
-        if self._photon_source2 is not None:
-            count_data_2 = self._simulate_counts(samples) + self.mean_signal
-            count_data = np.array([count_data_1, count_data_2])
+        return count_data
 
-        time.sleep(1. / self._clock_frequency * samples)
+    def get_counter_channels(self):
+        """ Returns the names of the simulated counter channels.
 
-        return count_data
+        @return list(str): one name for each row returned by get_counter
+        """
+        return ['Ch{0}'.format(i) for i in range(self._channel_number)]
 
     def _simulate_counts(self, samples=None):
-        """ Simulate counts signal from an APD.  This can be called for each dummy counter channel.
+        """ Simulate a block of count samples for all dummy counter channels.
 
         @param int samples: if defined, number of samples to read in one go
 
-        @return float: the photon counts per second
+        @return numpy.array((n, samples), uint32): the photon counts per second
         """
 
         if samples is None:
@@ -197,61 +252,90 @@ class SlowCounterDummy(Base, SlowCounterInterface):
         else:
             samples = int(samples)
 
-        timestep = 1. / self._clock_frequency * samples
+        timestep = 1. / self._clock_frequency
+        shape = (self._channel_number, samples)
 
-        count_data = np.empty([samples], dtype=np.uint32)  # count data will be written here in the NumPy array
+        if self.dist in ('dark_bright_gaussian', 'dark_bright_poisson'):
+            bright = self._simulate_blinking(samples, timestep)
+            mean = np.where(bright, float(self.mean_signal), float(self.mean_signal2))
+        else:
+            mean = np.full(shape, float(self.mean_signal))
+
+        if self.drift_amplitude > 0:
+            mean *= 1. + self._simulate_drift(samples, timestep)
+
+        if self.dist == 'single_gaussian':
+            count_data = np.random.normal(mean, self.noise_amplitude / 2)
+        elif self.dist == 'dark_bright_gaussian':
+            count_data = np.random.normal(mean, self.noise_amplitude)
+        elif self.dist == 'exponential':
+            count_data = np.random.exponential(mean)
+        elif self.dist in ('single_poisson', 'dark_bright_poisson'):
+            count_data = np.random.poisson(np.clip(mean, 0, None))
+        else:
+            # make uniform as default
+            count_data = mean + np.random.uniform(-self.noise_amplitude / 2,
+                                                  self.noise_amplitude / 2, shape)
 
-        for i in range(samples):
+        # every additional channel is shifted by one mean signal to separate
+        # the traces in the display
+        count_data = count_data + self.mean_signal * np.arange(self._channel_number)[:, np.newaxis]
 
-            if self.dist == 'single_gaussian':
-                count_data[i] = np.random.normal(self.mean_signal, self.noise_amplitude / 2)
+        return np.clip(count_data, 0, None).astype(np.uint32)
 
-            elif self.dist == 'dark_bright_gaussian':
+    def _simulate_blinking(self, samples, timestep):
+        """ Simulate the bright/dark telegraph process of each channel.
 
-                self.total_time = self.total_time + timestep
+        @param int samples: number of samples to simulate
+        @param float timestep: duration of a single sample in s
 
-                if self.total_time > self.current_dec_time:
-                    if self.curr_state_b:
-                        self.curr_state_b = False
-                        self.current_dec_time = np.random.exponential(self.life_time_dark)
-                        count_data[i] = np.random.poisson(self.mean_signal)
-                    else:
-                        self.curr_state_b = True
-                        self.current_dec_time = np.random.exponential(self.life_time_bright)
-                    self.total_time = 0.0
+        @return numpy.array((n, samples), bool): True where the emitter is bright
 
-                count_data[i] = np.random.normal(self.mean_signal, self.noise_amplitude) * self.curr_state_b + \
-                                   np.random.normal(self.mean_signal2, self.noise_amplitude) * (1-self.curr_state_b)
+        Only the switching events are generated one by one. The state of each
+        sample is then obtained from the number of switches before it.
+        """
+        sample_times = (np.arange(samples) + 1) * timestep
+        duration = samples * timestep
+        bright = np.empty((self._channel_number, samples), dtype=bool)
 
-            elif self.dist == 'uniform':
-                count_data[i] = self.mean_signal + random.uniform(-self.noise_amplitude / 2, self.noise_amplitude / 2)
+        for channel in range(self._channel_number):
+            state = self._bright_state[channel]
+            switch_time = self._time_to_switch[channel]
+            switch_times = []
+            while switch_time < duration:
+                switch_times.append(switch_time)
+                state = not state
+                if state:
+                    switch_time += np.random.exponential(self.life_time_bright)
+                else:
+                    switch_time += np.random.exponential(self.life_time_dark)
 
-            elif self.dist == 'exponential':
-                count_data[i] = np.random.exponential(self.mean_signal)
+            switches = np.searchsorted(switch_times, sample_times, side='right')
+            bright[channel] = np.logical_xor(self._bright_state[channel], switches % 2)
 
-            elif self.dist == 'single_poisson':
-                count_data[i] = np.random.poisson(self.mean_signal)
+            self._bright_state[channel] = state
+            self._time_to_switch[channel] = switch_time - duration
 
-            elif self.dist == 'dark_bright_poisson':
-                self.total_time = self.total_time + timestep
+        return bright
 
-                if self.total_time > self.current_dec_time:
-                    if self.curr_state_b:
-                        self.curr_state_b = False
-                        self.current_dec_time = np.random.exponential(self.life_time_dark)
-                        count_data[i] = np.random.poisson(self.mean_signal)
-                    else:
-                        self.curr_state_b = True
-                        self.current_dec_time = np.random.exponential(self.life_time_bright)
-                    self.total_time = 0.0
+    def _simulate_drift(self, samples, timestep):
+        """ Simulate the relative drift of the count rate of each channel.
 
-                count_data[i] = np.random.poisson(self.mean_signal)*self.curr_state_b + np.random.poisson(self.mean_signal2)*(1-self.curr_state_b)
+        @param int samples: number of samples to simulate
+        @param float timestep: duration of a single sample in s
 
-            else:
-                # make uniform as default
-                count_data[0][i] = self.mean_signal + random.uniform(-self.noise_amplitude/2, self.noise_amplitude/2)
+        @return numpy.array((n, samples)): relative deviation from the mean rate
 
-        return count_data
+        The drift is an Ornstein-Uhlenbeck process which is evaluated as a
+        first order recursive filter on white noise for the whole block.
+        """
+        decay = np.exp(-timestep / self.drift_time)
+        gain = self.drift_amplitude * np.sqrt(1. - decay ** 2)
+        noise = np.random.normal(size=(self._channel_number, samples))
+        drift, _ = lfilter([gain], [1., -decay], noise, axis=1,
+                           zi=decay * self._drift_state[:, np.newaxis])
+        self._drift_state = drift[:, -1]
+        return drift
 
     def close_counter(self):
         """ Closes the counter and cleans up afterwards.
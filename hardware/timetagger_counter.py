@@ -125,6 +125,13 @@ class TimeTaggerCounter(Base, SlowCounterInterface):
         time.sleep(2/self._count_frequency)
         return self.counter.getData()
 
+    def get_counter_channels(self):
+        """ Returns the name of the counter channel.
+
+        @return list(str): the photon source of the counts returned by get_counter
+        """
+        return [str(self._photon_source)]
+
     def close_counter(self):
         """ Closes the counter and cleans up afterwards.
 
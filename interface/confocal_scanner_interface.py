@@ -160,6 +160,22 @@ class ConfocalScannerInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    @abc.abstractmethod
+    def scan_line_with_return(self, line_path=None, return_path=None, start_path=None):
+        """ Moves along the start path, the line and the return path in a single
+        scan and returns the counts on the line only.
+
+        @param float[][4] line_path: array of 4-part tuples defining the
+                                     positions of the pixels of the line
+        @param float[][4] return_path: positions passed after the line, e.g.
+                                       back to the start of the next line
+        @param float[][4] start_path: positions passed before the line, e.g.
+                                      from the current position to its start
+
+        @return float[]: the photon counts per second of the line pixels
+        """
+        pass
+
     @abc.abstractmethod
     def close_scanner(self):
         """ Closes the scanner and cleans up afterwards.
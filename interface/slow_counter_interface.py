@@ -79,6 +79,15 @@ class SlowCounterInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    @abc.abstractmethod
+    def get_counter_channels(self):
+        """ Returns the names of the counter channels.
+
+        @return list(str): one name for each channel, in the order of the rows
+                           returned by get_counter
+        """
+        pass
+
     @abc.abstractmethod
     def close_counter(self):
         """ Closes the counter and cleans up afterwards.
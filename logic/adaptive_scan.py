@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains the helper functions of the adaptive coarse-to-fine
+confocal scan, which only rescans the interesting parts of a coarse image.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+
+def coarse_indices(length, factor):
+    """ Indices of the pixels of a fine axis which are scanned in the coarse pass.
+
+    @param int length: number of pixels of the fine axis
+    @param int factor: every factor-th pixel is scanned
+
+    @return numpy.ndarray: the indices, the last pixel is always included
+    """
+    indices = np.arange(0, length, max(int(factor), 1))
+    if indices[-1] != length - 1:
+        indices = np.append(indices, length - 1)
+    return indices
+
+
+def robust_threshold(values, sigmas=5.0):
+    """ Threshold above the background of an image.
+
+    The background level and its noise are estimated with the median and the
+    median absolute deviation, so that a few bright emitters do not raise the
+    threshold.
+
+    @param numpy.ndarray values: the values
+    @param float sigmas: distance of the threshold from the median in
+                         standard deviations of the background
+
+    @return float: the threshold
+    """
+    median = np.median(values)
+    deviation = 1.4826 * np.median(np.abs(values - median))
+    return median + sigmas * deviation
+
+
+def refinement_mask(coarse_counts, coarse_rows, coarse_columns, shape, threshold=None,
+                    gradient_threshold=None):
+    """ Pixels of the fine image which have to be scanned again.
+
+    A coarse pixel is interesting if its counts exceed the threshold or if
+    the counts change strongly towards its neighbours, which also marks the
+    flanks of spots whose center lies between the coarse pixels. Every fine
+    pixel is then assigned to the nearest coarse pixel.
+
+    @param numpy.ndarray coarse_counts: counts of the coarse pass with shape
+                                        (coarse rows, coarse columns)
+    @param numpy.ndarray coarse_rows: fine row index of each coarse row
+    @param numpy.ndarray coarse_columns: fine column index of each coarse column
+    @param tuple shape: (rows, columns) of the fine image
+    @param float threshold: counts above which a pixel is rescanned, estimated
+                            from the background if None
+    @param float gradient_threshold: change of the counts per coarse pixel
+                                     above which a pixel is rescanned,
+                                     estimated from the background if None
+
+    @return numpy.ndarray: boolean mask with the given shape
+    """
+    coarse_counts = np.asarray(coarse_counts, dtype=float)
+    if threshold is None:
+        threshold = robust_threshold(coarse_counts)
+    marked = coarse_counts > threshold
+
+    if min(coarse_counts.shape) > 1:
+        gradient = np.hypot(*np.gradient(coarse_counts))
+        if gradient_threshold is None:
+            gradient_threshold = robust_threshold(gradient)
+        marked |= gradient > gradient_threshold
+
+    nearest_row = _nearest(coarse_rows, shape[0])
+    nearest_column = _nearest(coarse_columns, shape[1])
+    return marked[np.ix_(nearest_row, nearest_column)]
+
+
+def _nearest(coarse_indices, length):
+    """ Index of the nearest coarse pixel for every pixel of a fine axis. """
+    coarse_indices = np.asarray(coarse_indices)
+    if len(coarse_indices) == 1:
+        return np.zeros(length, dtype=int)
+    midpoints = (coarse_indices[:-1] + coarse_indices[1:]) / 2
+    return np.searchsorted(midpoints, np.arange(length), side='right')
+
+
+def mask_segments(mask_row, min_gap=1):
+    """ Contiguous parts of a row which have to be scanned.
+
+    Parts separated by less than min_gap pixels are merged, since moving the
+    scanner across a short gap takes about as long as scanning it.
+
+    @param numpy.ndarray mask_row: boolean mask of the row
+    @param int min_gap: minimal number of skipped pixels between two parts
+
+    @return list(tuple): first and last column (inclusive) of each part
+    """
+    columns = np.flatnonzero(mask_row)
+    if columns.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(columns) > min_gap)
+    starts = np.concatenate(([columns[0]], columns[breaks + 1]))
+    stops = np.concatenate((columns[breaks], [columns[-1]]))
+    return list(zip(starts, stops))
@@ -24,11 +24,15 @@ from collections import OrderedDict
 from copy import copy
 from datetime import datetime
 import numpy as np
+import os
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 from io import BytesIO
 
 from logic.generic_logic import GenericLogic
+from logic.scan_image import ScanImage
+from logic import adaptive_scan
+from logic.volume_store import VolumeStore
 from core.util.mutex import Mutex
 
 
@@ -50,6 +54,9 @@ class OldConfigFileError(Exception):
 class ConfocalHistoryEntry(QtCore.QObject):
     """ This class contains all relevant parameters of a Confocal scan.
         It provides methods to extract, restore and serialize this data.
+
+        The images can be moved to a compressed file with save_images. They
+        are read back from it only when the entry is restored.
     """
 
     def __init__(self, confocal):
@@ -100,6 +107,12 @@ class ConfocalHistoryEntry(QtCore.QObject):
         self.point2 = np.array((0, 0, 0))
         self.point3 = np.array((0, 0, 0))
 
+        # images, None while they are only stored in the file
+        self.xy_image = None
+        self.depth_image = None
+        self.filepath = None
+        self.file_size = 0
+
     def restore(self, confocal):
         """ Write data back into confocal logic and pull all the necessary strings """
         confocal._current_x = self.current_x
@@ -124,20 +137,20 @@ class ConfocalHistoryEntry(QtCore.QObject):
         confocal._tilt_variable_ax = self.tilt_slope_x
         confocal._tilt_variable_ay = self.tilt_slope_y
 
-        confocal.initialize_image()
         try:
-            if confocal.xy_image.shape == self.xy_image.shape:
-                confocal.xy_image = np.copy(self.xy_image)
-        except AttributeError:
-            self.xy_image = np.copy(confocal.xy_image)
+            xy_image, depth_image = self.load_images()
+        except (OSError, KeyError, ValueError):
+            # the image file is gone or damaged, start with empty images
+            xy_image, depth_image = None, None
+
+        confocal.initialize_image()
+        if xy_image is not None and confocal.xy_image.shape == xy_image.shape:
+            confocal.xy_image = xy_image
 
         confocal._zscan = True
         confocal.initialize_image()
-        try:
-            if confocal.depth_image.shape == self.depth_image.shape:
-                confocal.depth_image = np.copy(self.depth_image)
-        except AttributeError:
-            self.depth_image = np.copy(confocal.depth_image)
+        if depth_image is not None and confocal.depth_image.shape == depth_image.shape:
+            confocal.depth_image = depth_image
         confocal._zscan = False
 
     def snapshot(self, confocal):
@@ -163,8 +176,50 @@ class ConfocalHistoryEntry(QtCore.QObject):
         self.tilt_reference_y = confocal._tiltreference_y
         self.tilt_slope_x = confocal._tilt_variable_ax
         self.tilt_slope_y = confocal._tilt_variable_ay
-        self.xy_image = np.copy(confocal.xy_image)
-        self.depth_image = np.copy(confocal.depth_image)
+        self.xy_image = confocal.xy_image.copy()
+        self.depth_image = confocal.depth_image.copy()
+        self.filepath = None
+        self.file_size = self.xy_image.nbytes + self.depth_image.nbytes
+
+    def save_images(self, filepath):
+        """ Write the images to a compressed file and release their memory.
+
+        @param str filepath: path of the file, should end with '.npz'
+        """
+        arrays = dict()
+        if self.xy_image is not None:
+            arrays.update(self.xy_image.get_state('xy_'))
+        if self.depth_image is not None:
+            arrays.update(self.depth_image.get_state('depth_'))
+        np.savez_compressed(filepath, **arrays)
+        self.filepath = filepath
+        self.file_size = os.path.getsize(filepath)
+        self.xy_image = None
+        self.depth_image = None
+
+    def load_images(self):
+        """ Images of this entry, read from the file if they are not in memory.
+
+        @return tuple(ScanImage, ScanImage): new copies of the xy and depth
+                                             image, None for missing images
+        """
+        if self.xy_image is not None or self.depth_image is not None or self.filepath is None:
+            return (None if self.xy_image is None else self.xy_image.copy(),
+                    None if self.depth_image is None else self.depth_image.copy())
+        xy_image = None
+        depth_image = None
+        with np.load(self.filepath) as stored:
+            if 'xy_counts' in stored:
+                xy_image = ScanImage.from_state(stored, 'xy_')
+            if 'depth_counts' in stored:
+                depth_image = ScanImage.from_state(stored, 'depth_')
+        return xy_image, depth_image
+
+    def delete_images(self):
+        """ Remove the image file of this entry. """
+        if self.filepath is not None and os.path.exists(self.filepath):
+            os.remove(self.filepath)
+        self.filepath = None
 
     def serialize(self):
         """ Give out a dictionary that can be saved via the usual means """
@@ -185,12 +240,19 @@ class ConfocalHistoryEntry(QtCore.QObject):
         serialized['tilt_point3'] = self.point3
         serialized['tilt_reference'] = [self.tilt_reference_x, self.tilt_reference_y]
         serialized['tilt_slope'] = [self.tilt_slope_x, self.tilt_slope_y]
-        serialized['xy_image'] = self.xy_image
-        serialized['depth_image'] = self.depth_image
+        # the images are only referenced by their file, which keeps the
+        # status variables small
+        if self.filepath is not None:
+            serialized['image_file'] = os.path.basename(self.filepath)
+            serialized['image_file_size'] = self.file_size
         return serialized
 
-    def deserialize(self, serialized):
-        """ Restore Confocal history object from a dict """
+    def deserialize(self, serialized, directory=None):
+        """ Restore Confocal history object from a dict
+
+        @param dict serialized: the parameters returned by serialize
+        @param str directory: directory of the image file
+        """
         if 'focus_position' in serialized and len(serialized['focus_position']) == 4:
             self.current_x = serialized['focus_position'][0]
             self.current_y = serialized['focus_position'][1]
@@ -222,22 +284,28 @@ class ConfocalHistoryEntry(QtCore.QObject):
             self.point3 = np.array(serialized['tilt_point3'])
         if 'xy_image' in serialized:
             if isinstance(serialized['xy_image'], np.ndarray):
-                self.xy_image = serialized['xy_image']
+                self.xy_image = ScanImage.from_array(serialized['xy_image'])
             else:
                 try:
-                    self.xy_image = numpy_from_b(
-                            eval(serialized['xy_image']))['image']
+                    self.xy_image = ScanImage.from_array(numpy_from_b(
+                            eval(serialized['xy_image']))['image'])
                 except:
                     raise OldConfigFileError()
         if 'depth_image' in serialized:
             if isinstance(serialized['depth_image'], np.ndarray):
-                self.depth_image = serialized['depth_image'].copy()
+                self.depth_image = ScanImage.from_array(serialized['depth_image'])
             else:
                 try:
-                    self.depth_image = numpy_from_b(
-                            eval(serialized['depth_image']))['image']
+                    self.depth_image = ScanImage.from_array(numpy_from_b(
+                            eval(serialized['depth_image']))['image'])
                 except:
                     raise OldConfigFileError()
+        if 'image_file' in serialized and directory is not None:
+            filepath = os.path.join(directory, serialized['image_file'])
+            if not os.path.isfile(filepath):
+                raise FileNotFoundError(filepath)
+            self.filepath = filepath
+            self.file_size = serialized.get('image_file_size', os.path.getsize(filepath))
 
 
 class ConfocalLogic(GenericLogic):
@@ -266,6 +334,7 @@ class ConfocalLogic(GenericLogic):
     sigImageDepthInitialized = QtCore.Signal()
 
     signal_history_event = QtCore.Signal()
+    sigVolumeSliceFinished = QtCore.Signal(int)
 
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
@@ -285,6 +354,29 @@ class ConfocalLogic(GenericLogic):
         self.stopRequested = False
         self.depth_scan_dir_is_xz = True
         self.permanent_scan = False
+        # scan every second line backwards instead of returning to its start
+        self.bidirectional_scan = False
+        # steps to move from the end of a line to the next one in bidirectional scans
+        self.turnaround_points = 10
+        # delay of the scanner position in pixels, estimated during bidirectional scans
+        self.line_lag = 0.0
+        self._line_lag_weight = 0.0
+        self._previous_line = None
+        self._move_to_line_start = False
+        # scan xy images coarse first and then only the bright parts finely
+        self.adaptive_scan = False
+        self.adaptive_coarse_factor = 4
+        # None estimates the thresholds from the background of the coarse image
+        self.adaptive_threshold = None
+        self.adaptive_gradient_threshold = None
+        self._adaptive_jobs = None
+        self.xy_image_levels = []
+        self.xy_refined_mask = None
+        # volumetric scan, a stack of xy scans written to disk slice by slice
+        self.volume_directory = None
+        self.volume_projections = None
+        self._volume_store = None
+        self._volume_requested = False
 
     def on_activate(self, e):
         """ Initialisation performed during activation of the module.
@@ -306,6 +398,16 @@ class ConfocalLogic(GenericLogic):
             self.return_slowness = self._statusVariables['return_slowness']
         else:
             self.return_slowness = 50
+        if 'bidirectional_scan' in self._statusVariables:
+            self.bidirectional_scan = self._statusVariables['bidirectional_scan']
+        if 'turnaround_points' in self._statusVariables:
+            self.turnaround_points = self._statusVariables['turnaround_points']
+        if 'adaptive_scan' in self._statusVariables:
+            self.adaptive_scan = self._statusVariables['adaptive_scan']
+        if 'adaptive_coarse_factor' in self._statusVariables:
+            self.adaptive_coarse_factor = self._statusVariables['adaptive_coarse_factor']
+        if 'volume_directory' in self._statusVariables:
+            self.volume_directory = self._statusVariables['volume_directory']
 
         # Reads in the maximal scanning range. The unit of that scan range is micrometer!
         self.x_range = self._scanning_device.get_position_range()[0]
@@ -313,33 +415,57 @@ class ConfocalLogic(GenericLogic):
         self.z_range = self._scanning_device.get_position_range()[2]
 
         # restore here ...
-        self.history = []
-        if 'max_history_length' in self._statusVariables:
-                self.max_history_length = self._statusVariables['max_history_length']
-                for i in reversed(range(1, self.max_history_length)):
-                    try:
-                        new_history_item = ConfocalHistoryEntry(self)
-                        new_history_item.deserialize(
-                            self._statusVariables['history_{0}'.format(i)])
-                        self.history.append(new_history_item)
-                    except KeyError:
-                        pass
-                    except OldConfigFileError:
-                        self.log.warning(
-                            'Old style config file detected. History {0} ignored.'.format(i))
-                    except:
-                        self.log.warning(
-                                'Restoring history {0} failed.'.format(i))
+        # the history images are kept in compressed files, the status
+        # variables only contain their parameters and file names
+        self._history_dir = os.path.join(self._manager.getStatusDir(),
+                                         'confocal_history_{0}'.format(self._name))
+        if not os.path.isdir(self._history_dir):
+            os.makedirs(self._history_dir)
+        if 'max_history_size' in self._statusVariables:
+            self.max_history_size = self._statusVariables['max_history_size']
         else:
-            self.max_history_length = 10
+            self.max_history_size = 200
+
+        self.history = []
+        if 'history' in self._statusVariables:
+            for i, serialized in enumerate(self._statusVariables['history']):
+                try:
+                    new_history_item = ConfocalHistoryEntry(self)
+                    new_history_item.deserialize(serialized, self._history_dir)
+                    self.history.append(new_history_item)
+                except FileNotFoundError:
+                    self.log.warning('Image file of history {0} is missing, history '
+                                     'entry ignored.'.format(i))
+                except:
+                    self.log.warning('Restoring history {0} failed.'.format(i))
+        elif 'max_history_length' in self._statusVariables:
+            # history of older versions with the images in the status variables
+            for i in reversed(range(0, self._statusVariables['max_history_length'] + 1)):
+                try:
+                    new_history_item = ConfocalHistoryEntry(self)
+                    new_history_item.deserialize(
+                        self._statusVariables['history_{0}'.format(i)])
+                    self._store_history_images(new_history_item)
+                    self.history.append(new_history_item)
+                except KeyError:
+                    pass
+                except OldConfigFileError:
+                    self.log.warning(
+                        'Old style config file detected. History {0} ignored.'.format(i))
+                except:
+                    self.log.warning(
+                            'Restoring history {0} failed.'.format(i))
+        for key in list(self._statusVariables.keys()):
+            if key == 'max_history_length' or key.startswith('history_'):
+                del self._statusVariables[key]
+        self._remove_unused_history_files()
+
+        # the last entry is the state at the last deactivation
         try:
-            new_state = ConfocalHistoryEntry(self)
-            new_state.deserialize(self._statusVariables['history_0'])
-            new_state.restore(self)
+            self.history[-1].restore(self)
         except:
             new_state = ConfocalHistoryEntry(self)
             new_state.restore(self)
-        finally:
             self.history.append(new_state)
 
         self.history_index = len(self.history) - 1
@@ -360,16 +486,75 @@ class ConfocalLogic(GenericLogic):
         """
         self._statusVariables['clock_frequency'] = self._clock_frequency
         self._statusVariables['return_slowness'] = self.return_slowness
-        self._statusVariables['max_history_length'] = self.max_history_length
+        self._statusVariables['bidirectional_scan'] = self.bidirectional_scan
+        self._statusVariables['turnaround_points'] = self.turnaround_points
+        self._statusVariables['adaptive_scan'] = self.adaptive_scan
+        self._statusVariables['adaptive_coarse_factor'] = self.adaptive_coarse_factor
+        self._statusVariables['volume_directory'] = self.volume_directory
+        self._statusVariables['max_history_size'] = self.max_history_size
         closing_state = ConfocalHistoryEntry(self)
         closing_state.snapshot(self)
-        self.history.append(closing_state)
-        histindex = 0
-        for state in reversed(self.history):
-            self._statusVariables['history_{0}'.format(histindex)] = state.serialize()
-            histindex += 1
+        self._add_history_entry(closing_state)
+        self._statusVariables['history'] = [state.serialize() for state in self.history
+                                            if state.filepath is not None]
         return 0
 
+    def _store_history_images(self, entry):
+        """ Move the images of a history entry to a file in the history directory.
+
+        @param ConfocalHistoryEntry entry: the history entry
+        """
+        filepath = os.path.join(self._history_dir,
+                                '{0}.npz'.format(datetime.now().strftime('%Y%m%d-%H%M-%S-%f')))
+        while os.path.exists(filepath):
+            filepath = filepath[:-4] + '_.npz'
+        try:
+            entry.save_images(filepath)
+        except:
+            self.log.exception('Could not write the history images to {0}, they are '
+                               'kept in memory.'.format(filepath))
+
+    def _add_history_entry(self, entry):
+        """ Append an entry to the history and remove the oldest entries if
+        the history is larger than max_history_size.
+
+        @param ConfocalHistoryEntry entry: the new history entry
+        """
+        self._store_history_images(entry)
+        self.history.append(entry)
+        while len(self.history) > 1 and self.get_history_size() > self.max_history_size:
+            self.history.pop(0).delete_images()
+        self.history_index = len(self.history) - 1
+
+    def _remove_unused_history_files(self):
+        """ Delete image files in the history directory which no entry uses. """
+        used = set(os.path.basename(entry.filepath) for entry in self.history
+                   if entry.filepath is not None)
+        for filename in os.listdir(self._history_dir):
+            if filename.endswith('.npz') and filename not in used:
+                try:
+                    os.remove(os.path.join(self._history_dir, filename))
+                except OSError:
+                    self.log.warning('Could not remove unused history file '
+                                     '{0}.'.format(filename))
+
+    def get_history_size(self):
+        """ Total size of the history images.
+
+        @return float: size in MB, compressed for images stored in files
+        """
+        return sum(entry.file_size for entry in self.history) / 1024**2
+
+    def set_max_history_size(self, size):
+        """ Set the size the history may take up, older entries are removed.
+
+        @param float size: size in MB, the latest entry is always kept
+        """
+        self.max_history_size = size
+        while len(self.history) > 1 and self.get_history_size() > self.max_history_size:
+            self.history.pop(0).delete_images()
+            self.history_index = max(self.history_index - 1, 0)
+
     def switch_hardware(self, to_on=False):
         """ Switches the Hardware off or on.
 
@@ -396,6 +581,28 @@ class ConfocalLogic(GenericLogic):
         else:
             return 0
 
+    def set_bidirectional_scan(self, bidirectional, turnaround_points=None):
+        """Sets whether every second line is scanned backwards
+
+        @param bool bidirectional: scan every second line backwards
+        @param int turnaround_points: steps from the end of a line to the start
+                                      of the next one in bidirectional scans
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if turnaround_points is not None:
+            self.turnaround_points = max(2, int(turnaround_points))
+        if bidirectional == self.bidirectional_scan:
+            return 0
+        # the scanner waits at the start of the next line in unidirectional
+        # scans and at its end in bidirectional ones, so the direction can only
+        # be changed between scans
+        if self.getState() == 'locked':
+            self.log.warning('Cannot change the scan direction while scanning.')
+            return -1
+        self.bidirectional_scan = bool(bidirectional)
+        return 0
+
     def start_scanning(self, zscan = False):
         """Starts scanning
 
@@ -408,10 +615,16 @@ class ConfocalLogic(GenericLogic):
 #            time.sleep(0.01)
         self._scan_counter = 0
         self._zscan = zscan
+        self._move_to_line_start = True
+        self._previous_line = None
+        # the lag depends on the scan speed, so estimate it again for every scan
+        self.line_lag = 0.0
+        self._line_lag_weight = 0.0
         if self._zscan:
             self._zscan_continuable = True
         else:
-            self._xyscan_continuable = True
+            # adaptive and volumetric scans can not be continued line by line
+            self._xyscan_continuable = not (self.adaptive_scan or self._volume_requested)
 
         self.signal_start_scanning.emit()
         return 0
@@ -422,6 +635,9 @@ class ConfocalLogic(GenericLogic):
         @return int: error code (0:OK, -1:error)
         """
         self._zscan = zscan
+        self._move_to_line_start = True
+        self._previous_line = None
+        self._adaptive_jobs = None
         if zscan:
             self._scan_counter = self._depth_line_pos
         else:
@@ -498,20 +714,19 @@ class ConfocalLogic(GenericLogic):
         if self._zscan:
             if self.depth_scan_dir_is_xz:
                 self._image_vert_axis = self._Z
-                # creates an image where each pixel will be [x,y,z,counts]
-                self.depth_image = np.zeros((len(self._image_vert_axis), len(self._X), 4))
-                self.depth_image[:, : ,0] = np.full((len(self._image_vert_axis), len(self._X)), self._XL)
-                self.depth_image[:, :, 1] = self._current_y * np.ones((len(self._image_vert_axis), len(self._X)))
-                z_value_matrix = np.full((len(self._X), len(self._image_vert_axis)), self._Z)
-                self.depth_image[:, :, 2] = z_value_matrix.transpose()
+                # creates an image where each pixel will be [x,y,z,counts], only
+                # the counts are stored for every pixel
+                rows = len(self._image_vert_axis)
+                self.depth_image = ScanImage(
+                    (np.zeros(rows), np.full(rows, self._current_y), self._Z),
+                    (self._XL, np.zeros(len(self._X)), np.zeros(len(self._X))))
             else: # depth scan is yz instead of xz
                 self._image_vert_axis = self._Z
                 # creats an image where each pixel will be [x,y,z,counts]
-                self.depth_image = np.zeros((len(self._image_vert_axis), len(self._Y), 4))
-                self.depth_image[:, :, 0] = self._current_x * np.ones((len(self._image_vert_axis), len(self._Y)))
-                self.depth_image[:, :, 1] = np.full((len(self._image_vert_axis), len(self._Y)), self._YL)
-                z_value_matrix = np.full((len(self._Y), len(self._image_vert_axis)), self._Z)
-                self.depth_image[:, :, 2] = z_value_matrix.transpose()
+                rows = len(self._image_vert_axis)
+                self.depth_image = ScanImage(
+                    (np.full(rows, self._current_x), np.zeros(rows), self._Z),
+                    (np.zeros(len(self._Y)), self._YL, np.zeros(len(self._Y))))
                 # now we are scanning along the y-axis, so we need a new return line along Y:
                 self._return_YL = np.linspace(self._YL[-1], self._YL[0], self.return_slowness)
                 self._return_AL = np.ones(self._return_YL.shape)
@@ -519,11 +734,10 @@ class ConfocalLogic(GenericLogic):
         else:
             self._image_vert_axis = self._Y
             # creats an image where each pixel will be [x,y,z,counts]
-            self.xy_image = np.zeros((len(self._image_vert_axis), len(self._X), 4))
-            self.xy_image[:, :, 0] = np.full((len(self._image_vert_axis), len(self._X)), self._XL)
-            y_value_matrix = np.full((len(self._X), len(self._image_vert_axis)), self._Y)
-            self.xy_image[:, :, 1] = y_value_matrix.transpose()
-            self.xy_image[:, :, 2] = self._current_z * np.ones((len(self._image_vert_axis), len(self._X)))
+            rows = len(self._image_vert_axis)
+            self.xy_image = ScanImage(
+                (np.zeros(rows), self._Y, np.full(rows, self._current_z)),
+                (self._XL, np.zeros(len(self._X)), np.zeros(len(self._X))))
             self.sigImageXYInitialized.emit()
         return 0
 
@@ -539,6 +753,16 @@ class ConfocalLogic(GenericLogic):
             self._scanning_device.unlock()
             self.unlock()
             return -1
+        if self._volume_requested and not self._zscan:
+            self._volume_requested = False
+            if self._open_volume() < 0:
+                self._scanning_device.unlock()
+                self.unlock()
+                return -1
+        if self.adaptive_scan and not self._zscan:
+            self._init_adaptive_scan()
+        else:
+            self._adaptive_jobs = None
 
         clock_status = self._scanning_device.set_up_scanner_clock(
             clock_frequency=self._clock_frequency)
@@ -675,9 +899,12 @@ class ConfocalLogic(GenericLogic):
             with self.threadlock:
                 self.kill_scanner()
                 self.stopRequested = False
+                self._adaptive_jobs = None
                 self.unlock()
                 self.signal_xy_image_updated.emit()
                 self.signal_depth_image_updated.emit()
+                if self._volume_store is not None:
+                    self._close_volume()
                 self.set_position('scanner')
                 if self._zscan:
                     self._depth_line_pos = self._scan_counter
@@ -686,81 +913,76 @@ class ConfocalLogic(GenericLogic):
                 # add new history entry
                 new_history = ConfocalHistoryEntry(self)
                 new_history.snapshot(self)
-                self.history.append(new_history)
-                if len(self.history) > self.max_history_length:
-                    self.history.pop(0)
-                self.history_index = len(self.history) - 1
+                self._add_history_entry(new_history)
                 return
 
         image = self.depth_image if self._zscan else self.xy_image
         n_ch = len(self._scanning_device.get_scanner_axes())
 
-        try:
-            if self._scan_counter == 0:
-                # make a line from the current cursor position to 
-                # the starting position of the first scan line of the scan
-                start_line = np.vstack((
-                    np.linspace(self._current_x, image[self._scan_counter, 0, 0], self.return_slowness),
-                    np.linspace(self._current_y, image[self._scan_counter, 0, 1], self.return_slowness),
-                    np.linspace(self._current_z, image[self._scan_counter, 0, 2], self.return_slowness),
-                    np.full((self.return_slowness, ), self._current_a)
-                    )[0:n_ch])
-                # move to the start position of the scan, counts are thrown away
-                start_line_counts = self._scanning_device.scan_line(start_line)
-                if start_line_counts[0] == -1:
-                    self.stopRequested = True
-                    self.signal_scan_lines_next.emit()
-                    return
+        if self._adaptive_jobs is not None:
+            self._scan_adaptive_line(image, n_ch)
+            return
 
+        try:
             # adjust z of line in image to current z before building the line
             if not self._zscan:
                 image[self._scan_counter, :, 2] = self._current_z * np.ones(image[self._scan_counter, :, 2].shape)
 
-            # make a line in the scan, _scan_counter says which one it is
-            line = np.vstack((image[self._scan_counter, :, 0],
-                              image[self._scan_counter, :, 1],
-                              image[self._scan_counter, :, 2],
-                              np.full(image[self._scan_counter, :, 3].shape, self._current_a)
-                              )[0:n_ch])
-            # scan the line in the scan
-            line_counts = self._scanning_device.scan_line(line)
-            if line_counts[0] == -1:
-                self.stopRequested = True
-                self.signal_scan_lines_next.emit()
-                return
-
-            # make a line to go to the starting position of the next scan line
-            if self.depth_scan_dir_is_xz:
-                return_line = np.vstack((
-                    self._return_XL,
-                    image[self._scan_counter, 0, 1] * np.ones(self._return_XL.shape),
-                    image[self._scan_counter, 0, 2] * np.ones(self._return_XL.shape),
-                    self._return_AL * self._current_a
-                    )[0:n_ch])
+            if self.bidirectional_scan:
+                line, return_line, forward = self._bidirectional_line_paths(image, n_ch)
+            else:
+                forward = True
+                # make a line in the scan, _scan_counter says which one it is
+                line = np.vstack((image[self._scan_counter, :, 0],
+                                  image[self._scan_counter, :, 1],
+                                  image[self._scan_counter, :, 2],
+                                  np.full(image[self._scan_counter, :, 3].shape, self._current_a)
+                                  )[0:n_ch])
+
+                # make a line to go to the starting position of the next scan line
+                if self.depth_scan_dir_is_xz:
+                    return_line = np.vstack((
+                        self._return_XL,
+                        image[self._scan_counter, 0, 1] * np.ones(self._return_XL.shape),
+                        image[self._scan_counter, 0, 2] * np.ones(self._return_XL.shape),
+                        self._return_AL * self._current_a
+                        )[0:n_ch])
+                else:
+                    return_line = np.vstack((
+                        image[self._scan_counter, 0, 1] * np.ones(self._return_YL.shape),
+                        self._return_YL,
+                        image[self._scan_counter, 0, 2] * np.ones(self._return_YL.shape),
+                        self._return_AL * self._current_a
+                        )[0:n_ch])
+
+            if self._scan_counter == 0 or self._move_to_line_start:
+                # make a line from the current cursor position to the starting
+                # position of the first scan line of the (continued) scan
+                current = (self._current_x, self._current_y, self._current_z, self._current_a)
+                start_line = np.vstack([np.linspace(current[axis], line[axis, 0], self.return_slowness)
+                                        for axis in range(n_ch)])
+                self._move_to_line_start = False
             else:
-                return_line = np.vstack((
-                    image[self._scan_counter, 0, 1] * np.ones(self._return_YL.shape),
-                    self._return_YL,
-                    image[self._scan_counter, 0, 2] * np.ones(self._return_YL.shape),
-                    self._return_AL * self._current_a
-                    )[0:n_ch])
-
-            # return the scanner to the start of next line, counts are thrown away
-            return_line_counts = self._scanning_device.scan_line(return_line)
-            if return_line_counts[0] == -1:
+                start_line = None
+
+            # move to the start of the line (only for the first line), scan the
+            # line and return the scanner to the start of the next line in a
+            # single hardware scan, only the counts on the line are returned
+            line_counts = self._scanning_device.scan_line_with_return(
+                line, return_path=return_line, start_path=start_line)
+            if line_counts[0] == -1:
                 self.stopRequested = True
                 self.signal_scan_lines_next.emit()
                 return
 
             # update image with counts from the line we just scanned
+            if self.bidirectional_scan:
+                self._store_bidirectional_line(image, line_counts, forward)
+            else:
+                image[self._scan_counter, :, 3] = line_counts
             if self._zscan:
-                if self.depth_scan_dir_is_xz:
-                    self.depth_image[self._scan_counter, :, 3] = line_counts
-                else:
-                    self.depth_image[self._scan_counter, :, 3] = line_counts
                 self.signal_depth_image_updated.emit()
             else:
-                self.xy_image[self._scan_counter, :, 3] = line_counts
                 self.signal_xy_image_updated.emit()
 
             # next line in scan
@@ -768,7 +990,11 @@ class ConfocalLogic(GenericLogic):
 
             # stop scanning when last line scan was performed and makes scan not continuable
             if self._scan_counter >= np.size(self._image_vert_axis):
-                if not self.permanent_scan:
+                if not self._zscan and self._volume_store is not None:
+                    if not self._finish_volume_slice():
+                        self.stop_scanning()
+                        self._xyscan_continuable = False
+                elif not self.permanent_scan:
                     self.stop_scanning()
                     if self._zscan:
                         self._zscan_continuable = False
@@ -784,6 +1010,359 @@ class ConfocalLogic(GenericLogic):
             self.stop_scanning()
             self.signal_scan_lines_next.emit()
 
+    def _bidirectional_line_paths(self, image, n_ch):
+        """ Paths of the current line of a bidirectional scan.
+
+        Lines with an even index are scanned forward and lines with an odd
+        index backward. Instead of the return line the scanner only moves a
+        few steps from the end of the line to the start of the next one.
+
+        @param ScanImage image: the image which is scanned
+        @param int n_ch: number of scanner axes
+
+        @return tuple: line, path to the start of the next line (None for the
+                       last line) and True if the line is scanned forward
+        """
+        row = self._scan_counter
+        forward = row % 2 == 0
+        line = np.vstack((image[row, :, 0],
+                          image[row, :, 1],
+                          image[row, :, 2],
+                          np.full(image[row, :, 3].shape, self._current_a)
+                          )[0:n_ch])
+        if not forward:
+            line = line[:, ::-1]
+
+        if row + 1 >= len(image):
+            return line, None, forward
+        # the next line starts where this one ends
+        next_start = np.append(image[row + 1, -1 if forward else 0, 0:3], self._current_a)
+        if not self._zscan:
+            next_start[2] = self._current_z
+        turn_line = np.vstack([np.linspace(line[axis, -1], next_start[axis], self.turnaround_points)
+                               for axis in range(n_ch)])
+        return line, turn_line, forward
+
+    def _store_bidirectional_line(self, image, line_counts, forward):
+        """ Put the counts of a bidirectional scan line into the image.
+
+        The scanner follows its set position with a delay, so forward and
+        backward lines are shifted against each other. The delay is estimated
+        from the cross-correlation of adjacent lines and both lines are
+        shifted back by it.
+
+        @param ScanImage image: the image which is scanned
+        @param numpy.ndarray line_counts: counts in the order they were taken
+        @param bool forward: True if the line was scanned forward
+        """
+        row = self._scan_counter
+        counts = np.array(line_counts, dtype=float)
+        if not forward:
+            counts = counts[::-1]
+
+        previous = self._previous_line
+        if previous is not None and previous[0] == row - 1 and previous[2] != forward:
+            if forward:
+                self._update_line_lag(counts, previous[1])
+            else:
+                self._update_line_lag(previous[1], counts)
+            # the estimate changed, so correct the previous line again
+            image[row - 1, :, 3] = self._shift_line(previous[1], previous[2])
+        image[row, :, 3] = self._shift_line(counts, forward)
+        self._previous_line = (row, counts, forward)
+
+    def _update_line_lag(self, forward_counts, backward_counts, min_correlation=0.3):
+        """ Improve the lag estimate with a pair of adjacent lines.
+
+        The position of a feature in the forward line is shifted by +lag and
+        in the backward line by -lag, so the cross-correlation of both lines
+        peaks at twice the lag. The peak is interpolated with a parabola and
+        the estimates of all line pairs are averaged, weighted with the height
+        of the peak.
+
+        @param numpy.ndarray forward_counts: counts of the forward line
+        @param numpy.ndarray backward_counts: counts of the backward line in
+                                              forward order
+        @param float min_correlation: line pairs with a lower normalized
+                                      correlation are ignored
+        """
+        forward_counts = forward_counts - np.mean(forward_counts)
+        backward_counts = backward_counts - np.mean(backward_counts)
+        norm = np.sqrt(np.sum(forward_counts**2) * np.sum(backward_counts**2))
+        if norm == 0:
+            return
+        length = len(forward_counts)
+        max_shift = max(length // 4, 1)
+        correlation = np.correlate(forward_counts, backward_counts, mode='full') / norm
+        # index length - 1 is a shift of zero
+        correlation = correlation[length - 1 - max_shift:length + max_shift]
+        peak = np.argmax(correlation)
+        if correlation[peak] < min_correlation:
+            return
+        shift = float(peak - max_shift)
+        if 0 < peak < len(correlation) - 1:
+            left, center, right = correlation[peak - 1:peak + 2]
+            curvature = left - 2 * center + right
+            if curvature < 0:
+                shift += 0.5 * (left - right) / curvature
+        weight = correlation[peak]
+        self.line_lag = ((self.line_lag * self._line_lag_weight + weight * shift / 2)
+                         / (self._line_lag_weight + weight))
+        self._line_lag_weight += weight
+
+    def _shift_line(self, counts, forward):
+        """ Counts of a line corrected by the current lag estimate.
+
+        @param numpy.ndarray counts: counts in forward order
+        @param bool forward: True if the line was scanned forward
+
+        @return numpy.ndarray: the shifted counts
+        """
+        if self.line_lag == 0:
+            return counts
+        pixels = np.arange(len(counts))
+        shift = self.line_lag if forward else -self.line_lag
+        return np.interp(pixels + shift, pixels, counts)
+
+    def _init_adaptive_scan(self):
+        """ Prepare the coarse pass of an adaptive xy scan.
+
+        Every adaptive_coarse_factor-th row is scanned at every
+        adaptive_coarse_factor-th pixel first. The coarse pixel spacing should
+        not be larger than the spots which are searched for, otherwise they can
+        fall between the coarse pixels.
+        """
+        rows, columns = self.xy_image.shape[:2]
+        self._adaptive_rows = adaptive_scan.coarse_indices(rows, self.adaptive_coarse_factor)
+        self._adaptive_columns = adaptive_scan.coarse_indices(columns, self.adaptive_coarse_factor)
+        self._adaptive_coarse_counts = np.zeros((len(self._adaptive_rows), len(self._adaptive_columns)))
+        self._adaptive_level = 0
+        self._adaptive_position = None
+        self._adaptive_last_pixel = (None, None)
+        self._adaptive_pixels = 0
+        self.xy_refined_mask = np.zeros((rows, columns), dtype=bool)
+        self._adaptive_jobs = [(index, row, self._adaptive_columns)
+                               for index, row in enumerate(self._adaptive_rows)]
+        self.xy_image_levels = []
+
+    def _refine_adaptive_scan(self):
+        """ Store the coarse image and plan the rescan of its interesting parts.
+        """
+        coarse_rows = self._adaptive_rows
+        coarse_columns = self._adaptive_columns
+        coarse_image = ScanImage(
+            (np.zeros(len(coarse_rows)), self._Y[coarse_rows], np.full(len(coarse_rows), self._current_z)),
+            (self._XL[coarse_columns], np.zeros(len(coarse_columns)), np.zeros(len(coarse_columns))),
+            self._adaptive_coarse_counts)
+        self.xy_image_levels = [coarse_image, self.xy_image]
+
+        mask = adaptive_scan.refinement_mask(
+            self._adaptive_coarse_counts, coarse_rows, coarse_columns, self.xy_image.shape[:2],
+            threshold=self.adaptive_threshold, gradient_threshold=self.adaptive_gradient_threshold)
+        # moving over a gap takes about as long as the move between two parts,
+        # the rows are scanned alternately forward and backward
+        self._adaptive_jobs = []
+        for row in range(mask.shape[0]):
+            segments = [np.arange(start, stop + 1) for start, stop in
+                        adaptive_scan.mask_segments(mask[row], self.return_slowness)]
+            if len(segments) == 0:
+                continue
+            if len(self._adaptive_jobs) > 0 and self._adaptive_jobs[-1][2][-1] >= segments[-1][-1]:
+                segments = [columns[::-1] for columns in reversed(segments)]
+            self._adaptive_jobs.extend((None, row, columns) for columns in segments)
+        self._adaptive_level = 1
+
+    def _scan_adaptive_line(self, image, n_ch):
+        """ Scan the next part of an adaptive xy scan.
+
+        The coarse pass fills the image by interpolating between the coarse
+        pixels, the fine pass replaces the interesting parts by measured pixels.
+
+        @param ScanImage image: the xy image
+        @param int n_ch: number of scanner axes
+        """
+        try:
+            if not self._adaptive_jobs and self._adaptive_level == 0:
+                self._refine_adaptive_scan()
+            if not self._adaptive_jobs:
+                self.log.info('Adaptive scan finished after scanning {0} of {1} pixels.'.format(
+                    self._adaptive_pixels, self.xy_refined_mask.size))
+                if self._volume_store is not None and self._finish_volume_slice():
+                    self.signal_scan_lines_next.emit()
+                    return
+                self.stop_scanning()
+                self.signal_scan_lines_next.emit()
+                return
+
+            index, row, columns = self._adaptive_jobs.pop(0)
+            image[row, :, 2] = self._current_z
+            line = np.vstack((image[row, columns, 0:3].transpose(),
+                              np.full(len(columns), self._current_a)))[0:n_ch]
+            if self._adaptive_position is None:
+                self._adaptive_position = np.array(
+                    (self._current_x, self._current_y, self._current_z, self._current_a))[0:n_ch]
+            # short jumps take as many steps as pixels are skipped
+            last_row, last_column = self._adaptive_last_pixel
+            if last_row is None:
+                steps = self.return_slowness
+            else:
+                distance = abs(columns[0] - last_column) + abs(row - last_row)
+                steps = int(np.clip(distance, 2, self.return_slowness))
+            start_line = np.vstack([np.linspace(self._adaptive_position[axis], line[axis, 0], steps)
+                                    for axis in range(n_ch)])
+
+            line_counts = self._scanning_device.scan_line_with_return(line, start_path=start_line)
+            if line_counts[0] == -1:
+                self.stopRequested = True
+                self.signal_scan_lines_next.emit()
+                return
+            self._adaptive_position = line[:, -1]
+            self._adaptive_last_pixel = (row, columns[-1])
+            self._adaptive_pixels += len(columns)
+            self._scan_counter = row
+
+            if index is None:
+                image[row, columns, 3] = line_counts
+                self.xy_refined_mask[row, columns] = True
+            else:
+                # interpolate the fine rows since the previous coarse row
+                self._adaptive_coarse_counts[index] = line_counts
+                current = np.interp(np.arange(image.shape[1]), columns, line_counts)
+                if index == 0:
+                    image[row, :, 3] = current
+                else:
+                    previous_row = self._adaptive_rows[index - 1]
+                    previous = np.interp(np.arange(image.shape[1]), columns,
+                                         self._adaptive_coarse_counts[index - 1])
+                    weights = (np.arange(previous_row + 1, row + 1) - previous_row) / (row - previous_row)
+                    image[previous_row + 1:row + 1, :, 3] = (
+                        previous + weights[:, np.newaxis] * (current - previous))
+            self.signal_xy_image_updated.emit()
+            self.signal_scan_lines_next.emit()
+
+        except Exception as e:
+            self.log.critical('The scan went wrong, killing the scanner.')
+            self.stop_scanning()
+            self.signal_scan_lines_next.emit()
+
+    def start_volume_scan(self, directory=None):
+        """ Scan a stack of xy images at the z positions of the depth scan.
+
+        Each xy slice is written to a volume on disk as soon as it is complete,
+        so only a single slice is kept in memory. If the directory already
+        contains a volume, its scan parameters are taken over and the scan
+        continues at the first missing slice.
+
+        @param str directory: directory of the volume, a new directory in the
+                              data directory of today if None
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if self.getState() == 'locked':
+            self.log.error('A scan is already running, the volume scan can not start.')
+            return -1
+        if directory is None:
+            directory = os.path.join(
+                self._save_logic.get_path_for_module(module_name='Confocal'),
+                '{0}_confocal_volume'.format(datetime.now().strftime('%Y%m%d-%H%M-%S')))
+        elif VolumeStore.exists(directory):
+            parameters = VolumeStore(directory).parameters
+            self.image_x_range = parameters['x_range']
+            self.image_y_range = parameters['y_range']
+            self.image_z_range = parameters['z_range']
+            self.xy_resolution = parameters['xy_resolution']
+            self.z_resolution = parameters['z_resolution']
+        self.volume_directory = directory
+        self._volume_requested = True
+        return self.start_scanning(zscan=False)
+
+    def resume_volume_scan(self):
+        """ Continue the last volume scan at its first missing slice.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if self.volume_directory is None or not VolumeStore.exists(self.volume_directory):
+            self.log.error('There is no volume scan to resume.')
+            return -1
+        return self.start_volume_scan(self.volume_directory)
+
+    def _open_volume(self):
+        """ Create or open the volume of a volumetric scan after the xy image
+        was initialized and move to the z position of its first missing slice.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        z_positions = np.linspace(self.image_z_range[0], self.image_z_range[1],
+                                  max(self.z_resolution, 2))
+        parameters = {'x_range': list(self.image_x_range),
+                      'y_range': list(self.image_y_range),
+                      'z_range': list(self.image_z_range),
+                      'xy_resolution': self.xy_resolution,
+                      'z_resolution': self.z_resolution,
+                      'clock_frequency': self._clock_frequency,
+                      'return_slowness': self.return_slowness}
+        store = VolumeStore(self.volume_directory, self._X, self._Y, z_positions,
+                            parameters=parameters)
+        if store.shape[1:] != self.xy_image.shape[:2]:
+            self.log.error('The xy scan does not match the slices of the volume in {0}.'
+                           ''.format(self.volume_directory))
+            return -1
+        index = store.next_slice()
+        if index is None:
+            self.log.error('All slices of the volume in {0} are already scanned.'
+                           ''.format(self.volume_directory))
+            return -1
+        self._volume_store = store
+        self.volume_projections = store.projections
+        self._volume_slice = index
+        self._volume_start_z = self._current_z
+        self._current_z = store.z_positions[index]
+        return 0
+
+    def _finish_volume_slice(self):
+        """ Write the finished xy slice to the volume and prepare the next one.
+
+        @return bool: True if another slice has to be scanned
+        """
+        store = self._volume_store
+        store.write_slice(self._volume_slice, self.xy_image[:, :, 3])
+        self.sigVolumeSliceFinished.emit(self._volume_slice)
+        index = store.next_slice()
+        if index is None:
+            self.log.info('Volume scan in {0} finished.'.format(self.volume_directory))
+            self._close_volume()
+            return False
+
+        self._volume_slice = index
+        self._current_z = store.z_positions[index]
+        self._scan_counter = 0
+        self._move_to_line_start = True
+        self._previous_line = None
+        self.xy_image[:, :, 3] = 0
+        if self.adaptive_scan:
+            self._init_adaptive_scan()
+        return True
+
+    def _close_volume(self):
+        """ Release the volume and move the cursor back to its z position
+        before the volume scan.
+        """
+        self._volume_store.close()
+        self._volume_store = None
+        self._current_z = self._volume_start_z
+
+    def get_volume_projections(self):
+        """ Maximum intensity projections of the current or last volume scan.
+
+        They are updated after every slice, slices which are not scanned yet
+        are NaN.
+
+        @return dict: 'xy', 'xz' and 'yz' as keys and arrays with the shapes
+                      (y, x), (z, x) and (z, y) as items, None before the
+                      first volume scan
+        """
+        return self.volume_projections
+
     def save_xy_data(self, colorscale_range=None, percentile_range=None):
         """ Save the current confocal xy data to file.
 
@@ -818,6 +1397,12 @@ class ConfocalLogic(GenericLogic):
 
         parameters['Clock frequency of scanner (Hz)'] = self._clock_frequency
         parameters['Return Slowness (Steps during retrace line)'] = self.return_slowness
+        parameters['Bidirectional scan'] = self.bidirectional_scan
+        if self.bidirectional_scan:
+            parameters['Line lag (pixels)'] = self.line_lag
+        parameters['Adaptive scan'] = self.adaptive_scan
+        if self.adaptive_scan:
+            parameters['Adaptive scan coarse factor'] = self.adaptive_coarse_factor
 
         # data for the text-array "image":
         image_data = OrderedDict()
@@ -860,17 +1445,11 @@ class ConfocalLogic(GenericLogic):
 
         # prepare the full raw data in an OrderedDict:
         data = OrderedDict()
-        x_data = []
-        y_data = []
-        z_data = []
-        counts_data = []
-
-        for row in self.xy_image:
-            for entry in row:
-                x_data.append(entry[0])
-                y_data.append(entry[1])
-                z_data.append(entry[2])
-                counts_data.append(entry[3])
+        # one entry per pixel, row by row
+        x_data = self.xy_image[:, :, 0].ravel()
+        y_data = self.xy_image[:, :, 1].ravel()
+        z_data = self.xy_image[:, :, 2].ravel()
+        counts_data = self.xy_image[:, :, 3].ravel()
 
         data['x values (micron)'] = x_data
         data['y values (micron)'] = y_data
@@ -920,6 +1499,9 @@ class ConfocalLogic(GenericLogic):
 
         parameters['Clock frequency of scanner (Hz)'] = self._clock_frequency
         parameters['Return Slowness (Steps during retrace line)'] = self.return_slowness
+        parameters['Bidirectional scan'] = self.bidirectional_scan
+        if self.bidirectional_scan:
+            parameters['Line lag (pixels)'] = self.line_lag
 
         # data for the text-array "image":
         image_data = OrderedDict()
@@ -970,17 +1552,11 @@ class ConfocalLogic(GenericLogic):
 
         # prepare the full raw data in an OrderedDict:
         data = OrderedDict()
-        x_data = []
-        y_data = []
-        z_data = []
-        counts_data = []
-
-        for row in self.depth_image:
-            for entry in row:
-                x_data.append(entry[0])
-                y_data.append(entry[1])
-                z_data.append(entry[2])
-                counts_data.append(entry[3])
+        # one entry per pixel, row by row
+        x_data = self.depth_image[:, :, 0].ravel()
+        y_data = self.depth_image[:, :, 1].ravel()
+        z_data = self.depth_image[:, :, 2].ravel()
+        counts_data = self.depth_image[:, :, 3].ravel()
 
         data['x values (micros)'] = x_data
         data['y values (micros)'] = y_data
@@ -21,11 +21,18 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 
 from qtpy import QtCore
 from collections import OrderedDict
+import datetime
 import numpy as np
+import os
+import shutil
 import time
 import matplotlib.pyplot as plt
 
 from logic.generic_logic import GenericLogic
+from logic.ring_buffer import RingBuffer
+from logic.ring_buffer import RunningFilter
+from logic.stream_recorder import StreamRecorder
+from logic.trace_decimation import DecimationPyramid
 from core.util.mutex import Mutex
 
 
@@ -75,7 +82,10 @@ class CounterLogic(GenericLogic):
         self._count_frequency = 50
         self._counting_samples = 1
         self._smooth_window_length = 10
+        self._smoothing_method = 'median'
         self._binned_counting = True
+        # maximal number of rows in the text file of a saved recording
+        self._text_export_rows = 10000
 
         self._counting_mode = 'continuous'
 
@@ -91,16 +101,10 @@ class CounterLogic(GenericLogic):
                          of the state which should be reached after the event
                          has happen.
         """
-        self.countdata = np.zeros((self._count_length,))
-        self.countdata_smoothed = np.zeros((self._count_length,))
-        self.countdata2 = np.zeros((self._count_length,))
-        self.countdata_smoothed2 = np.zeros((self._count_length,))
-        self.rawdata = np.zeros([2, self._counting_samples])
-
         self.running = False
         self.stopRequested = False
         self._saving = False
-        self._data_to_save=[]
+        self._recorder = None
         self._saving_start_time=time.time()
 
         self._counting_device = self.get_in_connector('counter1')
@@ -108,6 +112,11 @@ class CounterLogic(GenericLogic):
 
         self._save_logic = self.get_in_connector('savelogic')
 
+        self._channels = list(self._counting_device.get_counter_channels())
+        self._recorded_channels = list(self._channels)
+        self._init_buffers()
+        self.rawdata = np.zeros([len(self._channels), self._counting_samples])
+
         #QSignals
         self.sigCountContinuousNext.connect(self.countLoopBody_continuous, QtCore.Qt.QueuedConnection)
         self.sigCountGatedNext.connect(self.countLoopBody_gated, QtCore.Qt.QueuedConnection)
@@ -128,8 +137,154 @@ class CounterLogic(GenericLogic):
                 break
             QtCore.QCoreApplication.processEvents()
             time.sleep(0.1)
+        self._discard_unsaved_recording()
         return
 
+    def _init_buffers(self):
+        """ Create empty circular buffers for the count traces and their smoothed versions. """
+        self._count_buffer = RingBuffer(self._count_length, channels=len(self._channels))
+        self._smoothed_buffer = RingBuffer(self._count_length, channels=len(self._channels))
+        self._smoothing_filters = [RunningFilter(self._smooth_window_length, self._smoothing_method)
+                                   for channel in self._channels]
+        # reduced versions of the traces for the display
+        self._count_pyramid = DecimationPyramid(self._count_length, channels=len(self._channels))
+        self._smoothed_pyramid = DecimationPyramid(self._count_length, channels=len(self._channels))
+
+    def _add_counts(self, counts):
+        """ Append one averaged sample per channel to the count traces.
+
+        @param numpy.ndarray counts: new count rate of each channel
+        """
+        smoothed = [smoothing.push(value) for smoothing, value in zip(self._smoothing_filters, counts)]
+        self._count_buffer.append(counts)
+        self._smoothed_buffer.append(smoothed)
+        self._count_pyramid.append(counts)
+        self._smoothed_pyramid.append(smoothed)
+
+    def _channel_counts(self, rawdata):
+        """ Bring the data read from the counter into the shape (channels, samples).
+
+        @param numpy.ndarray rawdata: data returned by get_counter of the hardware
+
+        @return numpy.ndarray: one row of count rates for each channel
+        """
+        rawdata = np.asarray(rawdata, dtype=float)
+        if rawdata.ndim < 2:
+            rawdata = rawdata.reshape(len(self._channels), -1)
+        return rawdata[:len(self._channels)]
+
+    def get_channels(self):
+        """ Returns the names of the counter channels.
+
+        @return list(str): one name for each row of countdata_matrix
+        """
+        return list(self._channels)
+
+    @property
+    def countdata_matrix(self):
+        """ Count traces of all channels with shape (channels, count_length).
+
+        The newest sample is last.
+        """
+        return self._count_buffer.view()
+
+    @property
+    def countdata_smoothed_matrix(self):
+        """ Smoothed count traces of all channels with shape (channels, count_length).
+
+        Each entry is the median or mean of the window centered around it; the
+        most recent half window holds the latest value.
+        """
+        traces = self._smoothed_buffer.view()
+        shift = min(int(self._smooth_window_length / 2), traces.shape[1] - 1)
+        if shift > 0:
+            traces[:, :-shift] = traces[:, shift:]
+            traces[:, -shift:] = traces[:, -1:]
+        return traces
+
+    def get_display_data(self, max_points=1000):
+        """ Count traces reduced to the number of points a plot can show.
+
+        The raw traces are returned as minimum and maximum of consecutive
+        blocks, so that single peaks stay visible, the smoothed traces as
+        block averages. The work done for a call does not grow with the count
+        length once it exceeds max_points.
+
+        @param int max_points: maximum number of points per channel, e.g.
+                               twice the width of the plot in pixels
+
+        @return tuple: time of each point in s and counts with shape
+                       (channels, points) for the raw traces, followed by the
+                       same for the smoothed traces
+        """
+        positions, counts = self._count_pyramid.get_display_data(max_points)
+        smoothed_positions, smoothed = self._smoothed_pyramid.get_display_data(
+            max_points, mode='mean')
+        # the smoothed value belongs to the center of the smoothing window
+        shift = int(self._smooth_window_length / 2)
+        times = (positions + self._count_length - 1) / self._count_frequency
+        smoothed_times = (smoothed_positions - shift + self._count_length - 1) / self._count_frequency
+        return times, counts, smoothed_times, smoothed
+
+    def get_current_counts(self, smoothed=True):
+        """ The latest count rate of each channel.
+
+        @param bool smoothed: return the latest running median or mean instead
+                              of the latest raw sample
+
+        @return numpy.ndarray: one count rate per channel
+        """
+        if smoothed:
+            return self._smoothed_buffer.latest(1)[:, 0]
+        return self._count_buffer.latest(1)[:, 0]
+
+    @property
+    def countdata(self):
+        """ Count trace of the first channel, the newest sample is last. """
+        return self.countdata_matrix[0]
+
+    @property
+    def countdata2(self):
+        """ Count trace of the second channel, zeros if there is only one channel. """
+        if len(self._channels) < 2:
+            return np.zeros(self._count_length)
+        return self.countdata_matrix[1]
+
+    @property
+    def countdata_smoothed(self):
+        """ Smoothed count trace of the first channel. """
+        return self.countdata_smoothed_matrix[0]
+
+    @property
+    def countdata_smoothed2(self):
+        """ Smoothed count trace of the second channel, zeros if there is only one channel. """
+        if len(self._channels) < 2:
+            return np.zeros(self._count_length)
+        return self.countdata_smoothed_matrix[1]
+
+    def set_smoothing_method(self, method='median'):
+        """ Sets the running filter used for the smoothed count trace.
+
+        @param str method: 'median' or 'mean'
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if method not in ('median', 'mean'):
+            self.log.error('Unknown smoothing method "{0}".'.format(method))
+            return -1
+        with self.threadlock:
+            self._smoothing_method = method
+            self._smoothing_filters = [RunningFilter(self._smooth_window_length, method)
+                                       for channel in self._channels]
+        return 0
+
+    def get_smoothing_method(self):
+        """ Returns the running filter used for the smoothed count trace.
+
+        @return str: 'median' or 'mean'
+        """
+        return self._smoothing_method
+
     def set_counting_samples(self, samples = 1):
         """ Sets the length of the counted bins.
 
@@ -240,15 +395,49 @@ class CounterLogic(GenericLogic):
         """
         return self._saving
 
+    @property
+    def _data_to_save(self):
+        """ All rows (time, counts of each channel) recorded since saving was started.
+
+        The rows are stored on disk and only read when they are accessed, see
+        StreamRecorder.
+        """
+        if self._recorder is None:
+            return np.zeros((0, 2))
+        return self._recorder
+
+    def _discard_unsaved_recording(self):
+        """ Remove the binary file of a recording which was never saved. """
+        if self._recorder is not None and self._recorder.filepath.endswith('.part'):
+            self._recorder.delete()
+        self._recorder = None
+
     def start_saving(self, resume=False):
-        """ Starts saving the data in a list.
+        """ Starts streaming the data to a binary file.
+
+        @param bool resume: continue the previous recording instead of starting a new one
 
         @return int: error code (0:OK, -1:error)
         """
 
-        if not resume:
-            self._data_to_save = []
+        if not resume or self._recorder is None:
+            self._discard_unsaved_recording()
             self._saving_start_time = time.time()
+            self._recorded_channels = list(self._channels)
+            filepath = os.path.join(
+                self._save_logic.get_path_for_module(module_name='Counter'),
+                time.strftime('%Y%m%d-%H%M-%S_count_trace_raw.bin.part'))
+            self._recorder = StreamRecorder(filepath, 1 + len(self._recorded_channels))
+        elif not self._recorder.filepath.endswith('.part'):
+            # the recording was saved already, it is continued in a copy so
+            # that the saved file keeps the samples stated in its text file
+            filepath = os.path.join(
+                self._save_logic.get_path_for_module(module_name='Counter'),
+                time.strftime('%Y%m%d-%H%M-%S_count_trace_raw.bin.part'))
+            shutil.copyfile(self._recorder.filepath, filepath)
+            self._recorder = StreamRecorder(filepath, self._recorder.columns)
+        else:
+            self._recorder.open()
         self._saving = True
 
         # If the counter is not running, then it should start running so there is data to save
@@ -257,16 +446,28 @@ class CounterLogic(GenericLogic):
 
         return 0
 
-    def save_data(self, to_file=True, postfix=''):
+    def save_data(self, to_file=True, postfix='', export_text=True):
         """ Save the counter trace data and writes it to a file.
 
         @param bool to_file: indicate, whether data have to be saved to file
         @param str postfix: an additional tag, which will be added to the filename upon save
+        @param bool export_text: write a decimated version of the recording to
+                                 the text file, otherwise the text file only
+                                 contains the parameters
+
+        @return StreamRecorder, OrderedDict: array like recording with the
+                                             rows (time, counts of each
+                                             channel) and the parameters
 
-        @return np.array([2 or 3][X]), OrderedDict: array with the
+        The complete recording is stored next to the text file in a binary
+        file of little endian float64 rows with the same columns.
         """
         self._saving = False
         self._saving_stop_time = time.time()
+        if self._recorder is None:
+            self.log.error('Nothing recorded, call start_saving first.')
+            return self._data_to_save, OrderedDict()
+        self._recorder.flush()
 
         # write the parameters:
         parameters = OrderedDict()
@@ -283,25 +484,45 @@ class CounterLogic(GenericLogic):
             else:
                 filelabel = 'count_trace_'+postfix
 
-            # prepare the data in a dict or in an OrderedDict:
-            data = OrderedDict()
-            data = {'Time (s),Signal (counts/s)': self._data_to_save}
-            if self._counting_device._photon_source2 is not None:
-                data = {'Time (s),Signal 1 (counts/s),Signal 2 (counts/s)': self._data_to_save}
-
             filepath = self._save_logic.get_path_for_module(module_name='Counter')
+            timestamp = datetime.datetime.now()
+
+            # move the binary recording next to the text file
+            raw_filename = timestamp.strftime('%Y%m%d-%H%M-%S') + '_' + filelabel + '_raw.bin'
+            self._recorder.move(os.path.join(filepath, raw_filename))
+            parameters['Raw data file'] = raw_filename
+            parameters['Raw data format'] = 'little endian float64, {0} columns'.format(
+                self._recorder.columns)
+            parameters['Number of samples'] = len(self._recorder)
+
+            # the text file contains block averages of the recording
+            decimated = self._recorder.decimate(self._text_export_rows)
+            parameters['Samples averaged in text export'] = int(
+                np.ceil(len(self._recorder) / max(len(decimated), 1)))
+
+            header = 'Time (s),' + ','.join(
+                '{0} (counts/s)'.format(channel) for channel in self._recorded_channels)
+            if export_text:
+                data = {header: decimated}
+            else:
+                data = {header: np.zeros((0, self._recorder.columns))}
 
-            fig = self.draw_figure(data=np.array(self._data_to_save))
+            if len(decimated) > 0:
+                fig = self.draw_figure(data=decimated)
+            else:
+                fig = None
 
             self._save_logic.save_data(data,
                                        filepath,
                                        parameters=parameters,
                                        filelabel=filelabel,
+                                       timestamp=timestamp,
                                        as_text=True,
                                        plotfig=fig
                                        )
             #, as_xml=False, precision=None, delimiter=None)
-            plt.close(fig)
+            if fig is not None:
+                plt.close(fig)
             self.log.debug('Counter Trace saved to:\n{0}'.format(filepath))
 
         return self._data_to_save, parameters
@@ -313,9 +534,7 @@ class CounterLogic(GenericLogic):
 
         @return: fig fig: a matplotlib figure object to be saved to file.
         """
-        # TODO: Draw plot for second APD if it is connected
-
-        count_data = data[:,1]
+        count_data = data[:,1:]
         time_data = data[:,0]
 
         # Scale count values using SI prefix
@@ -334,7 +553,10 @@ class CounterLogic(GenericLogic):
         # Create figure
         fig, ax = plt.subplots()
 
-        ax.plot(time_data, count_data, linestyle=':', linewidth=0.5)
+        for index, channel in enumerate(self._recorded_channels[:count_data.shape[1]]):
+            ax.plot(time_data, count_data[:, index], linestyle=':', linewidth=0.5, label=channel)
+        if count_data.shape[1] > 1:
+            ax.legend()
 
         ax.set_xlabel('Time (s)')
         ax.set_ylabel('Fluorescence (' + counts_prefix + 'c/s)')
@@ -394,17 +616,9 @@ class CounterLogic(GenericLogic):
             return -1
 
         # initialising the data arrays
-        self.rawdata = np.zeros([2, self._counting_samples])
-        self.countdata = np.zeros((self._count_length,))
-        self.countdata_smoothed = np.zeros((self._count_length,))
-        self._sampling_data = np.empty((self._counting_samples, 2))
-
-        # It is robust to check whether the photon_source2 even exists first.
-        if hasattr(self._counting_device, '_photon_source2'):
-            if self._counting_device._photon_source2 is not None:
-                self.countdata2 = np.zeros((self._count_length,))
-                self.countdata_smoothed2 = np.zeros((self._count_length,))
-                self._sampling_data2 = np.empty((self._counting_samples, 2))
+        self._channels = list(self._counting_device.get_counter_channels())
+        self.rawdata = np.zeros([len(self._channels), self._counting_samples])
+        self._init_buffers()
 
         self.sigCountContinuousNext.emit()
 
@@ -445,9 +659,10 @@ class CounterLogic(GenericLogic):
         # initialising the data arrays
 
         # in rawdata the 'fresh counts' are read in
-        self.rawdata = np.zeros([2, self._counting_samples])
-        # countdata contains the appended data, that is the total displayed counttrace
-        self.countdata = np.zeros((self._count_length,))
+        self._channels = list(self._counting_device.get_counter_channels())
+        self.rawdata = np.zeros([len(self._channels), self._counting_samples])
+        # the count buffer contains the appended data, that is the total displayed counttrace
+        self._init_buffers()
         # do not use a smoothed count trace
         # self.countdata_smoothed = np.zeros((self._count_length,)) # contains the smoothed data
         # for now, there will be no oversampling mode.
@@ -495,61 +710,35 @@ class CounterLogic(GenericLogic):
             self.sigCountContinuousNext.emit()
             raise e
 
-        # remember the new count data in circular array
-        self.countdata[0] = np.average(self.rawdata[0])
-        # move the array to the left to make space for the new data
-        self.countdata = np.roll(self.countdata, -1)
-        # also move the smoothing array
-        self.countdata_smoothed = np.roll(self.countdata_smoothed, -1)
-        # calculate the median and save it
-        self.countdata_smoothed[-int(self._smooth_window_length/2)-1:]=np.median(self.countdata[-self._smooth_window_length:])
-
-        # It is robust to check whether the photon_source2 even exists first.
-        if hasattr(self._counting_device, '_photon_source2'):
-            if self._counting_device._photon_source2 is not None:
-                self.countdata2[0] = np.average(self.rawdata[1])
-                # move the array to the left to make space for the new data
-                self.countdata2 = np.roll(self.countdata2, -1)
-                # also move the smoothing array
-                self.countdata_smoothed2 = np.roll(self.countdata_smoothed2, -1)
-                # calculate the median and save it
-                self.countdata_smoothed2[-int(self._smooth_window_length/2)-1:] = np.median(self.countdata2[-self._smooth_window_length:])
+        self._process_counts()
 
-        # save the data if necessary
-        if self._saving:
-             # if oversampling is necessary
-            if self._counting_samples > 1:
-                if self._counting_device._photon_source2 is not None:
-                    self._sampling_data = np.empty([self._counting_samples, 3])
-                    self._sampling_data[:, 0] = time.time() - self._saving_start_time
-                    self._sampling_data[:, 1] = self.rawdata[0]
-                    self._sampling_data[:, 2] = self.rawdata[1]
-                else:
-                    self._sampling_data = np.empty([self._counting_samples, 2])
-                    self._sampling_data[:, 0] = time.time() - self._saving_start_time
-                    self._sampling_data[:, 1] = self.rawdata[0]
-
-                self._data_to_save.extend(list(self._sampling_data))
-            # if we don't want to use oversampling
-            else:
-                # append tuple to data stream (timestamp, average counts)
-                if self._counting_device._photon_source2 is not None:
-                    self._data_to_save.append(np.array(
-                                                       (time.time() - self._saving_start_time,
-                                                        self.countdata[-1],
-                                                        self.countdata2[-1])
-                                                        ))
-                else:
-                    self._data_to_save.append(
-                        np.array(
-                            (time.time() - self._saving_start_time,
-                             self.countdata[-1]
-                             )))
         # call this again from event loop
         self.sigCounterUpdated.emit()
         self.sigCountContinuousNext.emit()
 
 
+    def _process_counts(self):
+        """ Add the counts just read from the hardware to the traces and the recording. """
+        counts = self._channel_counts(self.rawdata)
+
+        # remember the new count data of all channels in the circular buffer
+        # together with the running median or mean
+        new_counts = counts.mean(axis=1)
+        self._add_counts(new_counts)
+
+        # save the data if necessary
+        if self._saving:
+            rows = np.empty((counts.shape[1] if self._counting_samples > 1 else 1,
+                             1 + len(self._channels)))
+            rows[:, 0] = time.time() - self._saving_start_time
+            # if oversampling is necessary
+            if self._counting_samples > 1:
+                rows[:, 1:] = counts.transpose()
+            # if we don't want to use oversampling append (timestamp, average counts)
+            else:
+                rows[0, 1:] = new_counts
+            self._recorder.append(rows)
+
     def countLoopBody_gated(self):
         """ This method gets the count data from the hardware for the gated
         counting mode.
@@ -587,27 +776,8 @@ class CounterLogic(GenericLogic):
             self.sigCountContinuousNext.emit()
             raise e
 
-        # remember the new count data in circular array
-        self.countdata[0] = np.average(self.rawdata[0])
-        # move the array to the left to make space for the new data
-        self.countdata=np.roll(self.countdata, -1)
-        # also move the smoothing array
-        self.countdata_smoothed = np.roll(self.countdata_smoothed, -1)
-        # calculate the median and save it
-        self.countdata_smoothed[-int(self._smooth_window_length/2)-1:]=np.median(self.countdata[-self._smooth_window_length:])
+        self._process_counts()
 
-        # save the data if necessary
-        if self._saving:
-             # if oversampling is necessary
-            if self._counting_samples > 1:
-                self._sampling_data=np.empty((self._counting_samples,2))
-                self._sampling_data[:, 0] = time.time()-self._saving_start_time
-                self._sampling_data[:, 1] = self.rawdata[0]
-                self._data_to_save.extend(list(self._sampling_data))
-            # if we don't want to use oversampling
-            else:
-                # append tuple to data stream (timestamp, average counts)
-                self._data_to_save.append(np.array((time.time()-self._saving_start_time, self.countdata[-1])))
         # call this again from event loop
         self.sigCounterUpdated.emit()
         self.sigCountGatedNext.emit()
@@ -653,11 +823,12 @@ class CounterLogic(GenericLogic):
             raise e
 
 
-        if self._already_counted_samples+len(self.rawdata[0]) >= len(self.countdata):
+        new_counts = self._channel_counts(self.rawdata)
+        if self._already_counted_samples+new_counts.shape[1] >= self._count_length:
 
-            needed_counts = len(self.countdata) - self._already_counted_samples
-            self.countdata[0:needed_counts] = self.rawdata[0][0:needed_counts]
-            self.countdata=np.roll(self.countdata, -needed_counts)
+            needed_counts = self._count_length - self._already_counted_samples
+            self._count_buffer.append(new_counts[:, 0:needed_counts])
+            self._count_pyramid.append(new_counts[:, 0:needed_counts])
 
             self._already_counted_samples = 0
             self.stopRequested = True
@@ -666,12 +837,11 @@ class CounterLogic(GenericLogic):
             #self.log.debug(('len(self.rawdata[0]):', len(self.rawdata[0])))
             #self.log.debug(('self._already_counted_samples', self._already_counted_samples))
 
-            # replace the first part of the array with the new data:
-            self.countdata[0:len(self.rawdata[0])] = self.rawdata[0]
-            # roll the array by the amount of data it had been inserted:
-            self.countdata=np.roll(self.countdata, -len(self.rawdata[0]))
+            # append the new data to the circular buffer:
+            self._count_buffer.append(new_counts)
+            self._count_pyramid.append(new_counts)
             # increment the index counter:
-            self._already_counted_samples += len(self.rawdata[0])
+            self._already_counted_samples += new_counts.shape[1]
             # self.log.debug(('already_counted_samples:',self._already_counted_samples))
 
         # remember the new count data in circular array
@@ -718,17 +888,13 @@ class CounterLogic(GenericLogic):
         else:
             filelabel = 'snapshot_count_trace_'+name_tag
 
-        stop_time = self._count_length/self._count_frequency
-        time_step_size = stop_time/len(self.countdata)
-        x_axis = np.arange(0, stop_time, time_step_size)
+        countdata = self.countdata_matrix
+        x_axis = np.arange(countdata.shape[1]) / self._count_frequency
 
-        # prepare the data in a dict or in an OrderedDict:
+        # prepare the data in a dict or in an OrderedDict, one column per channel:
         data = OrderedDict()
-        if hasattr(self._counting_device, '_photon_source2'):
-            # if self._counting_device._photon_source2 is None:
-            data['Time (s),Signal 1 (counts/s),Signal 2 (counts/s)'] = np.array((x_axis, self.countdata, self.countdata2)).transpose()
-        else:
-            data['Time (s),Signal (counts/s)'] = np.array((x_axis, self.countdata)).transpose()
+        header = 'Time (s),' + ','.join('{0} (counts/s)'.format(channel) for channel in self._channels)
+        data[header] = np.vstack((x_axis, countdata)).transpose()
 
         # write the parameters:
         parameters = OrderedDict()
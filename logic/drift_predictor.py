@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains a Kalman filter which predicts the drift of the sample
+from the history of its measured positions.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+
+class KalmanDriftFilter:
+    """
+    Constant velocity Kalman filter for each axis of a drifting position.
+
+    The state of every axis is its position and its drift velocity. Between
+    two measurements the velocity performs a random walk whose strength is
+    given by the acceleration noise, so slow changes of the drift rate are
+    followed while the noise of the single position measurements is averaged
+    out.
+    """
+
+    def __init__(self, measurement_noise=0.01, acceleration_noise=1e-6,
+                 initial_velocity=1e-3, dimensions=3):
+        """
+        @param float measurement_noise: standard deviation of a measured
+                                        position, e.g. the refocus precision
+        @param float acceleration_noise: square root of the spectral density of
+                                         the random changes of the velocity,
+                                         in units of position / s**1.5
+        @param float initial_velocity: standard deviation of the velocity
+                                       before the first measurements, in units
+                                       of position / s
+        @param int dimensions: number of axes
+        """
+        self.measurement_noise = measurement_noise
+        self.acceleration_noise = acceleration_noise
+        self.initial_velocity = initial_velocity
+        self.dimensions = dimensions
+        self.reset()
+
+    def reset(self):
+        """ Forget all measurements. """
+        self.time = None
+        self.updates = 0
+        self._state = np.zeros((self.dimensions, 2))
+        self._covariance = np.zeros((self.dimensions, 2, 2))
+
+    @property
+    def velocity(self):
+        """ Estimated drift velocity of each axis. """
+        return self._state[:, 1].copy()
+
+    def _propagate(self, dt):
+        """ State and covariance dt seconds after the last measurement. """
+        transition = np.array([[1, dt], [0, 1]])
+        q = self.acceleration_noise**2
+        process = q * np.array([[dt**3 / 3, dt**2 / 2], [dt**2 / 2, dt]])
+        state = self._state.dot(transition.T)
+        covariance = np.matmul(np.matmul(transition, self._covariance), transition.T) + process
+        return state, covariance
+
+    def update(self, t, position):
+        """ Add a measured position.
+
+        @param float t: time of the measurement in s
+        @param float[] position: the measured position of each axis
+        """
+        position = np.asarray(position, dtype=float)
+        r = self.measurement_noise**2
+        if self.time is None:
+            self._state[:, 0] = position
+            self._state[:, 1] = 0
+            self._covariance[:] = np.diag((r, self.initial_velocity**2))
+        else:
+            # measurements out of order are treated as simultaneous
+            state, covariance = self._propagate(max(t - self.time, 0))
+            innovation = position - state[:, 0]
+            innovation_variance = covariance[:, 0, 0] + r
+            gain = covariance[:, :, 0] / innovation_variance[:, np.newaxis]
+            self._state = state + gain * innovation[:, np.newaxis]
+            self._covariance = covariance - gain[:, :, np.newaxis] * covariance[:, np.newaxis, 0, :]
+        self.time = t if self.time is None else max(t, self.time)
+        self.updates += 1
+
+    def predict(self, t):
+        """ Predicted position at a given time.
+
+        @param float t: time of the prediction in s
+
+        @return tuple: the position of each axis and its standard deviation,
+                       None if nothing was measured yet
+        """
+        if self.time is None:
+            return None
+        state, covariance = self._propagate(max(t - self.time, 0))
+        return state[:, 0], np.sqrt(covariance[:, 0, 0])
+
+    def interval(self, tolerance, min_interval, max_interval, axes=None):
+        """ Time after the last measurement at which the uncertainty of the
+        predicted position reaches a tolerance.
+
+        @param float tolerance: the allowed standard deviation of the position
+        @param float min_interval: shortest interval returned in s
+        @param float max_interval: longest interval returned in s
+        @param list axes: indices of the axes to consider, default all
+
+        @return float: the interval in s
+        """
+        if self.time is None:
+            return min_interval
+        if axes is None:
+            axes = range(self.dimensions)
+        axes = list(axes)
+        intervals = np.geomspace(max(min_interval, 1e-3), max(max_interval, min_interval), 200)
+        within = [np.max(self.predict(self.time + dt)[1][axes]) <= tolerance
+                  for dt in intervals]
+        # the uncertainty only grows with time
+        return intervals[np.sum(within) - 1] if within[0] else min_interval
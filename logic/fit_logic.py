@@ -20,6 +20,8 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+import ast
+import functools
 import importlib
 from os import listdir
 from os.path import isfile, join
@@ -28,6 +30,52 @@ from logic.generic_logic import GenericLogic
 from core.util.mutex import Mutex
 
 
+def find_fit_methods(path):
+    """ Find the fit methods in the files of a directory without importing
+    them.
+
+    @param str path: directory of the files with the fit methods
+
+    @return dict: the name of the module of each function defined in the files
+    """
+    methods = dict()
+    for filename in sorted(listdir(path)):
+        if not isfile(join(path, filename)) or filename[-3:] != '.py':
+            continue
+        with open(join(path, filename), 'r') as source_file:
+            tree = ast.parse(source_file.read(), filename)
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef):
+                methods[node.name] = filename[:-3]
+    return methods
+
+
+def cached_model(make_model):
+    """ Wrap a make_<name>_model method, so that each model is built only
+    once for every combination of arguments.
+
+    The parameters are made anew for every call, since the callers change
+    their values.
+
+    @param function make_model: method returning a model and its parameters
+
+    @return function: the wrapped method
+    """
+    @functools.wraps(make_model)
+    def wrapper(self, *args, **kwargs):
+        key = (make_model.__name__, args, tuple(sorted(kwargs.items())))
+        try:
+            model = self._model_cache.get(key)
+        except TypeError:
+            # arguments which can not be hashed are not cached
+            return make_model(self, *args, **kwargs)
+        if model is None:
+            model = make_model(self, *args, **kwargs)[0]
+            self._model_cache[key] = model
+        return model, model.make_params()
+    return wrapper
+
+
 class FitLogic(GenericLogic):
     """
     UNSTABLE:Jochen Scheuer
@@ -40,77 +88,102 @@ class FitLogic(GenericLogic):
 
     For clarity reasons the fit function are imported from different files
     seperated by function type, e.g. gaussianlikemethods, sinemethods, generalmethods
+
+    The files are only searched for the names of their functions at first. A
+    file is imported when one of its methods is used for the first time and
+    all of its functions then become methods of FitLogic.
     """
     _modclass = 'fitlogic'
     _modtype = 'logic'
     # declare connectors
     _out = {'fitlogic': 'FitLogic'}
 
+    # module of each fit method, found once for all instances
+    _fit_method_modules = None
+    _loaded_fit_modules = set()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # locking for thread safety
         self.lock = Mutex()
 
-        filenames = []
-        # for path in directories:
-        path = join(self.get_main_dir(), 'logic', 'fitmethods')
-        for f in listdir(path):
-            if isfile(join(path, f)):
-                if f[-3:] == '.py':
-                    filenames.append(f[:-3])
+        self._model_cache = dict()
+
+        if FitLogic._fit_method_modules is None:
+            path = join(self.get_main_dir(), 'logic', 'fitmethods')
+            FitLogic._fit_method_modules = find_fit_methods(path)
 
         self.oneD_fit_methods = dict()
         self.twoD_fit_methods = dict()
 
-        for files in filenames:
-
-            mod = importlib.import_module('logic.fitmethods.{0}'.format(files))
-            for method in dir(mod):
-                try:
-                    if callable(getattr(mod, method)):
-                        # import methods in Fitlogic
-                        setattr(FitLogic, method, getattr(mod, method))
-                        # add method to dictionary and define what
-                        # estimators they have
-
-                        # check if it is a make_<own fuction>_fit method
-                        if (str(method).startswith('make_') and
-                                str(method).endswith('_fit')):
-                            # only add to dictionary if it is not already there
-                            if 'twoD' in str(method) and str(method).split('_')[1] not in self.twoD_fit_methods:
-                                self.twoD_fit_methods[str(method).split('_')[1]] = []
-                            elif str(method).split('_')[1] not in self.oneD_fit_methods:
-                                self.oneD_fit_methods[str(method)[5:-4]] = []
-                        # if there is an estimator add it to the dictionary
-                        if 'estimate' in str(method):
-                            if 'twoD' in str(method):
-                                try:  # if there is a given estimator it will be set or added
-                                    if str(method).split('_')[1] in self.twoD_fit_methods:
-                                        self.twoD_fit_methods[str(method).split('_')[1]] = self.twoD_fit_methods[
-                                            str(method).split('_')[1]].append(str(method).split('_')[2])
-                                    else:
-                                        self.twoD_fit_methods[str(method).split('_')[1]] = [str(method).split('_')[2]]
-                                except:  # if there is no estimator but only a standard one the estimator is empty
-                                    if not str(method).split('_')[1] in self.twoD_fit_methods:
-                                        self.twoD_fit_methods[str(method).split('_')[1]] = []
-                            else:  # this is oneD case
-                                try:  # if there is a given estimator it will be set or added
-                                    if (str(method).split('_')[1] in self.oneD_fit_methods and str(method).split('_')[
-                                        2] is not None):
-                                        self.oneD_fit_methods[str(method).split('_')[1]].append(
-                                            str(method).split('_')[2])
-                                    elif str(method).split('_')[2] is not None:
-                                        self.oneD_fit_methods[str(method).split('_')[1]] = [str(method).split('_')[2]]
-                                except:  # if there is no estimator but only a standard one the estimator is empty
-                                    if not str(method).split('_')[1] in self.oneD_fit_methods:
-                                        self.oneD_fit_methods[str(method).split('_')[1]] = []
-                except:
-                    self.log.error('It was not possible to import element {} '
-                            'into FitLogic.'.format(method))
+        for method in sorted(self._fit_method_modules):
+            # check if it is a make_<own fuction>_fit method
+            if method.startswith('make_') and method.endswith('_fit'):
+                # only add to dictionary if it is not already there
+                if 'twoD' in method and method.split('_')[1] not in self.twoD_fit_methods:
+                    self.twoD_fit_methods[method.split('_')[1]] = []
+                elif method.split('_')[1] not in self.oneD_fit_methods:
+                    self.oneD_fit_methods[method[5:-4]] = []
+            # if there is an estimator add it to the dictionary
+            if 'estimate' in method:
+                if 'twoD' in method:
+                    try:  # if there is a given estimator it will be set or added
+                        if method.split('_')[1] in self.twoD_fit_methods:
+                            self.twoD_fit_methods[method.split('_')[1]] = self.twoD_fit_methods[
+                                method.split('_')[1]].append(method.split('_')[2])
+                        else:
+                            self.twoD_fit_methods[method.split('_')[1]] = [method.split('_')[2]]
+                    except:  # if there is no estimator but only a standard one the estimator is empty
+                        if not method.split('_')[1] in self.twoD_fit_methods:
+                            self.twoD_fit_methods[method.split('_')[1]] = []
+                else:  # this is oneD case
+                    try:  # if there is a given estimator it will be set or added
+                        if method.split('_')[1] in self.oneD_fit_methods:
+                            self.oneD_fit_methods[method.split('_')[1]].append(method.split('_')[2])
+                        else:
+                            self.oneD_fit_methods[method.split('_')[1]] = [method.split('_')[2]]
+                    except:  # if there is no estimator but only a standard one the estimator is empty
+                        if not method.split('_')[1] in self.oneD_fit_methods:
+                            self.oneD_fit_methods[method.split('_')[1]] = []
         self.log.warning('Methods were included to FitLogic, but only if '
                 'naming is right: check the doxygen documentation '
                 'if you added a new method and it does not show.')
 
+    def __getattr__(self, name):
+        """ Import the file of a fit method when it is used for the first time.
+
+        All other names are looked up by Base, which also knows the events
+        and the state of the state machine.
+
+        @param str name: name of the method
+
+        @return: the method
+        """
+        modules = FitLogic._fit_method_modules
+        if modules is None or name not in modules or modules[name] in FitLogic._loaded_fit_modules:
+            return super().__getattr__(name)
+        self._load_fit_module(modules[name])
+        return getattr(self, name)
+
+    def _load_fit_module(self, module_name):
+        """ Import a file of logic/fitmethods and add its functions to FitLogic.
+
+        @param str module_name: name of the file without .py
+        """
+        with self.lock:
+            if module_name in FitLogic._loaded_fit_modules:
+                return
+            mod = importlib.import_module('logic.fitmethods.{0}'.format(module_name))
+            for method, module in self._fit_method_modules.items():
+                if module != module_name:
+                    continue
+                function = getattr(mod, method)
+                if method.startswith('make_') and method.endswith('_model'):
+                    function = cached_model(function)
+                # import methods in Fitlogic
+                setattr(FitLogic, method, function)
+            FitLogic._loaded_fit_modules.add(module_name)
+
     def on_activate(self, e):
         """ Initialisation performed during activation of the module.
 
@@ -228,6 +228,32 @@ class SpectrometerScannerInterfuse(Base, ConfocalScannerInterface):
 
         return count_data
 
+    def scan_line_with_return(self, line_path=None, return_path=None, start_path=None):
+        """ Moves along the start path, the line and the return path and returns
+        the counts on the line only.
+
+        @param float[][4] line_path: array of 4-part tuples defining the voltage points
+        @param float[][4] return_path: positions passed after the line
+        @param float[][4] start_path: positions passed before the line
+
+        @return float[]: the photon counts per second of the line pixels
+
+        There is no hardware task to be set up here, so the paths are simply
+        scanned one after the other.
+        """
+        if start_path is not None:
+            start_counts = self.scan_line(start_path)
+            if start_counts[0] == -1:
+                return start_counts
+        count_data = self.scan_line(line_path)
+        if count_data[0] == -1:
+            return count_data
+        if return_path is not None:
+            return_counts = self.scan_line(return_path)
+            if return_counts[0] == -1:
+                return return_counts
+        return count_data
+
     def close_scanner(self):
         """ Closes the scanner and cleans up afterwards.
 
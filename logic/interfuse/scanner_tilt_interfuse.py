@@ -195,6 +195,23 @@ class ScannerTiltInterfuse(GenericLogic, ConfocalScannerInterface):
             line_path[:][2] += self._calc_dz(line_path[:][0], line_path[:][1])
         return self._scanning_device.scan_line(line_path)
 
+    def scan_line_with_return(self, line_path=None, return_path=None, start_path=None):
+        """ Moves along the start path, the line and the return path in a single
+        scan and returns the counts on the line only.
+
+        @param float[][4] line_path: array of 4-part tuples defining the
+                                     positions of the pixels of the line
+        @param float[][4] return_path: positions passed after the line
+        @param float[][4] start_path: positions passed before the line
+
+        @return float[]: the photon counts per second of the line pixels
+        """
+        if self.tiltcorrection:
+            for path in (line_path, return_path, start_path):
+                if path is not None:
+                    path[:][2] += self._calc_dz(path[:][0], path[:][1])
+        return self._scanning_device.scan_line_with_return(line_path, return_path, start_path)
+
     def close_scanner(self):
         """ Closes the scanner and cleans up afterwards.
 
@@ -101,6 +101,11 @@ class PolarizationDependenceSim(Base, SlowCounterInterface, MotorInterface):
         count = raw_count * np.sin(angle) * np.sin(angle) + random.uniform(-0.1, 0.1)
         return count
 
+    def get_counter_channels(self):
+        """ Direct pass-through to the counter hardware module
+        """
+        return self._counter_hw.get_counter_channels()
+
     def close_counter(self):
         """ Direct pass-through to the counter hardware module
         """
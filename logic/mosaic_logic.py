@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains the Qudi logic which stitches confocal xy scans into a
+large map.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+from qtpy import QtCore
+from datetime import datetime
+import os
+
+from core.util.mutex import Mutex
+from logic.generic_logic import GenericLogic
+from logic.mosaic_store import MosaicStore
+
+
+class MosaicLogic(GenericLogic):
+    """ Combines confocal xy scans taken at different stage positions into a
+    mosaic, which is kept on disk in tiles of several resolutions.
+
+    Example config:
+
+    mosaiclogic:
+        module.Class: 'mosaic_logic.MosaicLogic'
+        pixel_size: 0.1     # in micrometer, the resolution of the mosaic
+        tile_size: 256      # pixels per tile side
+        levels: 8           # number of resolution levels
+        connect:
+            confocallogic1: 'scannerlogic.scannerlogic'
+            savelogic: 'savelogic.savelogic'
+    """
+    _modclass = 'MosaicLogic'
+    _modtype = 'logic'
+
+    # declare connectors
+    _in = {'confocallogic1': 'ConfocalLogic',
+           'savelogic': 'SaveLogic'
+           }
+    _out = {'mosaiclogic': 'MosaicLogic'}
+
+    sigMosaicUpdated = QtCore.Signal()
+
+    def __init__(self, config, **kwargs):
+        super().__init__(config=config, **kwargs)
+
+        self.log.info('The following configuration was found.')
+
+        # checking for the right configuration
+        for key in config.keys():
+            self.log.info('{0}: {1}'.format(key, config[key]))
+
+        if 'pixel_size' in config.keys():
+            self._pixel_size = config['pixel_size']
+        else:
+            self._pixel_size = 0.1
+            self.log.warning('No pixel_size configured, taking {0} micrometer '
+                             'instead.'.format(self._pixel_size))
+
+        if 'tile_size' in config.keys():
+            self._tile_size = config['tile_size']
+        else:
+            self._tile_size = 256
+
+        if 'levels' in config.keys():
+            self._levels = config['levels']
+        else:
+            self._levels = 8
+
+        # locking for thread safety
+        self.threadlock = Mutex()
+
+    def on_activate(self, e):
+        """ Initialisation performed during activation of the module.
+
+        @param object e: Event class object from Fysom.
+        """
+        self._scanning_logic = self.get_in_connector('confocallogic1')
+        self._save_logic = self.get_in_connector('savelogic')
+
+        # the mosaic grows over many sessions, so the last one is opened again
+        self.mosaic = None
+        if 'mosaic_directory' in self._statusVariables:
+            if MosaicStore.exists(self._statusVariables['mosaic_directory']):
+                self.mosaic = MosaicStore(self._statusVariables['mosaic_directory'])
+            else:
+                self.log.warning('The mosaic in {0} does not exist anymore, a new one is '
+                                 'created.'.format(self._statusVariables['mosaic_directory']))
+        if self.mosaic is None:
+            self.new_mosaic()
+
+    def on_deactivate(self, e):
+        """ Deinitialisation performed during deactivation of the module.
+
+        @param object e: Event class object from Fysom.
+        """
+        self._statusVariables['mosaic_directory'] = self.mosaic.directory
+
+    def new_mosaic(self, directory=None):
+        """ Start an empty mosaic.
+
+        @param str directory: directory of the new mosaic, a new directory in
+                              the data directory of today if None
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if directory is None:
+            directory = os.path.join(
+                self._save_logic.get_path_for_module(module_name='Mosaic'),
+                '{0}_mosaic'.format(datetime.now().strftime('%Y%m%d-%H%M-%S')))
+        with self.threadlock:
+            self.mosaic = MosaicStore(directory, pixel_size=self._pixel_size,
+                                      tile_size=self._tile_size, levels=self._levels)
+        self.sigMosaicUpdated.emit()
+        return 0
+
+    def add_xy_image(self, offset_x=0, offset_y=0):
+        """ Add the current xy scan of the confocal logic to the mosaic.
+
+        @param float offset_x: x position of the stage during the scan
+        @param float offset_y: y position of the stage during the scan
+
+        @return int: error code (0:OK, -1:error)
+        """
+        image = self._scanning_logic.xy_image
+        if image is None or len(image) < 2:
+            self.log.error('There is no xy scan to add to the mosaic.')
+            return -1
+        x_positions = image[0, :, 0]
+        y_positions = image[:, 0, 1]
+        with self.threadlock:
+            self.mosaic.add_image(image[:, :, 3], x_positions, y_positions,
+                                  offset=(offset_x, offset_y),
+                                  name='xy scan {0}'.format(len(self.mosaic.scans) + 1))
+        self.sigMosaicUpdated.emit()
+        return 0
+
+    def get_bounds(self):
+        """ Area covered by the mosaic.
+
+        @return list: x_min, x_max, y_min and y_max, None if the mosaic is empty
+        """
+        return self.mosaic.bounds
+
+    def get_view(self, x_range, y_range, max_pixels=1000):
+        """ Part of the mosaic in the resolution a view can show.
+
+        @param tuple x_range: minimum and maximum x of the view
+        @param tuple y_range: minimum and maximum y of the view
+        @param int max_pixels: pixels of the view along its longer side
+
+        @return tuple: image with shape (y, x), NaN where nothing was scanned,
+                       and its extent (x_min, x_max, y_min, y_max)
+        """
+        with self.threadlock:
+            return self.mosaic.get_view(x_range, y_range, max_pixels)
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains a tiled, multi-resolution store on disk, which stitches
+many scans into one large map.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+
+class MosaicStore:
+    """
+    Large map made of square tiles which are kept in files.
+
+    Level 0 has the full resolution, every pixel of a level above averages
+    2x2 pixels of the level below. Each tile holds the sum of all values which
+    fell onto its pixels and their number, so overlapping scans are averaged
+    and the levels stay exact weighted means of the full resolution.
+
+    A view of the map is assembled from the tiles of the coarsest level which
+    still has the requested resolution, so only a bounded number of pixels is
+    read for any view. Pixels which were never scanned are NaN.
+
+    The pixel at the grid index (i, j) of level 0 is centered at the position
+    (i * pixel_size, j * pixel_size), images have the shape (y, x).
+    """
+    _metadata_file = 'mosaic.json'
+
+    def __init__(self, directory, pixel_size=0.1, tile_size=256, levels=8, cache_size=256):
+        """
+        @param str directory: directory of the tile files, an existing mosaic
+                              in it is opened and keeps its own parameters
+        @param float pixel_size: pixel size of the full resolution
+        @param int tile_size: number of pixels along each side of a tile
+        @param int levels: number of resolution levels
+        @param int cache_size: number of tiles kept in memory
+        """
+        self.directory = directory
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+        metadata_path = os.path.join(directory, self._metadata_file)
+        if os.path.isfile(metadata_path):
+            with open(metadata_path, 'r') as metadata_file:
+                metadata = json.load(metadata_file)
+            self.pixel_size = metadata['pixel_size']
+            self.tile_size = metadata['tile_size']
+            self.levels = metadata['levels']
+            self.bounds = metadata['bounds']
+            self.scans = metadata['scans']
+        else:
+            self.pixel_size = float(pixel_size)
+            self.tile_size = int(tile_size)
+            self.levels = max(int(levels), 1)
+            # x_min, x_max, y_min, y_max of everything added, None if empty
+            self.bounds = None
+            self.scans = []
+            os.makedirs(directory, exist_ok=True)
+            self._save_metadata()
+
+    @classmethod
+    def exists(cls, directory):
+        """ True if the directory contains a mosaic. """
+        return os.path.isfile(os.path.join(directory, cls._metadata_file))
+
+    def _save_metadata(self):
+        metadata = {'pixel_size': self.pixel_size,
+                    'tile_size': self.tile_size,
+                    'levels': self.levels,
+                    'bounds': self.bounds,
+                    'scans': self.scans}
+        with open(os.path.join(self.directory, self._metadata_file), 'w') as metadata_file:
+            json.dump(metadata, metadata_file, indent=1)
+
+    def _tile_path(self, level, tile_x, tile_y):
+        return os.path.join(self.directory, 'level{0}'.format(level),
+                            '{0}_{1}.npy'.format(tile_y, tile_x))
+
+    def _load_tile(self, level, tile_x, tile_y):
+        """ Sum and number of values of a tile.
+
+        @return numpy.ndarray: array with shape (2, tile_size, tile_size),
+                               None if nothing was added to the tile yet
+        """
+        key = (level, tile_x, tile_y)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        path = self._tile_path(level, tile_x, tile_y)
+        tile = np.load(path) if os.path.isfile(path) else None
+        self._cache_tile(key, tile)
+        return tile
+
+    def _save_tile(self, level, tile_x, tile_y, tile):
+        path = self._tile_path(level, tile_x, tile_y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.save(path, tile)
+        self._cache_tile((level, tile_x, tile_y), tile)
+
+    def _cache_tile(self, key, tile):
+        self._cache[key] = tile
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def level_pixel_size(self, level):
+        """ Pixel size of a resolution level. """
+        return self.pixel_size * 2**level
+
+    def add_image(self, image, x_positions, y_positions, offset=(0, 0), name=''):
+        """ Stitch a scan into the mosaic.
+
+        The scan is interpolated onto the pixels of the full resolution which
+        lie inside of it and averaged with the scans already added there.
+
+        @param numpy.ndarray image: the values with shape (y, x)
+        @param numpy.ndarray x_positions: x position of each column
+        @param numpy.ndarray y_positions: y position of each row
+        @param tuple offset: x and y position of the origin of the scan in the
+                             mosaic, e.g. the stage position during the scan
+        @param str name: description of the scan kept in the metadata
+        """
+        image = np.asarray(image, dtype=float)
+        x_positions = np.asarray(x_positions, dtype=float) + offset[0]
+        y_positions = np.asarray(y_positions, dtype=float) + offset[1]
+        # np.interp needs increasing positions
+        if x_positions[0] > x_positions[-1]:
+            x_positions, image = x_positions[::-1], image[:, ::-1]
+        if y_positions[0] > y_positions[-1]:
+            y_positions, image = y_positions[::-1], image[::-1, :]
+
+        first_x = int(np.ceil(x_positions[0] / self.pixel_size - 1e-9))
+        last_x = int(np.floor(x_positions[-1] / self.pixel_size + 1e-9))
+        first_y = int(np.ceil(y_positions[0] / self.pixel_size - 1e-9))
+        last_y = int(np.floor(y_positions[-1] / self.pixel_size + 1e-9))
+        if last_x < first_x or last_y < first_y:
+            return
+        grid_x = np.arange(first_x, last_x + 1) * self.pixel_size
+        grid_y = np.arange(first_y, last_y + 1) * self.pixel_size
+        rows = np.array([np.interp(grid_x, x_positions, row) for row in image])
+        values = np.array([np.interp(grid_y, y_positions, column) for column in rows.T]).T
+
+        size = self.tile_size
+        changed = set()
+        for tile_y in range(first_y // size, last_y // size + 1):
+            for tile_x in range(first_x // size, last_x // size + 1):
+                # part of the tile covered by the scan in grid indices
+                x0, x1 = max(first_x, tile_x * size), min(last_x + 1, (tile_x + 1) * size)
+                y0, y1 = max(first_y, tile_y * size), min(last_y + 1, (tile_y + 1) * size)
+                tile = self._load_tile(0, tile_x, tile_y)
+                tile = np.zeros((2, size, size)) if tile is None else tile.copy()
+                part = values[y0 - first_y:y1 - first_y, x0 - first_x:x1 - first_x]
+                valid = np.isfinite(part)
+                target = (slice(y0 - tile_y * size, y1 - tile_y * size),
+                          slice(x0 - tile_x * size, x1 - tile_x * size))
+                tile[0][target] += np.where(valid, part, 0)
+                tile[1][target] += valid
+                self._save_tile(0, tile_x, tile_y, tile)
+                changed.add((tile_x, tile_y))
+
+        for level in range(1, self.levels):
+            changed = {(tile_x // 2, tile_y // 2) for tile_x, tile_y in changed}
+            for tile_x, tile_y in changed:
+                self._update_tile(level, tile_x, tile_y)
+
+        bounds = [grid_x[0], grid_x[-1], grid_y[0], grid_y[-1]]
+        if self.bounds is not None:
+            bounds = [min(bounds[0], self.bounds[0]), max(bounds[1], self.bounds[1]),
+                      min(bounds[2], self.bounds[2]), max(bounds[3], self.bounds[3])]
+        self.bounds = [float(value) for value in bounds]
+        self.scans.append({'name': name,
+                           'offset': [float(offset[0]), float(offset[1])],
+                           'x_range': [float(x_positions[0]), float(x_positions[-1])],
+                           'y_range': [float(y_positions[0]), float(y_positions[-1])]})
+        self._save_metadata()
+
+    def _update_tile(self, level, tile_x, tile_y):
+        """ Combine the four tiles of the level below into one tile. """
+        half = self.tile_size // 2
+        tile = np.zeros((2, self.tile_size, self.tile_size))
+        for quarter_y in range(2):
+            for quarter_x in range(2):
+                child = self._load_tile(level - 1, 2 * tile_x + quarter_x, 2 * tile_y + quarter_y)
+                if child is None:
+                    continue
+                binned = child.reshape(2, half, 2, half, 2).sum(axis=(2, 4))
+                tile[:, quarter_y * half:(quarter_y + 1) * half,
+                     quarter_x * half:(quarter_x + 1) * half] = binned
+        self._save_tile(level, tile_x, tile_y, tile)
+
+    def get_level(self, x_range, y_range, max_pixels):
+        """ Coarsest level which shows a view with at least max_pixels.
+
+        @param tuple x_range: minimum and maximum x of the view
+        @param tuple y_range: minimum and maximum y of the view
+        @param int max_pixels: pixels of the view along its longer side
+
+        @return int: the level
+        """
+        extent = max(x_range[1] - x_range[0], y_range[1] - y_range[0])
+        level = 0
+        while (level < self.levels - 1
+               and extent / self.level_pixel_size(level + 1) >= max(int(max_pixels), 1)):
+            level += 1
+        return level
+
+    def get_view(self, x_range, y_range, max_pixels=1000, level=None):
+        """ Part of the mosaic in the resolution needed for a view.
+
+        @param tuple x_range: minimum and maximum x of the view
+        @param tuple y_range: minimum and maximum y of the view
+        @param int max_pixels: number of pixels of the view along its longer
+                               side, e.g. the width of the plot in pixels
+        @param int level: use this level instead of the one matching max_pixels
+
+        @return tuple: image with shape (y, x), NaN where nothing was scanned,
+                       and its extent (x_min, x_max, y_min, y_max) given by the
+                       outer edges of the pixels
+        """
+        if level is None:
+            level = self.get_level(x_range, y_range, max_pixels)
+        pixel_size = self.level_pixel_size(level)
+        # level pixels are centered at ((i + 0.5) * 2**level - 0.5) * pixel_size
+        shift = (2**level - 1) / 2 * self.pixel_size
+        first_x = int(np.floor((x_range[0] - shift) / pixel_size))
+        last_x = int(np.ceil((x_range[1] - shift) / pixel_size))
+        first_y = int(np.floor((y_range[0] - shift) / pixel_size))
+        last_y = int(np.ceil((y_range[1] - shift) / pixel_size))
+
+        size = self.tile_size
+        view = np.full((last_y - first_y + 1, last_x - first_x + 1), np.nan)
+        for tile_y in range(first_y // size, last_y // size + 1):
+            for tile_x in range(first_x // size, last_x // size + 1):
+                tile = self._load_tile(level, tile_x, tile_y)
+                if tile is None:
+                    continue
+                x0, x1 = max(first_x, tile_x * size), min(last_x + 1, (tile_x + 1) * size)
+                y0, y1 = max(first_y, tile_y * size), min(last_y + 1, (tile_y + 1) * size)
+                source = (slice(y0 - tile_y * size, y1 - tile_y * size),
+                          slice(x0 - tile_x * size, x1 - tile_x * size))
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    part = tile[0][source] / tile[1][source]
+                view[y0 - first_y:y1 - first_y, x0 - first_x:x1 - first_x] = part
+
+        extent = ((first_x - 0.5) * pixel_size + shift, (last_x + 0.5) * pixel_size + shift,
+                  (first_y - 0.5) * pixel_size + shift, (last_y + 0.5) * pixel_size + shift)
+        return view, extent
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains an append-only store on disk for the single lines of long
+ODMR measurements.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+class OdmrLineStore:
+    """
+    History of all ODMR lines in chunks of a fixed number of lines.
+
+    Only the chunk which is filled at the moment is kept in memory. A full
+    chunk is written to its own .npy file and never touched again, so the
+    memory needed does not grow with the duration of the measurement and
+    writing a line does not get slower. The lines of the current chunk are
+    written to disk on flush.
+    """
+    _metadata_file = 'lines.json'
+
+    def __init__(self, directory, frequencies=None, chunk_lines=256, dtype=np.float32):
+        """
+        @param str directory: directory of the chunk files, lines are appended
+                              to an existing store in it
+        @param numpy.ndarray frequencies: frequency of each point of a line
+        @param int chunk_lines: number of lines in each file
+        @param dtype: numpy data type of the counts in the files
+        """
+        self.directory = directory
+        metadata_path = os.path.join(directory, self._metadata_file)
+        if os.path.isfile(metadata_path):
+            with open(metadata_path, 'r') as metadata_file:
+                metadata = json.load(metadata_file)
+            self.frequencies = np.array(metadata['frequencies'])
+            self.chunk_lines = metadata['chunk_lines']
+            self.lines = metadata['lines']
+            self.dtype = np.dtype(metadata['dtype'])
+            chunks, in_chunk = divmod(self.lines, self.chunk_lines)
+            self._chunk = np.zeros((self.chunk_lines, len(self.frequencies)), dtype=self.dtype)
+            if in_chunk > 0:
+                self._chunk[:in_chunk] = np.load(self._chunk_path(chunks))
+        else:
+            self.frequencies = np.asarray(frequencies, dtype=float)
+            self.chunk_lines = int(chunk_lines)
+            self.lines = 0
+            self.dtype = np.dtype(dtype)
+            self._chunk = np.zeros((self.chunk_lines, len(self.frequencies)), dtype=self.dtype)
+            os.makedirs(directory, exist_ok=True)
+            self._save_metadata()
+
+    @classmethod
+    def exists(cls, directory):
+        """ True if the directory contains a line store. """
+        return os.path.isfile(os.path.join(directory, cls._metadata_file))
+
+    def __len__(self):
+        return self.lines
+
+    def _chunk_path(self, index):
+        return os.path.join(self.directory, 'chunk_{0:06d}.npy'.format(index))
+
+    def _save_metadata(self):
+        metadata = {'frequencies': self.frequencies.tolist(),
+                    'chunk_lines': self.chunk_lines,
+                    'lines': self.lines,
+                    'dtype': self.dtype.str}
+        path = os.path.join(self.directory, self._metadata_file)
+        with open(path + '.tmp', 'w') as metadata_file:
+            json.dump(metadata, metadata_file)
+        os.replace(path + '.tmp', path)
+
+    def append(self, line):
+        """ Add a line at the end of the history.
+
+        @param numpy.ndarray line: counts of each frequency
+        """
+        chunk, in_chunk = divmod(self.lines, self.chunk_lines)
+        self._chunk[in_chunk] = line
+        self.lines += 1
+        if in_chunk + 1 == self.chunk_lines:
+            np.save(self._chunk_path(chunk), self._chunk)
+            self._save_metadata()
+
+    def flush(self):
+        """ Write the lines of the chunk which is not full yet to disk. """
+        chunk, in_chunk = divmod(self.lines, self.chunk_lines)
+        if in_chunk > 0:
+            np.save(self._chunk_path(chunk), self._chunk[:in_chunk])
+        self._save_metadata()
+
+    def read(self, start=0, stop=None):
+        """ Lines of the history.
+
+        @param int start: index of the first line
+        @param int stop: index after the last line, default the end
+
+        @return numpy.ndarray: lines with the shape (lines, frequencies)
+        """
+        stop = self.lines if stop is None else min(stop, self.lines)
+        start = max(start, 0)
+        if stop <= start:
+            return np.zeros((0, len(self.frequencies)), dtype=self.dtype)
+        parts = []
+        full_chunks = self.lines // self.chunk_lines
+        for chunk in range(start // self.chunk_lines, (stop - 1) // self.chunk_lines + 1):
+            if chunk < full_chunks:
+                data = np.load(self._chunk_path(chunk), mmap_mode='r')
+            else:
+                data = self._chunk
+            first = max(start - chunk * self.chunk_lines, 0)
+            last = min(stop - chunk * self.chunk_lines, self.chunk_lines)
+            parts.append(np.array(data[first:last]))
+        return np.concatenate(parts)
@@ -25,15 +25,85 @@ from collections import OrderedDict
 from interface.microwave_interface import MicrowaveMode
 from interface.microwave_interface import TriggerEdge
 import numpy as np
+import os
 import time
 import datetime
 import matplotlib.pyplot as plt
 import lmfit
 
 from logic.generic_logic import GenericLogic
+from logic.odmr_line_store import OdmrLineStore
 from core.util.mutex import Mutex
 
 
+class ODMRFitWorker(QtCore.QObject):
+
+    """ Helper class which fits the averaged ODMR spectrum in a separate
+    thread, so a running measurement never waits for a fit.
+    """
+    sigFitFinished = QtCore.Signal(int, object)
+
+    def __init__(self, parentclass):
+        super().__init__()
+
+        # remember the reference to the parent class to access the fit functions
+        self._parentclass = parentclass
+
+    def fit(self, generation, fit_function, x_data, y_data, params, elapsed_time):
+        """ Fit a copy of the averaged spectrum.
+
+        The fit starts from the given parameters, the result of the previous
+        fit, which converges in a few steps since the average changes slowly.
+        Without parameters, or if the warm start gives no plausible result,
+        the fit starts from the estimate of the fit logic.
+
+        @param int generation: number of the averaged spectrum, the logic
+                               ignores fits of a spectrum which was cleared
+        @param str fit_function: name of the fit function
+        @param numpy.ndarray x_data: frequencies
+        @param numpy.ndarray y_data: averaged counts
+        @param lmfit.Parameters params: start parameters, None for an estimate
+        @param float elapsed_time: measurement time of the spectrum in s
+        """
+        logic = self._parentclass
+        fit = {'fit_function': fit_function,
+               'result': None,
+               'elapsed_time': elapsed_time,
+               'warm_start': False}
+        # the logic waits for an answer before it requests the next fit, so
+        # there is always one, also if the fit fails
+        try:
+            result = None
+            if params is not None:
+                try:
+                    result = logic._run_fit(fit_function, x_data, y_data, params=params)
+                except Exception:
+                    result = None
+                if result is not None and not self._is_plausible(result, x_data):
+                    result = None
+                fit['warm_start'] = result is not None
+            if result is None:
+                result = logic._run_fit(fit_function, x_data, y_data)
+            fit['param_dict'] = logic._get_fit_param_dict(fit_function, result)
+            fit['fit_x'] = np.linspace(np.min(x_data), np.max(x_data), 10 * len(x_data))
+            fit['fit_y'] = logic.fit_models[fit_function][0].eval(x=fit['fit_x'],
+                                                                  params=result.params)
+            fit['result'] = result
+        except Exception as e:
+            logic.log.warning('The background fit failed: {0}'.format(e))
+        self.sigFitFinished.emit(generation, fit)
+
+    @staticmethod
+    def _is_plausible(result, x_data):
+        """ A warm start has to converge with all centers inside of the data. """
+        if not result.success:
+            return False
+        for name, param in result.params.items():
+            if name.endswith('center') and not np.min(x_data) <= param.value <= np.max(x_data):
+                return False
+        return True
+
+
 class ODMRLogic(GenericLogic):
 
     """This is the Logic class for ODMR."""
@@ -59,6 +129,8 @@ class ODMRLogic(GenericLogic):
     sigODMRMatrixAxesChanged = QtCore.Signal()
     sigMicrowaveCWModeChanged = QtCore.Signal(bool)
     sigMicrowaveListModeChanged = QtCore.Signal(bool)
+    sigBackgroundFitRequested = QtCore.Signal(int, str, object, object, object, float)
+    sigBackgroundFitUpdated = QtCore.Signal()
 
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
@@ -71,9 +143,26 @@ class ODMRLogic(GenericLogic):
 
         # number of lines in the matrix plot
         self.number_of_lines = 50
+        # the lines of the matrix plot are kept in a ring, the row of the
+        # newest line moves on with every line
+        self._odmr_matrix = np.zeros((self.number_of_lines, 0))
+        self._odmr_matrix_row = 0
+        # all lines of a measurement are kept on disk if saveRawData is set
+        self._raw_data_store = None
+        self._raw_samples_store = None
+        self.raw_data_directory = None
         self.threadlock = Mutex()
         self.stopRequested = False
         self._clear_odmr_plots = False
+        # The background fit follows the averaged spectrum while the
+        # measurement runs. The generation is counted up whenever the average
+        # starts anew, so a fit of an old average is not shown.
+        self._background_fit_busy = False
+        self._background_fit_generation = 0
+        self._background_fit_start = 0
+        self._background_fit_function = None
+        self._background_fit_result = None
+        self.background_fit_history = []
 
     def on_activate(self, e):
         """ Initialisation performed during activation of the module.
@@ -144,6 +233,28 @@ class ODMRLogic(GenericLogic):
 
         self.saveRawData = False  # flag for saving raw data
 
+        # In the adaptive sampling mode the frequency list of each sweep puts
+        # more points on the slopes of the resonances, found from the fit or
+        # the data of the previous sweeps. A frequency may appear several
+        # times in the list, which lengthens its dwell time. The list keeps
+        # the length of the uniform grid, of which adaptive_uniform_fraction
+        # is spread evenly to keep following the baseline.
+        self.adaptive_sampling = False
+        self.adaptive_uniform_fraction = 0.25
+
+        # Further frequency windows [start, stop, step] which are measured in
+        # the same list as the window mw_start ... mw_stop, e.g. around a
+        # second resonance, without sweeping the gap in between. Every window
+        # gets its own trace and fit.
+        self.mw_windows = []
+        self.window_fits = dict()
+
+        # The background fit refits the averaged spectrum of a running
+        # measurement in its own thread, at most once per
+        # background_fit_interval, with the fit function selected in the GUI.
+        self.background_fit = False
+        self.background_fit_interval = 2.0
+
         # load parameters stored in app state store
         if 'clock_frequency' in self._statusVariables:
             self._clock_frequency = self._statusVariables['clock_frequency']
@@ -162,12 +273,30 @@ class ODMRLogic(GenericLogic):
             self.run_time = self._statusVariables['run_time']
         if 'saveRawData' in self._statusVariables:
             self.saveRawData = self._statusVariables['saveRawData']
+        if 'adaptive_sampling' in self._statusVariables:
+            self.adaptive_sampling = self._statusVariables['adaptive_sampling']
+        if 'mw_windows' in self._statusVariables:
+            self.mw_windows = self._statusVariables['mw_windows']
+        if 'background_fit' in self._statusVariables:
+            self.background_fit = self._statusVariables['background_fit']
+        if 'background_fit_interval' in self._statusVariables:
+            self.background_fit_interval = self._statusVariables['background_fit_interval']
 
         self.sigNextLine.connect(self._scan_ODMR_line, QtCore.Qt.QueuedConnection)
 
+        # create an independent thread for the background fit
+        self._fit_thread = QtCore.QThread()
+        self._fit_worker = ODMRFitWorker(self)
+        self._fit_worker.moveToThread(self._fit_thread)
+        self.sigBackgroundFitRequested.connect(self._fit_worker.fit, QtCore.Qt.QueuedConnection)
+        self._fit_worker.sigFitFinished.connect(self._background_fit_finished,
+                                                QtCore.Qt.QueuedConnection)
+        self._fit_thread.start()
+
         # Initalize the ODMR plot and matrix image
-        self._mw_frequency_list = np.arange(self.mw_start, self.mw_stop + self.mw_step, self.mw_step)
+        self._set_up_frequency_list()
         self.ODMR_fit_x = np.arange(self.mw_start, self.mw_stop + self.mw_step, self.mw_step / 10.)
+        self._sweep_indices = np.arange(len(self._mw_frequency_list))
         self._initialize_ODMR_plot()
         self._initialize_ODMR_matrix()
 
@@ -192,6 +321,14 @@ class ODMRLogic(GenericLogic):
         self._statusVariables['mw_step'] = self.mw_step
         self._statusVariables['run_time'] = self.run_time
         self._statusVariables['saveRawData'] = self.saveRawData
+        self._statusVariables['adaptive_sampling'] = self.adaptive_sampling
+        self._statusVariables['mw_windows'] = self.mw_windows
+        self._statusVariables['background_fit'] = self.background_fit
+        self._statusVariables['background_fit_interval'] = self.background_fit_interval
+
+        self.sigBackgroundFitRequested.disconnect()
+        self._fit_thread.quit()
+        self._fit_thread.wait()
 
     def set_clock_frequency(self, clock_frequency):
         """Sets the frequency of the clock
@@ -231,6 +368,61 @@ class ODMRLogic(GenericLogic):
         self._odmr_counter.close_odmr_clock()
         return 0
 
+    def get_frequency_windows(self):
+        """ All frequency windows of an ODMR scan.
+
+        @return list: [start, stop, step] of each window, the first one is
+                      mw_start ... mw_stop
+        """
+        return [[self.mw_start, self.mw_stop, self.mw_step]] + [list(window) for window in self.mw_windows]
+
+    def _set_up_frequency_list(self):
+        """ Combine the frequency windows into one list.
+
+        The windows are sorted by their start frequency and the points of a
+        window which overlap with the previous one are left out, so the list
+        is increasing as the fit estimators need it. The position of each
+        window in the list is kept in window_slices.
+        """
+        windows = self.get_frequency_windows()
+        if len(windows) > 1 and self.scanmode != MicrowaveMode.LIST:
+            self.log.warning('Several frequency windows need the list mode of the '
+                             'microwave source, only {0} to {1} Hz is scanned.'.format(
+                                 self.mw_start, self.mw_stop))
+            windows = windows[:1]
+
+        parts = []
+        self.window_slices = []
+        points = 0
+        for start, stop, step in sorted(windows):
+            start = self.limits.frequency_in_range(start)
+            stop = self.limits.frequency_in_range(stop)
+            if self.scanmode == MicrowaveMode.SWEEP:
+                step = self.limits.sweep_step_in_range(step)
+            else:
+                step = self.limits.list_step_in_range(step)
+            frequencies = np.arange(start, stop + step, step)
+            if points > 0:
+                frequencies = frequencies[frequencies > parts[-1][-1]]
+            if len(frequencies) == 0:
+                self.log.warning('The frequency window {0} to {1} Hz lies within '
+                                 'another window and is left out.'.format(start, stop))
+                continue
+            parts.append(frequencies)
+            self.window_slices.append(slice(points, points + len(frequencies)))
+            points += len(frequencies)
+        self._mw_frequency_list = np.concatenate(parts)
+
+    def get_window_data(self, window):
+        """ Frequencies and averaged counts of a single frequency window.
+
+        @param int window: index of the window in window_slices
+
+        @return tuple: (frequencies, counts)
+        """
+        part = self.window_slices[window]
+        return self._mw_frequency_list[part], self.ODMR_plot_y[part]
+
     def start_odmr_scan(self):
         """ Starting an ODMR scan. """
         self._clear_odmr_plots = False
@@ -246,24 +438,41 @@ class ODMRLogic(GenericLogic):
         elif self.scanmode == MicrowaveMode.LIST:
             self.mw_step = self.limits.list_step_in_range(self.mw_step)
 
-        self._mw_frequency_list = np.arange(self.mw_start, self.mw_stop + self.mw_step, self.mw_step)
+        self._set_up_frequency_list()
 
-        self.ODMR_fit_x = np.arange(self.mw_start, self.mw_stop + self.mw_step, self.mw_step / 10.)
+        self.ODMR_fit_x = np.arange(self._mw_frequency_list[0],
+                                    self._mw_frequency_list[-1] + self.mw_step,
+                                    self.mw_step / 10.)
         self._fit_param = dict()
         self._fit_result = None
+        self.window_fits = dict()
+        self._reset_background_fit()
+        self.background_fit_history = []
+
+        if self.adaptive_sampling and self.scanmode != MicrowaveMode.LIST:
+            self.log.warning('Adaptive sampling needs the list mode of the microwave '
+                             'source, the frequencies are sampled uniformly.')
+        # the grid positions of the first sweep are uniform
+        self._sweep_indices = np.arange(len(self._mw_frequency_list))
 
         if self.saveRawData:
-            # All that is necesarry fo saving of raw data:
-            # length of req list
-            self._mw_frequency_list_length = int(self._mw_frequency_list.shape[0])
-            # time for one line
-            self._ODMR_line_time = self._mw_frequency_list_length / self._clock_frequency
-            # amout of lines done during run_time
-            self._ODMR_line_count = self.run_time / self._ODMR_line_time
-            # list used to store the raw data, is saved in seperate file for post prossesing initiallized with -1
-            self.ODMR_raw_data = np.full((self._mw_frequency_list_length, self._ODMR_line_count), -1)
-            self.log.info('Raw data saving...')
+            # every line is appended to a store on disk, so the memory needed
+            # does not grow with the duration of the measurement
+            self.raw_data_directory = os.path.join(
+                self._save_logic.get_path_for_module(module_name='ODMR'),
+                '{0}_ODMR_data_raw'.format(datetime.datetime.now().strftime('%Y%m%d-%H%M-%S')))
+            self._raw_data_store = OdmrLineStore(self.raw_data_directory, self._mw_frequency_list)
+            if self.adaptive_sampling and self.scanmode == MicrowaveMode.LIST:
+                # number of samples behind each value of the raw lines
+                self._raw_samples_store = OdmrLineStore(
+                    os.path.join(self.raw_data_directory, 'samples'),
+                    self._mw_frequency_list, dtype=np.uint16)
+            else:
+                self._raw_samples_store = None
+            self.log.info('Raw data saving to {0}'.format(self.raw_data_directory))
         else:
+            self._raw_data_store = None
+            self._raw_samples_store = None
             self.log.info('Raw data NOT saved.')
 
         odmr_status = self.start_odmr()
@@ -317,7 +526,8 @@ class ODMRLogic(GenericLogic):
             n = self._mw_device.set_sweep(self.mw_start, self.mw_stop, self.mw_step, self.mw_power)
             return_val = n - len(self._mw_frequency_list)
         elif self.scanmode == MicrowaveMode.LIST:
-            return_val = self._mw_device.set_list(self._mw_frequency_list, self.mw_power)
+            return_val = self._mw_device.set_list(
+                self._mw_frequency_list[self._sweep_indices], self.mw_power)
 
         if return_val != 0:
             self.stopRequested = True
@@ -345,12 +555,78 @@ class ODMRLogic(GenericLogic):
         self.ODMR_plot_x = self._mw_frequency_list
         self.ODMR_plot_y = np.zeros(self._mw_frequency_list.shape)
         self.ODMR_fit_y = np.zeros(self.ODMR_fit_x.shape)
+        # sum of all counts and number of samples of each frequency, the
+        # average is their ratio
+        self._odmr_sum = np.zeros(self._mw_frequency_list.shape)
+        self._odmr_samples = np.zeros(self._mw_frequency_list.shape)
 
     def _initialize_ODMR_matrix(self):
         """ Initializing the ODMR matrix plot. """
-        self.ODMR_plot_xy = np.zeros((self.number_of_lines, len(self._mw_frequency_list)))
+        self._odmr_matrix = np.zeros((self.number_of_lines, len(self._mw_frequency_list)))
+        self._odmr_matrix_row = 0
         self.sigODMRMatrixAxesChanged.emit()
 
+    @property
+    def ODMR_plot_xy(self):
+        """ The lines of the matrix plot with the newest line in the first row.
+
+        @return numpy.ndarray: copy of the lines with the shape
+                               (number_of_lines, frequencies)
+        """
+        rows = self._odmr_matrix.shape[0]
+        return self._odmr_matrix[(self._odmr_matrix_row - np.arange(rows)) % rows]
+
+    @property
+    def ODMR_raw_data(self):
+        """ All lines of the measurement read from disk, only available if
+        saveRawData was set at the start of the measurement.
+
+        Frequencies which were not sampled in a sweep of the adaptive sampling
+        are NaN, see ODMR_raw_samples.
+
+        @return numpy.ndarray: the counts with the shape (frequencies, lines)
+        """
+        if self._raw_data_store is None:
+            return np.zeros((len(self._mw_frequency_list), 0))
+        return self._raw_data_store.read().T
+
+    @property
+    def ODMR_raw_samples(self):
+        """ Number of samples averaged in each value of ODMR_raw_data.
+
+        @return numpy.ndarray: the numbers with the shape (frequencies, lines)
+        """
+        if self._raw_samples_store is None:
+            return np.ones(self.ODMR_raw_data.shape, dtype=int)
+        return self._raw_samples_store.read().T
+
+    def _flush_raw_data(self):
+        """ Write the lines of the raw data which are not on disk yet. """
+        if self._raw_data_store is not None:
+            self._raw_data_store.flush()
+        if self._raw_samples_store is not None:
+            self._raw_samples_store.flush()
+
+    def _add_ODMR_matrix_line(self, new_counts):
+        """ Put a new line into the ring of the matrix plot.
+
+        @param numpy.ndarray new_counts: counts of the new line
+
+        @return bool: True if the number of lines of the matrix changed
+        """
+        rows = self._odmr_matrix.shape[0]
+        resized = rows != self.number_of_lines
+        if resized:
+            # keep the newest lines which still fit into the matrix
+            ordered = self.ODMR_plot_xy
+            kept = min(rows, self.number_of_lines)
+            self._odmr_matrix = np.zeros((self.number_of_lines, ordered.shape[1]))
+            self._odmr_matrix[-np.arange(kept) % self.number_of_lines] = ordered[:kept]
+            self._odmr_matrix_row = 0
+        self._odmr_matrix_row = (self._odmr_matrix_row + 1) % self.number_of_lines
+        self._odmr_matrix[self._odmr_matrix_row] = new_counts
+        return resized
+
     def clear_odmr_plots(self):
         """¨Set the option to clear the curret ODMR plot.
 
@@ -367,6 +643,7 @@ class ODMRLogic(GenericLogic):
             with self.threadlock:
                 self.MW_off()
                 self.kill_odmr()
+                self._flush_raw_data()
                 self.stopRequested = False
                 self.unlock()
                 self.sigOdmrPlotUpdated.emit()
@@ -382,7 +659,8 @@ class ODMRLogic(GenericLogic):
             self._mw_device.reset_sweep()
         elif self.scanmode == MicrowaveMode.LIST:
             self._mw_device.reset_listpos()
-        new_counts = self._odmr_counter.count_odmr(length=len(self._mw_frequency_list))
+        sweep_indices = self._sweep_indices
+        new_counts = self._odmr_counter.count_odmr(length=len(sweep_indices))
         if new_counts[0] == -1:
             self.stopRequested = True
             self.sigNextLine.emit()
@@ -393,45 +671,49 @@ class ODMRLogic(GenericLogic):
             self._odmrscan_counter = 0
             self._initialize_ODMR_plot()
             self._initialize_ODMR_matrix()
+            self._reset_background_fit()
             self._clear_odmr_plots = False
 
-        self.ODMR_plot_y = (self._odmrscan_counter * self.ODMR_plot_y + new_counts) / (self._odmrscan_counter + 1)
-
-        # React on the case, when the number of matrix lines have changed during
-        # the scan. Essentially, there are three cases which can happen:
-        curr_num_lines = np.shape(self.ODMR_plot_xy)[0]
-        if curr_num_lines > self.number_of_lines:
-
-            self.ODMR_plot_xy = np.vstack((new_counts, self.ODMR_plot_xy[:self.number_of_lines - 1, :]))
-
-            # It is very necessary that the matrix will be updated BEFORE the
-            # axes are adjusted, otherwise, there the display will not fit with
-            # the data!
-            self.sigOdmrMatrixUpdated.emit()
-            self.sigODMRMatrixAxesChanged.emit()
-
-        elif np.shape(self.ODMR_plot_xy)[0] < self.number_of_lines:
-            new_matrix = np.zeros((self.number_of_lines, len(self._mw_frequency_list)))
-            new_matrix[1:curr_num_lines + 1, :] = self.ODMR_plot_xy
-            new_matrix[0, :] = new_counts
-            self.ODMR_plot_xy = new_matrix
-
-            # It is very necessary that the matrix will be updated BEFORE the
-            # axes are adjusted, otherwise, there the display will not fit with
-            # the data!
-            self.sigOdmrMatrixUpdated.emit()
+        # average of all samples of each frequency since the start or the last
+        # clearing, the line is put onto the grid of the frequencies
+        line_sum = np.bincount(sweep_indices, weights=new_counts,
+                               minlength=len(self._mw_frequency_list))
+        line_samples = np.bincount(sweep_indices, minlength=len(self._mw_frequency_list))
+        self._odmr_sum += line_sum
+        self._odmr_samples += line_samples
+        sampled = self._odmr_samples > 0
+        np.divide(self._odmr_sum, self._odmr_samples, out=self.ODMR_plot_y, where=sampled)
+        if not np.all(sampled):
+            # only possible with adaptive sampling after clearing the plots
+            self.ODMR_plot_y[~sampled] = np.interp(self._mw_frequency_list[~sampled],
+                                                   self._mw_frequency_list[sampled],
+                                                   self.ODMR_plot_y[sampled])
+        # frequencies left out in this sweep are NaN in the matrix and the raw
+        # data, only the averaged spectrum fills them in
+        new_counts = np.full(len(self._mw_frequency_list), np.nan)
+        np.divide(line_sum, line_samples, out=new_counts, where=line_samples > 0)
+
+        # The number of matrix lines may have changed during the scan.
+        # It is very necessary that the matrix will be updated BEFORE the
+        # axes are adjusted, otherwise, there the display will not fit with
+        # the data!
+        matrix_resized = self._add_ODMR_matrix_line(new_counts)
+        self.sigOdmrMatrixUpdated.emit()
+        if matrix_resized:
             self.sigODMRMatrixAxesChanged.emit()
 
-        else:
-            self.ODMR_plot_xy = np.vstack((new_counts, self.ODMR_plot_xy[:-1, :]))
-            self.sigOdmrMatrixUpdated.emit()
-
-        if self.saveRawData:
-            self.ODMR_raw_data[:, self._odmrscan_counter] = new_counts  # adds the ne odmr line to the overall np.array
+        if self._raw_data_store is not None:
+            self._raw_data_store.append(new_counts)
+        if self._raw_samples_store is not None:
+            self._raw_samples_store.append(line_samples)
 
         self._odmrscan_counter += 1
+        if self.adaptive_sampling and self.scanmode == MicrowaveMode.LIST:
+            self._update_adaptive_list()
         self.elapsed_time = time.time() - self._startTime
         self.sigOdmrElapsedTimeChanged.emit()
+        if self.background_fit:
+            self._request_background_fit()
         if self.elapsed_time >= self.run_time:
             self.stopRequested = True
             self.sigOdmrFinished.emit()
@@ -439,6 +721,99 @@ class ODMRLogic(GenericLogic):
         self.sigOdmrPlotUpdated.emit()
         self.sigNextLine.emit()
 
+    def _reset_background_fit(self):
+        """ Start the background fit anew for a new average. """
+        self._background_fit_generation += 1
+        self._background_fit_function = None
+        self._background_fit_result = None
+
+    def _request_background_fit(self):
+        """ Hand a copy of the averaged spectrum to the fit worker.
+
+        Only one fit is in the worker at a time and the next one starts
+        background_fit_interval after the previous one at the earliest, so the
+        fits never pile up. The sweep only pays for the copy of the spectrum.
+        """
+        fit_function = self.current_fit_function
+        if (self._background_fit_busy or fit_function not in self.fit_models
+                or time.time() - self._background_fit_start < self.background_fit_interval):
+            return
+        params = None
+        if self._background_fit_function == fit_function:
+            params = self._background_fit_result.params.copy()
+        self._background_fit_busy = True
+        self._background_fit_start = time.time()
+        self.sigBackgroundFitRequested.emit(self._background_fit_generation, fit_function,
+                                            self._mw_frequency_list, np.array(self.ODMR_plot_y),
+                                            params, self.elapsed_time)
+
+    def _background_fit_finished(self, generation, fit):
+        """ Show the result of the fit worker as the current fit.
+
+        @param int generation: number of the fitted average
+        @param dict fit: the result of ODMRFitWorker.fit
+        """
+        self._background_fit_busy = False
+        if generation != self._background_fit_generation or fit['result'] is None:
+            return
+        self._background_fit_function = fit['fit_function']
+        self._background_fit_result = fit['result']
+        self.background_fit_history.append((fit['elapsed_time'], fit['param_dict']))
+
+        self.fit_function = fit['fit_function']
+        self.ODMR_fit_x = fit['fit_x']
+        self.ODMR_fit_y = fit['fit_y']
+        self._fit_param = fit['param_dict']
+        self._fit_result = fit['result']
+        self.sigOdmrFitUpdated.emit()
+        self.sigBackgroundFitUpdated.emit()
+
+    def _update_adaptive_list(self):
+        """ Distribute the frequency points of the next sweep according to
+        the slope of the spectrum.
+
+        The error of a resonance position is smallest if the points are placed
+        where the counts change most with the frequency. The slope is taken
+        from the last fit if there is one, otherwise from the smoothed average.
+        """
+        frequencies = self._mw_frequency_list
+        points = len(frequencies)
+        slope = np.zeros(points)
+        # the windows are separated by gaps, so each gets its own slope
+        for window, part in enumerate(self.window_slices):
+            if part.stop - part.start < 2:
+                continue
+            if self._fit_result is not None:
+                spectrum = self._fit_result.eval(x=frequencies[part])
+            elif window in self.window_fits:
+                spectrum = self.window_fits[window][3].eval(x=frequencies[part])
+            else:
+                counts = self.ODMR_plot_y[part]
+                padded = np.concatenate(([counts[0]], counts, [counts[-1]]))
+                spectrum = np.convolve(padded, [0.25, 0.5, 0.25], mode='valid')
+            slope[part] = np.abs(np.gradient(spectrum))
+        weight = np.full(points, self.adaptive_uniform_fraction / points)
+        if np.sum(slope) > 0:
+            weight += (1 - self.adaptive_uniform_fraction) * slope / np.sum(slope)
+        else:
+            weight = np.full(points, 1 / points)
+
+        # largest remainder rounding keeps the number of points of a sweep
+        share = weight / np.sum(weight) * points
+        repetitions = np.floor(share).astype(int)
+        missing = points - np.sum(repetitions)
+        repetitions[np.argsort(repetitions - share)[:missing]] += 1
+        sweep_indices = np.repeat(np.arange(points), repetitions)
+        if np.array_equal(sweep_indices, self._sweep_indices):
+            return
+
+        self._sweep_indices = sweep_indices
+        if self._mw_device.set_list(frequencies[sweep_indices], self.mw_power) != 0:
+            self.log.error('Setting the adaptive frequency list failed.')
+            self.stopRequested = True
+            return
+        self._mw_device.list_on()
+
     def set_power(self, power=None):
         """ Forwarding the desired new power from the GUI to the MW source.
 
@@ -526,7 +901,7 @@ class ODMRLogic(GenericLogic):
         return models
 
     def do_fit(self, fit_function=None, x_data=None, y_data=None,
-               fit_granularity_fact=10):
+               fit_granularity_fact=10, window=None):
         """Performs the chosen fit on the measured data.
 
         @param str fit_function: name of the chosen fit function
@@ -543,6 +918,10 @@ class ODMRLogic(GenericLogic):
                                            ten times more datapoints are used
                                            for the fit display, then for the
                                            used x_data.
+        @param int window: optional, index of a frequency window. The data of
+                           the window is fitted if no data is passed and the
+                           result is kept in window_fits instead of replacing
+                           the fit of all windows.
 
         @return: tuple (fit_x, fit_y, param_dict, fit_result)
             np.array fit_x: 1D array containing the x values of the fit
@@ -565,26 +944,133 @@ class ODMRLogic(GenericLogic):
 
         # write all needed parameters (not rounded!) in this dict:
         param_dict = OrderedDict()
-        result = None
 
         # Set the instance variable as the data set if nothing is passed.
+        if window is not None and x_data is None and y_data is None:
+            x_data, y_data = self.get_window_data(window)
         if x_data is None:
             x_data = self._mw_frequency_list
         if y_data is None:
             y_data = self.ODMR_plot_y
 
-        self.ODMR_fit_x = np.linspace(start=x_data[0], stop=x_data[-1],
-                                      num=int(len(x_data)*fit_granularity_fact))
+        fit_x = np.linspace(start=np.min(x_data), stop=np.max(x_data),
+                            num=int(len(x_data)*fit_granularity_fact))
+
+        result = self._run_fit(self.fit_function, x_data, y_data)
+        if result is not None:
+            param_dict = self._get_fit_param_dict(self.fit_function, result)
+        else:
+            self.log.warning('The Fit Function "{0}" is not implemented to '
+                    'be used in the ODMR Logic. Correct that! Fit Call will '
+                    'be skipped and Fit Function will be set to '
+                    '"No Fit".'.format(fit_function))
+            self.fit_function = 'No Fit'
+
+        if self.fit_function == 'No Fit':
+            fit_y = np.zeros(fit_x.shape)
+        else:
+            # after the fit was performed, retrieve the fitting function and
+            # evaluate the fitted parameters according to the function:
+            fitted_function, params = self.fit_models[self.fit_function]
+            fit_y = fitted_function.eval(x=fit_x, params=result.params)
+
+        if window is None:
+            self.ODMR_fit_x = fit_x
+            self.ODMR_fit_y = fit_y
+            self._fit_param = param_dict
+            self._fit_result = result
+        elif self.fit_function == 'No Fit':
+            self.window_fits.pop(window, None)
+        else:
+            self.window_fits[window] = (fit_x, fit_y, param_dict, result)
+
+        #FIXME: Check whether this signal is really necessary here.
+        self.sigOdmrPlotUpdated.emit()
+        self.sigOdmrFitUpdated.emit()   # so that the gui can adjust to that
+
+        return fit_x, fit_y, param_dict, result
+
+    def _run_fit(self, fit_function, x_data, y_data, params=None):
+        """ Fit data without changing the state of the logic, so the fit can
+        also run in the thread of the fit worker.
+
+        @param str fit_function: name of the fit function
+        @param array x_data: 1D array with the frequencies
+        @param array y_data: 1D array with the counts
+        @param lmfit.Parameters params: optional, parameters to start the fit
+                                        from instead of the estimate of the
+                                        fit logic, e.g. a previous result
+
+        @return lmfit.model.ModelResult: the result of the fit, None if the
+                                         fit function is not known
+        """
+        if fit_function not in self.fit_models:
+            return None
+        if params is not None:
+            model = self.fit_models[fit_function][0]
+            return model.fit(y_data, params, x=x_data)
 
         # set the keyword arguments, which will be passed to the fit.
         kwargs = {'axis': x_data,
                   'data': y_data,
                   'add_parameters': None}
 
-        if self.fit_function == 'Lorentzian':
-
+        if fit_function == 'Lorentzian':
             result = self._fit_logic.make_lorentzian_fit(**kwargs)
 
+        elif fit_function == 'Double Lorentzian':
+            result = self._fit_logic.make_doublelorentzian_fit(**kwargs)
+
+        elif fit_function == 'Double Lorentzian with fixed splitting':
+            additional_parameters = {}
+            # TODO: insert this in gui config of ODMR
+            splitting_from_gui_config = 5.0  # in MHz
+
+            estimate = self._fit_logic.estimate_doublelorentz(x_data, y_data)
+            error = estimate[0]
+            lorentz0_amplitude = estimate[1]
+            lorentz1_amplitude = estimate[2]
+            lorentz0_center = estimate[3]
+            lorentz1_center = estimate[4]
+            lorentz0_sigma = estimate[5]
+            lorentz1_sigma = estimate[6]
+            offset = estimate[7]
+
+            if lorentz0_center < lorentz1_center:
+                additional_parameters['lorentz1_center'] = {'expr': 'lorentz0_center{0:+f}'.format(splitting_from_gui_config)}
+            else:
+                splitting_from_gui_config *= -1
+                additional_parameters['lorentz1_center'] = {'expr': 'lorentz0_center{0:+f}'.format(splitting_from_gui_config)}
+
+            kwargs['add_parameters'] = additional_parameters
+
+
+            result = self._fit_logic.make_doublelorentzian_fit(**kwargs)
+
+        elif fit_function == 'N14':
+            result = self._fit_logic.make_N14_fit(**kwargs)
+
+        elif fit_function == 'N15':
+            result = self._fit_logic.make_N15_fit(**kwargs)
+
+        elif fit_function == 'Double Gaussian':
+            result = self._fit_logic.make_doublegaussian_fit(estimator="odmr_dip", **kwargs)
+
+        return result
+
+    def _get_fit_param_dict(self, fit_function, result):
+        """ The relevant parameters of a fit with their errors and units.
+
+        @param str fit_function: name of the fit function
+        @param lmfit.model.ModelResult result: the result of the fit
+
+        @return OrderedDict: a dictionary with an entry
+                             {'value': ... , 'error': ...., 'unit': '...'} for
+                             each parameter, in SI units
+        """
+        param_dict = OrderedDict()
+
+        if fit_function == 'Lorentzian':
             param_dict['Frequency'] = {'value': result.params['center'].value,
                                        'error': result.params['center'].stderr,
                                        'unit': 'Hz'}
@@ -608,10 +1094,7 @@ class ODMRLogic(GenericLogic):
 
             param_dict['chi_sqr'] = {'value': result.chisqr, 'unit': ''}
 
-        elif self.fit_function == 'Double Lorentzian':
-
-            result = self._fit_logic.make_doublelorentzian_fit(**kwargs)
-
+        elif fit_function == 'Double Lorentzian':
             param_dict['Freq. 0'] = {'value': result.params['lorentz0_center'].value,
                                      'error': result.params['lorentz0_center'].stderr,
                                      'unit': 'Hz'}
@@ -656,34 +1139,7 @@ class ODMRLogic(GenericLogic):
 
             param_dict['chi_sqr'] = {'value': result.chisqr, 'unit': ''}
 
-        elif self.fit_function == 'Double Lorentzian with fixed splitting':
-
-
-            additional_parameters = {}
-            # TODO: insert this in gui config of ODMR
-            splitting_from_gui_config = 5.0  # in MHz
-
-            estimate = self._fit_logic.estimate_doublelorentz(self._mw_frequency_list, self.ODMR_plot_y)
-            error = estimate[0]
-            lorentz0_amplitude = estimate[1]
-            lorentz1_amplitude = estimate[2]
-            lorentz0_center = estimate[3]
-            lorentz1_center = estimate[4]
-            lorentz0_sigma = estimate[5]
-            lorentz1_sigma = estimate[6]
-            offset = estimate[7]
-
-            if lorentz0_center < lorentz1_center:
-                additional_parameters['lorentz1_center'] = {'expr': 'lorentz0_center{0:+f}'.format(splitting_from_gui_config)}
-            else:
-                splitting_from_gui_config *= -1
-                additional_parameters['lorentz1_center'] = {'expr': 'lorentz0_center{0:+f}'.format(splitting_from_gui_config)}
-
-            kwargs['add_parameters'] = additional_parameters
-
-
-            result = self._fit_logic.make_doublelorentzian_fit(**kwargs)
-
+        elif fit_function == 'Double Lorentzian with fixed splitting':
             param_dict['Freq. 0'] = {'value': result.params['lorentz0_center'].value,
                                      'error': result.params['lorentz0_center'].stderr,
                                      'unit': 'Hz'}
@@ -726,9 +1182,7 @@ class ODMRLogic(GenericLogic):
 
             param_dict['chi_sqr'] = {'value': result.chisqr, 'unit': ''}
 
-        elif self.fit_function == 'N14':
-            result = self._fit_logic.make_N14_fit(**kwargs)
-
+        elif fit_function == 'N14':
             param_dict['Freq. 0'] = {'value': result.params['lorentz0_center'].value,
                                      'error': result.params['lorentz0_center'].stderr,
                                      'unit': 'Hz'}
@@ -794,10 +1248,7 @@ class ODMRLogic(GenericLogic):
 
             param_dict['chi_sqr'] = {'value': result.chisqr, 'unit': ''}
 
-        elif self.fit_function == 'N15':
-
-            result = self._fit_logic.make_N15_fit(**kwargs)
-
+        elif fit_function == 'N15':
             param_dict['Freq. 0'] = {'value': result.params['lorentz0_center'].value,
                                      'error': result.params['lorentz0_center'].stderr,
                                      'unit': 'Hz'}
@@ -842,10 +1293,7 @@ class ODMRLogic(GenericLogic):
 
             param_dict['chi_sqr'] = {'value': result.chisqr, 'unit': ''}
 
-        elif self.fit_function == 'Double Gaussian':
-
-            result = self._fit_logic.make_doublegaussian_fit(estimator="odmr_dip", **kwargs)
-
+        elif fit_function == 'Double Gaussian':
             param_dict['Freq. 0'] = {'value': result.params['gaussian0_center'].value,
                                      'error': result.params['gaussian0_center'].stderr,
                                      'unit': 'Hz'}
@@ -886,29 +1334,7 @@ class ODMRLogic(GenericLogic):
 
             param_dict['chi_sqr'] = {'value': result.chisqr, 'unit': ''}
 
-        else:
-            self.log.warning('The Fit Function "{0}" is not implemented to '
-                    'be used in the ODMR Logic. Correct that! Fit Call will '
-                    'be skipped and Fit Function will be set to '
-                    '"No Fit".'.format(fit_function))
-            self.fit_function = 'No Fit'
-
-        if self.fit_function == 'No Fit':
-            self.ODMR_fit_y = np.zeros(self.ODMR_fit_x.shape)
-        else:
-            # after the fit was performed, retrieve the fitting function and
-            # evaluate the fitted parameters according to the function:
-            fitted_function, params = self.fit_models[self.fit_function]
-            self.ODMR_fit_y = fitted_function.eval(x=self.ODMR_fit_x, params=result.params)
-
-        #FIXME: Check whether this signal is really necessary here.
-        self.sigOdmrPlotUpdated.emit()
-        self.sigOdmrFitUpdated.emit()   # so that the gui can adjust to that
-
-        self._fit_param = param_dict
-        self._fit_result = result
-
-        return self.ODMR_fit_x, self.ODMR_fit_y, param_dict, result
+        return param_dict
 
     def save_ODMR_Data(self, tag=None, colorscale_range=None, percentile_range=None):
         """ Saves the current ODMR data to a file."""
@@ -917,28 +1343,29 @@ class ODMRLogic(GenericLogic):
         # the matrix data.
         filepath = self._save_logic.get_path_for_module(module_name='ODMR')
         filepath2 = self._save_logic.get_path_for_module(module_name='ODMR')
-        filepath3 = self._save_logic.get_path_for_module(module_name='ODMR')
 
         timestamp = datetime.datetime.now()
 
         if tag is not None and len(tag) > 0:
             filelabel = tag + '_ODMR_data'
             filelabel2 = tag + '_ODMR_data_matrix'
-            filelabel3 = tag + '_ODMR_data_raw'
         else:
             filelabel = 'ODMR_data'
             filelabel2 = 'ODMR_data_matrix'
-            filelabel3 = 'ODMR_data_raw'
 
         # prepare the data in a dict or in an OrderedDict:
         data = OrderedDict()
         data2 = OrderedDict()
-        data3 = OrderedDict()
         freq_data = self.ODMR_plot_x
         count_data = self.ODMR_plot_y
         matrix_data = self.ODMR_plot_xy  # the data in the matrix plot
         data['frequency values (Hz)'] = freq_data
         data['count data (counts/s)'] = count_data
+        if len(self.window_slices) > 1:
+            window_data = np.zeros(len(freq_data), dtype=int)
+            for window, part in enumerate(self.window_slices):
+                window_data[part] = window
+            data['frequency window (#)'] = window_data
         data2['count data (counts/s)'] = matrix_data  # saves the raw data used in the matrix NOT all only the size of the matrix
 
         parameters = OrderedDict()
@@ -947,9 +1374,15 @@ class ODMRLogic(GenericLogic):
         parameters['Start Frequency (Hz)'] = self.mw_start
         parameters['Stop Frequency (Hz)'] = self.mw_stop
         parameters['Step size (Hz)'] = self.mw_step
+        for number, (start, stop, step) in enumerate(self.mw_windows, 1):
+            parameters['Window {0} Start Frequency (Hz)'.format(number)] = start
+            parameters['Window {0} Stop Frequency (Hz)'.format(number)] = stop
+            parameters['Window {0} Step size (Hz)'.format(number)] = step
         parameters['Clock Frequency (Hz)'] = self._clock_frequency
         parameters['Number of matrix lines (#)'] = self.number_of_lines
         parameters['Fit function'] = self.current_fit_function
+        if self._raw_data_store is not None:
+            parameters['Raw data directory'] = self.raw_data_directory
 
 
         # add all fit parameter to the saved data:
@@ -957,6 +1390,12 @@ class ODMRLogic(GenericLogic):
             for entry in self._fit_param[param]:
                 name = '{0}_{1}'.format(param, entry)
                 parameters[name] = self._fit_param[param][entry]
+        for window in sorted(self.window_fits):
+            param_dict = self.window_fits[window][2]
+            for param in param_dict:
+                for entry in param_dict[param]:
+                    name = 'Window {0} fit {1}_{2}'.format(window, param, entry)
+                    parameters[name] = param_dict[param][entry]
 
         fig = self.draw_figure(cbar_range=colorscale_range,
                                percentile_range=percentile_range
@@ -980,23 +1419,54 @@ class ODMRLogic(GenericLogic):
             timestamp=timestamp,
             as_text=True)
 
+        if len(self.background_fit_history) > 0:
+            self._save_background_fit_history(tag, timestamp, parameters)
+
         self.log.info('ODMR data saved to:\n{0}'.format(filepath))
 
-        if self.saveRawData:
-            raw_data = self.ODMR_raw_data  # array cotaining ALL messured data
-            data3['count data'] = raw_data  # saves the raw data, ALL of it so keep an eye on performance
-            self._save_logic.save_data(
-                data3,
-                filepath3,
-                parameters=parameters,
-                filelabel=filelabel3,
-                timestamp=timestamp,
-                as_text=True)
-
-            self.log.info('Raw data succesfully saved.')
+        if self._raw_data_store is not None:
+            # the raw data is already on disk, only the latest lines are missing
+            self._flush_raw_data()
+            self.log.info('Raw data of {0} lines is saved in:\n{1}'.format(
+                len(self._raw_data_store), self.raw_data_directory))
         else:
             self.log.info('Raw data is NOT saved')
 
+    def _save_background_fit_history(self, tag, timestamp, parameters):
+        """ Save the parameters of all background fits over the measurement time.
+
+        @param str tag: tag of the file name
+        @param datetime timestamp: time stamp of the saved data
+        @param OrderedDict parameters: parameters of the measurement
+        """
+        filepath = self._save_logic.get_path_for_module(module_name='ODMR')
+        if tag is not None and len(tag) > 0:
+            filelabel = tag + '_ODMR_fit_history'
+        else:
+            filelabel = 'ODMR_fit_history'
+
+        data = OrderedDict()
+        data['elapsed time (s)'] = np.array([entry[0] for entry in self.background_fit_history])
+        # the columns follow the latest fit, parameters which an earlier fit
+        # function does not have are NaN
+        for name, param in self.background_fit_history[-1][1].items():
+            for key in ('value', 'error'):
+                if key not in param:
+                    continue
+                column = [fit.get(name, {}).get(key) for _, fit in self.background_fit_history]
+                column = [np.nan if value is None else value for value in column]
+                unit = param.get('unit', '')
+                label = '{0} {1} ({2})'.format(name, key, unit) if unit else '{0} {1}'.format(name, key)
+                data[label] = np.array(column, dtype=float)
+
+        self._save_logic.save_data(
+            data,
+            filepath,
+            parameters=parameters,
+            filelabel=filelabel,
+            timestamp=timestamp,
+            as_text=True)
+
     def draw_figure(self, cbar_range=None, percentile_range=None):
         """ Draw the summary figure to save with the data.
 
@@ -1012,7 +1482,9 @@ class ODMRLogic(GenericLogic):
         count_data = self.ODMR_plot_y
         fit_freq_vals = self.ODMR_fit_x
         fit_count_vals = self.ODMR_fit_y
-        matrix_data = self.ODMR_plot_xy
+        # frequencies skipped by the adaptive sampling are drawn like the
+        # lines which are not measured yet
+        matrix_data = np.nan_to_num(self.ODMR_plot_xy)
 
         # If no colorbar range was given, take full range of data
         if cbar_range is None:
@@ -1031,6 +1503,7 @@ class ODMRLogic(GenericLogic):
             prefix_index = prefix_index + 1
 
         counts_prefix = prefix[prefix_index]
+        counts_scale = 1000**prefix_index
 
         # Rescale frequency data with SI prefix
         prefix_index = 0
@@ -1041,6 +1514,7 @@ class ODMRLogic(GenericLogic):
             prefix_index = prefix_index + 1
 
         mw_prefix = prefix[prefix_index]
+        mw_scale = 1000**prefix_index
 
         # Rescale matrix counts data with SI prefix
         prefix_index = 0
@@ -1058,29 +1532,45 @@ class ODMRLogic(GenericLogic):
         # Create figure
         fig, (ax_mean, ax_matrix) = plt.subplots(nrows=2, ncols=1)
 
-        ax_mean.plot(freq_data, count_data, linestyle=':', linewidth=0.5)
+        # every window is drawn on its own, no line crosses the gaps
+        for part in self.window_slices:
+            ax_mean.plot(freq_data[part], count_data[part], linestyle=':', linewidth=0.5,
+                         color='C0')
 
         # Do not include fit curve if there is no fit calculated.
         if max(fit_count_vals) > 0:
-            ax_mean.plot(fit_freq_vals, fit_count_vals, marker='None')
+            ax_mean.plot(fit_freq_vals, fit_count_vals, marker='None', color='C1')
+        for window in sorted(self.window_fits):
+            window_fit_x, window_fit_y = self.window_fits[window][:2]
+            ax_mean.plot(window_fit_x / mw_scale, window_fit_y / counts_scale,
+                         marker='None', color='C2')
 
         ax_mean.set_ylabel('Fluorescence (' + counts_prefix + 'c/s)')
         ax_mean.set_xlim(np.min(freq_data), np.max(freq_data))
 
+        # the columns of several windows are not equally spaced in frequency,
+        # then the matrix is drawn over the number of the frequency point
+        if len(self.window_slices) > 1:
+            matrix_x_range = [0, len(freq_data)]
+            matrix_x_label = 'Frequency point (#)'
+        else:
+            matrix_x_range = [np.min(freq_data), np.max(freq_data)]
+            matrix_x_label = 'Frequency (' + mw_prefix + 'Hz)'
+
         matrixplot = ax_matrix.imshow(matrix_data,
                                       cmap=plt.get_cmap('inferno'),  # reference the right place in qd
                                       origin='lower',
                                       vmin=cbar_range[0],
                                       vmax=cbar_range[1],
-                                      extent=[np.min(freq_data),
-                                              np.max(freq_data),
+                                      extent=[matrix_x_range[0],
+                                              matrix_x_range[1],
                                               0,
                                               self.number_of_lines
                                               ],
                                       aspect='auto',
                                       interpolation='nearest')
 
-        ax_matrix.set_xlabel('Frequency (' + mw_prefix + 'Hz)')
+        ax_matrix.set_xlabel(matrix_x_label)
         ax_matrix.set_ylabel('Scan #')
 
         # Adjust subplots to make room for colorbar
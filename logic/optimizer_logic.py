@@ -26,6 +26,8 @@ import numpy as np
 import time
 
 from logic.generic_logic import GenericLogic
+from logic import refocus_estimator
+from logic import refocus_trajectories
 from core.util.mutex import Mutex
 
 
@@ -43,8 +45,17 @@ class OptimizerLogic(GenericLogic):
            }
     _out = {'optimizerlogic': 'OptimizerLogic'}
 
+    # 'image' scans the whole xy refocus image, 'cross' one line along x and
+    # one along y through the start position, 'spiral' a spiral around it and
+    # 'iterative' alternating x and y lines through the latest estimate
+    xy_refocus_methods = ('image', 'cross', 'spiral', 'iterative')
+    # the trajectories only see the flanks of the spot if the refocus area is
+    # at least this many spot sigmas wide, otherwise the image is scanned
+    trajectory_min_size_in_sigma = 4
+
     # "private" signals to keep track of activities here in the optimizer logic
     _signal_scan_next_xy_line = QtCore.Signal()
+    _signal_scan_next_xy_path = QtCore.Signal()
     _signal_scan_z_line = QtCore.Signal()
     _signal_completed_xy_optimizer_scan = QtCore.Signal()
     _signal_do_next_optimization_step = QtCore.Signal()
@@ -80,6 +91,23 @@ class OptimizerLogic(GenericLogic):
         self.do_surface_subtraction = False
         self.surface_subtr_scan_offset = 1  # micron
 
+        # estimate the spot position from image moments and only fit with
+        # lmfit if the estimate does not pass its quality checks
+        self.use_fast_estimator = True
+        # refine the moment estimate with one Gauss-Newton step
+        self.estimator_polish = True
+
+        # settings of the xy refocus trajectories, see xy_refocus_methods
+        self.xy_refocus_method = 'image'
+        self.trajectory_XY_res = 30  # points of each line of 'cross' and 'iterative'
+        self.refocus_iterations = 2  # pairs of lines of 'iterative'
+        # number of positions the scanner visited during the last refocus
+        self.refocus_points = 0
+        # method of the running xy refocus, 'image' after a failed trajectory
+        self._xy_scan_method = 'image'
+        # sigma of the spot found by the last xy refocus, None if unknown
+        self._spot_sigma = None
+
         # locking for thread safety
         self.threadlock = Mutex()
 
@@ -109,6 +137,8 @@ class OptimizerLogic(GenericLogic):
             self.return_slowness = self._statusVariables['return_slowness']
         else:
             self.return_slowness = 20
+        if 'xy_refocus_method' in self._statusVariables:
+            self.xy_refocus_method = self._statusVariables['xy_refocus_method']
 
         # Reads in the maximal scanning range. The unit of that scan range is micrometer!
         self.x_range = self._scanning_device.get_position_range()[0]
@@ -158,6 +188,7 @@ class OptimizerLogic(GenericLogic):
 
         # Sets connections between signals and functions
         self._signal_scan_next_xy_line.connect(self._refocus_xy_line, QtCore.Qt.QueuedConnection)
+        self._signal_scan_next_xy_path.connect(self._refocus_xy_path, QtCore.Qt.QueuedConnection)
         self._signal_scan_z_line.connect(self.do_z_optimization, QtCore.Qt.QueuedConnection)
         self._signal_completed_xy_optimizer_scan.connect(self._set_optimized_xy_from_fit, QtCore.Qt.QueuedConnection)
 
@@ -176,6 +207,7 @@ class OptimizerLogic(GenericLogic):
         """
         self._statusVariables['clock_frequency'] = self._clock_frequency
         self._statusVariables['return_slowness'] = self.return_slowness
+        self._statusVariables['xy_refocus_method'] = self.xy_refocus_method
         return 0
 
     def testing(self):
@@ -246,7 +278,12 @@ class OptimizerLogic(GenericLogic):
 
         self._xy_scan_line_count = 0
         self._optimization_step = 0
+        self.refocus_points = 0
         self.check_optimization_sequence()
+        if self.xy_refocus_method not in self.xy_refocus_methods:
+            self.log.error('Unknown xy refocus method {0}, the full image is scanned '
+                           'instead.'.format(self.xy_refocus_method))
+            self.xy_refocus_method = 'image'
 
         scanner_status = self.start_scanner()
         if scanner_status < 0:
@@ -307,6 +344,16 @@ class OptimizerLogic(GenericLogic):
         self.z_refocus_line = np.zeros(len(self._zimage_Z_values))
         self.z_fit_data = np.zeros(len(self._fit_zimage_Z_values))
 
+    def _scan_line(self, line):
+        """ Scan a path and count the positions visited during the refocus.
+
+        @param numpy.ndarray line: path with the shape (4, points)
+
+        @return numpy.ndarray: the counts, [-1] on error
+        """
+        self.refocus_points += np.shape(line)[1]
+        return self._scanning_device.scan_line(line)
+
     def _move_to_start_pos(self, start_pos):
         """Moves the scanner from its current position to the start position of the optimizer scan.
 
@@ -320,7 +367,7 @@ class OptimizerLogic(GenericLogic):
             np.linspace(scanner_pos[2], start_pos[2], self.return_slowness),
             np.linspace(0, 0, self.return_slowness)))
 
-        counts = self._scanning_device.scan_line(move_to_start_line)
+        counts = self._scan_line(move_to_start_line)
         if counts[0] == -1:
             return -1
         time.sleep(self.hw_settle_time)
@@ -361,7 +408,7 @@ class OptimizerLogic(GenericLogic):
             self.xy_refocus_image[self._xy_scan_line_count, :, 2],
             self._A_values))
 
-        line_counts = self._scanning_device.scan_line(line)
+        line_counts = self._scan_line(line)
         if line_counts[0] == -1:
             self.log.error('The scan went wrong, killing the scanner.')
             self.stop_refocus()
@@ -374,7 +421,7 @@ class OptimizerLogic(GenericLogic):
             self.xy_refocus_image[self._xy_scan_line_count, 0, 2] * np.ones(self._return_X_values.shape),
             self._return_A_values))
 
-        return_line_counts = self._scanning_device.scan_line(return_line)
+        return_line_counts = self._scan_line(return_line)
         if return_line_counts[0] == -1:
             self.log.error('The scan went wrong, killing the scanner.')
             self.stop_refocus()
@@ -391,28 +438,227 @@ class OptimizerLogic(GenericLogic):
         else:
             self._signal_completed_xy_optimizer_scan.emit()
 
+    def _initialize_xy_trajectory(self):
+        """Initialisation of the trajectory refocus in xy."""
+        self._xy_path_count = 0
+        self._xy_samples = []
+        # latest position estimate and whether its x and y were found
+        self._xy_estimate = [self.optim_pos_x, self.optim_pos_y]
+        self._xy_estimate_success = [False, False]
+        self._xy_sigma_estimate = [None, None]
+        if self.xy_refocus_method == 'spiral':
+            self._xy_path_number = 1
+        elif self.xy_refocus_method == 'cross':
+            self._xy_path_number = 2
+        else:
+            self._xy_path_number = 2 * max(int(self.refocus_iterations), 1)
+
+    def _next_xy_path(self):
+        """Path of the next scan of the xy trajectory refocus.
+
+        @return numpy.ndarray: path with the shape (4, points)
+        """
+        if self.xy_refocus_method == 'cross':
+            x0, y0 = self.optim_pos_x, self.optim_pos_y
+        else:
+            x0, y0 = self._xy_estimate
+        if self.xy_refocus_method == 'spiral':
+            return refocus_trajectories.spiral_path(
+                x0, y0, self.optim_pos_z, self.refocus_XY_size,
+                ring_spacing=2 * self.refocus_XY_size / self.optimizer_XY_res,
+                point_spacing=self.refocus_XY_size / self.trajectory_XY_res,
+                x_range=self.x_range, y_range=self.y_range)
+        if self._xy_path_count % 2 == 0:
+            x_line = refocus_trajectories.clipped_line(
+                x0, self.refocus_XY_size, self.trajectory_XY_res, self.x_range)
+            return refocus_trajectories.line_path(x_line, y0, self.optim_pos_z)
+        y_line = refocus_trajectories.clipped_line(
+            y0, self.refocus_XY_size, self.trajectory_XY_res, self.y_range)
+        return refocus_trajectories.line_path(x0, y_line, self.optim_pos_z)
+
+    def _refocus_xy_path(self):
+        """Scanning a path of the xy trajectory refocus.
+        This method repeats itself using the _signal_scan_next_xy_path
+        until all paths of the xy refocus method are scanned.
+        """
+        # stop scanning if instructed
+        if self.stopRequested:
+            with self.threadlock:
+                self.stopRequested = False
+                self.finish_refocus()
+                self.signal_image_updated.emit()
+                self.signal_refocus_finished.emit(
+                    self._caller_tag,
+                    [self.optim_pos_x, self.optim_pos_y, self.optim_pos_z, 0])
+                return
+
+        path = self._next_xy_path()
+        status = self._move_to_start_pos(path[0:3, 0])
+        if status < 0:
+            self.log.error('Error during move to starting point.')
+            self.stop_refocus()
+            self._signal_scan_next_xy_path.emit()
+            return
+
+        counts = self._scan_line(path)
+        if counts[0] == -1:
+            self.log.error('The scan went wrong, killing the scanner.')
+            self.stop_refocus()
+            self._signal_scan_next_xy_path.emit()
+            return
+
+        self._xy_samples.append((path, counts))
+        self._show_xy_samples(path, counts)
+        self.signal_image_updated.emit()
+
+        if self.xy_refocus_method != 'spiral':
+            # lines along x are the even, lines along y the odd paths
+            axis = self._xy_path_count % 2
+            success, center, sigma = self._fit_line_center(path[axis], counts)
+            self._xy_estimate_success[axis] = success
+            if success:
+                self._xy_estimate[axis] = center
+                self._xy_sigma_estimate[axis] = sigma
+
+        self._xy_path_count += 1
+        if self._xy_path_count < self._xy_path_number:
+            self._signal_scan_next_xy_path.emit()
+        else:
+            self._signal_completed_xy_optimizer_scan.emit()
+
+    def _show_xy_samples(self, path, counts):
+        """Put the counts of a refocus path into the nearest pixels of the
+        xy refocus image.
+        """
+        pixel_x = (self._X_values[-1] - self._X_values[0]) / max(len(self._X_values) - 1, 1)
+        pixel_y = (self._Y_values[-1] - self._Y_values[0]) / max(len(self._Y_values) - 1, 1)
+        inside = ((path[0] >= self._X_values[0] - pixel_x / 2)
+                  & (path[0] <= self._X_values[-1] + pixel_x / 2)
+                  & (path[1] >= self._Y_values[0] - pixel_y / 2)
+                  & (path[1] <= self._Y_values[-1] + pixel_y / 2))
+        columns = np.rint(np.interp(path[0][inside], self._X_values,
+                                    np.arange(len(self._X_values)))).astype(int)
+        rows = np.rint(np.interp(path[1][inside], self._Y_values,
+                                 np.arange(len(self._Y_values)))).astype(int)
+        self.xy_refocus_image[rows, columns, 3] = np.asarray(counts)[inside]
+
+    def _fit_line_center(self, positions, counts):
+        """Center of the spot on a line of the trajectory refocus.
+
+        A center outside of the scanned line is no success, the spot is not
+        on the line then.
+
+        @param numpy.ndarray positions: position of each point along the line
+        @param numpy.ndarray counts: counts of each point
+
+        @return tuple: (bool success, float center, float sigma)
+        """
+        estimate = {'success': False}
+        if self.use_fast_estimator:
+            estimate = refocus_estimator.estimate_gaussian_with_slope(
+                positions, counts, polish=self.estimator_polish)
+        if estimate['success']:
+            success, center, sigma = True, estimate['center'], estimate['sigma']
+        else:
+            result = self._fit_logic.make_gaussianwithslope_fit(axis=positions, data=counts)
+            success = result.success
+            center, sigma = result.best_values['center'], result.best_values['sigma']
+        inside = np.isfinite(center) and np.min(positions) <= center <= np.max(positions)
+        return bool(success and inside), center, sigma
+
+    def _fit_xy_trajectory(self):
+        """Spot position from the completed xy trajectory refocus.
+
+        @return tuple: (bool success, float x_zero, float y_zero, float sigma)
+        """
+        if self.xy_refocus_method != 'spiral':
+            success = all(self._xy_estimate_success)
+            sigma = np.mean(self._xy_sigma_estimate) if success else None
+            return success, self._xy_estimate[0], self._xy_estimate[1], sigma
+
+        # a 2D Gaussian fit of the scattered points of the spiral is far off
+        # too often, so only the point estimator is used and the refocus image
+        # is scanned if it fails
+        path, counts = self._xy_samples[0]
+        estimate = refocus_estimator.estimate_gaussian_2d_points(
+            path[0], path[1], counts,
+            spacing=self.refocus_XY_size / self.trajectory_XY_res,
+            polish=self.estimator_polish)
+        if not estimate['success']:
+            return False, self._xy_estimate[0], self._xy_estimate[1], None
+        x_zero, y_zero = estimate['x_zero'], estimate['y_zero']
+        # the spot has to lie inside of the sampled spiral
+        inside = (np.hypot(x_zero - self._xy_estimate[0], y_zero - self._xy_estimate[1])
+                  <= 0.5 * self.refocus_XY_size
+                  and np.min(path[0]) <= x_zero <= np.max(path[0])
+                  and np.min(path[1]) <= y_zero <= np.max(path[1]))
+        return inside, x_zero, y_zero, 0.5 * (estimate['sigma_x'] + estimate['sigma_y'])
+
     def _set_optimized_xy_from_fit(self):
-        """Fit the completed xy optimizer scan and set the optimized xy position."""
-        fit_x, fit_y = np.meshgrid(self._X_values, self._Y_values)
-        xy_fit_data = self.xy_refocus_image[:, :, 3].ravel()
-        axes = np.empty((len(self._X_values) * len(self._Y_values), 2))
-        axes = (fit_x.flatten(), fit_y.flatten())
-        result_2D_gaus = self._fit_logic.make_twoDgaussian_fit(axis=axes, data=xy_fit_data)
-        # print(result_2D_gaus.fit_report())
-
-        if result_2D_gaus.success is False:
+        """Fit the completed xy optimizer scan and set the optimized xy position.
+
+        If a trajectory refocus does not find the spot, the refocus image is
+        scanned instead.
+        """
+        if self._xy_scan_method != 'image':
+            fit_success, x_zero, y_zero, sigma = self._fit_xy_trajectory()
+            if not fit_success:
+                self.log.warning('The {0} xy refocus did not find the spot, scanning the '
+                                 'refocus image instead.'.format(self._xy_scan_method))
+                self._xy_scan_method = 'image'
+                self._initialize_xy_refocus_image()
+                self._signal_scan_next_xy_line.emit()
+                return
+            self._spot_sigma = abs(sigma)
+            self._set_optimized_xy(fit_success, x_zero, y_zero)
+            return
+
+        estimate = {'success': False}
+        if self.use_fast_estimator:
+            estimate = refocus_estimator.estimate_gaussian_2d(
+                self._X_values, self._Y_values, self.xy_refocus_image[:, :, 3],
+                polish=self.estimator_polish)
+
+        if estimate['success']:
+            fit_success = True
+            x_zero = estimate['x_zero']
+            y_zero = estimate['y_zero']
+            sigma = 0.5 * (estimate['sigma_x'] + estimate['sigma_y'])
+        else:
+            if self.use_fast_estimator:
+                self.log.debug('Moment estimate of the xy refocus failed, doing a full fit.')
+            fit_x, fit_y = np.meshgrid(self._X_values, self._Y_values)
+            xy_fit_data = self.xy_refocus_image[:, :, 3].ravel()
+            axes = (fit_x.flatten(), fit_y.flatten())
+            result_2D_gaus = self._fit_logic.make_twoDgaussian_fit(axis=axes, data=xy_fit_data)
+            fit_success = result_2D_gaus.success
+            x_zero = result_2D_gaus.best_values['x_zero']
+            y_zero = result_2D_gaus.best_values['y_zero']
+            sigma = 0.5 * (result_2D_gaus.best_values['sigma_x']
+                           + result_2D_gaus.best_values['sigma_y'])
+        if fit_success:
+            self._spot_sigma = abs(sigma)
+        self._set_optimized_xy(fit_success, x_zero, y_zero)
+
+    def _set_optimized_xy(self, fit_success, x_zero, y_zero):
+        """Set the optimized xy position if the fitted spot position is valid.
+
+        @param bool fit_success: whether the spot was found
+        @param float x_zero: x position of the spot
+        @param float y_zero: y position of the spot
+        """
+        if fit_success is False:
             self.log.error('error in 2D Gaussian Fit.')
-            print('2D gaussian fit not successfull')
             self.optim_pos_x = self._initial_pos_x
             self.optim_pos_y = self._initial_pos_y
             # hier abbrechen
         else:
             #                @reviewer: Do we need this. With constraints not one of these cases will be possible....
-            if abs(self._initial_pos_x - result_2D_gaus.best_values['x_zero']) < self._max_offset and abs(self._initial_pos_x - result_2D_gaus.best_values['x_zero']) < self._max_offset:
-                if result_2D_gaus.best_values['x_zero'] >= self.x_range[0] and result_2D_gaus.best_values['x_zero'] <= self.x_range[1]:
-                    if result_2D_gaus.best_values['y_zero'] >= self.y_range[0] and result_2D_gaus.best_values['y_zero'] <= self.y_range[1]:
-                        self.optim_pos_x = result_2D_gaus.best_values['x_zero']
-                        self.optim_pos_y = result_2D_gaus.best_values['y_zero']
+            if abs(self._initial_pos_x - x_zero) < self._max_offset and abs(self._initial_pos_y - y_zero) < self._max_offset:
+                if x_zero >= self.x_range[0] and x_zero <= self.x_range[1]:
+                    if y_zero >= self.y_range[0] and y_zero <= self.y_range[1]:
+                        self.optim_pos_x = x_zero
+                        self.optim_pos_y = y_zero
             else:
                 self.optim_pos_x = self._initial_pos_x
                 self.optim_pos_y = self._initial_pos_y
@@ -429,48 +675,41 @@ class OptimizerLogic(GenericLogic):
         self.signal_image_updated.emit()
 
         # z-fit
-        # If subtracting surface, then data can go negative and the gaussian fit offset constraints need to be adjusted
-        if self.do_surface_subtraction:
-            adjusted_param = {}
-            adjusted_param['offset'] = {
-                'value': 1e-12,
-                'min': -self.z_refocus_line.max(),
-                'max': self.z_refocus_line.max()
-            }
-            result = self._fit_logic.make_gaussianwithslope_fit(
-                axis=self._zimage_Z_values,
-                data=self.z_refocus_line,
-                add_parameters=adjusted_param)
+        # custom fit parameters are only known to the full fit
+        estimate = {'success': False}
+        if self.use_fast_estimator and not self.use_custom_params:
+            estimate = refocus_estimator.estimate_gaussian_with_slope(
+                self._zimage_Z_values, self.z_refocus_line, polish=self.estimator_polish)
+        if estimate['success']:
+            fit_success = True
+            z_center = estimate['center']
+            z_fit_data = refocus_estimator.gaussian_with_slope(
+                self._fit_zimage_Z_values, estimate['amplitude'], estimate['center'],
+                estimate['sigma'], estimate['offset'], estimate['slope'])
         else:
-            if self.use_custom_params:
-                result = self._fit_logic.make_gaussianwithslope_fit(
-                    axis=self._zimage_Z_values,
-                    data=self.z_refocus_line,
-                    # Todo: It is required that the changed parameters are given as a dictionary
-                    add_parameters={})
-            else:
-                result = self._fit_logic.make_gaussianwithslope_fit(
-                    axis=self._zimage_Z_values,
-                    data=self.z_refocus_line)
-        self.z_params = result.params
-
-        if result.success is False:
+            result = self._z_lmfit()
+            self.z_params = result.params
+            fit_success = result.success
+            z_center = result.best_values['center']
+            if fit_success:
+                gauss, params = self._fit_logic.make_gaussianwithslope_model()
+                z_fit_data = gauss.eval(x=self._fit_zimage_Z_values, params=result.params)
+
+        if fit_success is False:
             self.log.error('error in 1D Gaussian Fit.')
             self.optim_pos_z = self._initial_pos_z
             # interrupt here?
         else:  # move to new position
             #                @reviewer: Do we need this. With constraints not one of these cases will be possible....
             # checks if new pos is too far away
-            if abs(self._initial_pos_z - result.best_values['center']) < self._max_offset:
+            if abs(self._initial_pos_z - z_center) < self._max_offset:
                 # checks if new pos is within the scanner range
-                if result.best_values['center'] >= self.z_range[0] and result.best_values['center'] <= self.z_range[1]:
-                    self.optim_pos_z = result.best_values['center']
-                    gauss, params = self._fit_logic.make_gaussianwithslope_model()
-                    self.z_fit_data = gauss.eval(
-                        x=self._fit_zimage_Z_values, params=result.params)
+                if z_center >= self.z_range[0] and z_center <= self.z_range[1]:
+                    self.optim_pos_z = z_center
+                    self.z_fit_data = z_fit_data
                 else:  # new pos is too far away
                     # checks if new pos is too high
-                    if result.best_values['center'] > self._initial_pos_z:
+                    if z_center > self._initial_pos_z:
                         if self._initial_pos_z + 0.5 * self.refocus_Z_size <= self.z_range[1]:
                             # moves to higher edge of scan range
                             self.optim_pos_z = self._initial_pos_z + 0.5 * self.refocus_Z_size
@@ -485,18 +724,50 @@ class OptimizerLogic(GenericLogic):
 
         self._signal_do_next_optimization_step.emit()
 
+    def _z_lmfit(self):
+        """ Full fit of the z refocus line with lmfit.
+
+        @return object: lmfit.model.ModelFit object
+        """
+        # If subtracting surface, then data can go negative and the gaussian fit offset constraints need to be adjusted
+        if self.do_surface_subtraction:
+            adjusted_param = {}
+            adjusted_param['offset'] = {
+                'value': 1e-12,
+                'min': -self.z_refocus_line.max(),
+                'max': self.z_refocus_line.max()
+            }
+            result = self._fit_logic.make_gaussianwithslope_fit(
+                axis=self._zimage_Z_values,
+                data=self.z_refocus_line,
+                add_parameters=adjusted_param)
+        else:
+            if self.use_custom_params:
+                result = self._fit_logic.make_gaussianwithslope_fit(
+                    axis=self._zimage_Z_values,
+                    data=self.z_refocus_line,
+                    # Todo: It is required that the changed parameters are given as a dictionary
+                    add_parameters={})
+            else:
+                result = self._fit_logic.make_gaussianwithslope_fit(
+                    axis=self._zimage_Z_values,
+                    data=self.z_refocus_line)
+        return result
+
     def finish_refocus(self):
         """ Finishes up and releases hardware after the optimizer scans."""
         self.kill_scanner()
 
         self.log.info('Optimised from ({0:.3f},{1:.3f},{2:.3f}) to local '
-                'maximum at ({3:.3f},{4:.3f},{5:.3f}).'.format(
+                'maximum at ({3:.3f},{4:.3f},{5:.3f}) with {6} scanner '
+                'points.'.format(
                     self._initial_pos_x,
                     self._initial_pos_y,
                     self._initial_pos_z,
                     self.optim_pos_x,
                     self.optim_pos_y,
-                    self.optim_pos_z))
+                    self.optim_pos_z,
+                    self.refocus_points))
 
         # Signal that the optimization has finished, and "return" the optimal position along with caller_tag
         self.signal_refocus_finished.emit(self._caller_tag, [self.optim_pos_x, self.optim_pos_y, self.optim_pos_z, 0])
@@ -521,7 +792,7 @@ class OptimizerLogic(GenericLogic):
         line = np.vstack((X_line, Y_line, Z_line, A_line))
 
         # Perform scan
-        line_counts = self._scanning_device.scan_line(line)
+        line_counts = self._scan_line(line)
         if line_counts[0] == -1:
             self.log.error('Z scan went wrong, killing the scanner.')
             self.stop_refocus()
@@ -545,7 +816,7 @@ class OptimizerLogic(GenericLogic):
             # define an offset line to measure "background"
             line_bg = np.vstack((X_line + self.surface_subtr_scan_offset, Y_line, Z_line, A_line))
 
-            line_bg_counts = self._scanning_device.scan_line(line_bg)
+            line_bg_counts = self._scan_line(line_bg)
             if line_bg_counts[0] == -1:
                 self.log.error('The scan went wrong, killing the scanner.')
                 self.stop_refocus()
@@ -600,6 +871,18 @@ class OptimizerLogic(GenericLogic):
         self.unlock()
         return 0
 
+    def _trajectory_fits_spot(self):
+        """Whether the xy refocus area is wide enough for a trajectory refocus.
+
+        The spot size is only known after a successful xy refocus, before
+        that the image is scanned to measure it.
+
+        @return bool: True if the refocus area spans the spot and its flanks
+        """
+        if self._spot_sigma is None:
+            return False
+        return self.refocus_XY_size >= self.trajectory_min_size_in_sigma * self._spot_sigma
+
     def _do_next_optimization_step(self):
         """Handle the steps through the specified optimization sequence
         """
@@ -618,7 +901,17 @@ class OptimizerLogic(GenericLogic):
         # Launch the next step
         if this_step == 'XY':
             self._initialize_xy_refocus_image()
-            self._signal_scan_next_xy_line.emit()
+            self._xy_scan_method = self.xy_refocus_method
+            if self._xy_scan_method != 'image' and not self._trajectory_fits_spot():
+                self.log.debug('The xy refocus area is small compared to the spot, '
+                               'scanning the refocus image instead of the {0} '
+                               'trajectory.'.format(self._xy_scan_method))
+                self._xy_scan_method = 'image'
+            if self._xy_scan_method == 'image':
+                self._signal_scan_next_xy_line.emit()
+            else:
+                self._initialize_xy_trajectory()
+                self._signal_scan_next_xy_path.emit()
         elif this_step == 'Z':
             self._initialize_z_refocus_image()
             self._signal_scan_z_line.emit()
@@ -24,6 +24,7 @@ from qtpy import QtCore
 import numpy as np
 
 from logic.generic_logic import GenericLogic
+from logic.trace_decimation import DecimationPyramid
 from core.util.mutex import Mutex
 
 
@@ -74,6 +75,7 @@ class PIDLogic(GenericLogic):
             self.timestep = 100
 
         self.history = np.zeros([3, self.bufferLength])
+        self._history_pyramid = DecimationPyramid(self.bufferLength, channels=3)
         self.savingState = False
         self.enabled = False
         self.timer = QtCore.QTimer()
@@ -103,6 +105,7 @@ class PIDLogic(GenericLogic):
         self.history[0, -1] = self._controller.get_process_value()
         self.history[1, -1] = self._controller.get_control_value()
         self.history[2, -1] = self._controller.get_setpoint()
+        self._history_pyramid.append(self.history[:, -1])
         self.sigUpdateDisplay.emit()
         if self.enabled:
             self.timer.start(self.timestep)
@@ -122,6 +125,22 @@ class PIDLogic(GenericLogic):
     def setBufferLength(self, newBufferLength):
         self.bufferLength = newBufferLength
         self.history = np.zeros([3, self.bufferLength])
+        self._history_pyramid = DecimationPyramid(self.bufferLength, channels=3)
+
+    def get_display_data(self, max_points=1000):
+        """ History reduced to the number of points a plot can show.
+
+        Consecutive samples are combined into blocks, of which the minimum and
+        the maximum are returned.
+
+        @param int max_points: maximum number of points per trace
+
+        @return tuple(numpy.ndarray, numpy.ndarray): time of each point in ms
+                    and process value, control value and setpoint with shape
+                    (3, points)
+        """
+        positions, data = self._history_pyramid.get_display_data(max_points)
+        return (positions + self.bufferLength - 1) * self.timestep, data
 
     def get_kp(self):
         return self._controller.get_kp()
@@ -32,6 +32,7 @@ import math
 import time
 
 from logic.generic_logic import GenericLogic
+from logic.drift_predictor import KalmanDriftFilter
 from core.util.mutex import Mutex
 
 
@@ -206,6 +207,20 @@ class PoiManagerLogic(GenericLogic):
         self.timer_step = 0
         self.timer_duration = 300
 
+        # drift model of the sample from its position trace: the refocus starts
+        # at the predicted position with a range shrunk to the uncertainty of
+        # the prediction, and the time between periodic refocus adapts to the
+        # drift, within min_refocus_interval and max_refocus_interval
+        self.drift_prediction = True
+        self.adaptive_refocus_interval = True
+        self.drift_tolerance = 0.05  # allowed uncertainty of the xy prediction in micron
+        self.min_refocus_interval = 30
+        self.max_refocus_interval = 3600
+        self.min_refocus_size_fraction = 0.5  # smallest refocus range relative to the set one
+        self.refocus_interval = self.timer_duration
+        self._drift_filter = KalmanDriftFilter()
+        self._optimizer_settings = None
+
         # locking for thread safety
         self.threadlock = Mutex()
 
@@ -219,6 +234,10 @@ class PoiManagerLogic(GenericLogic):
 #        print("Confocal Logic is", self._confocal_logic)
         self._save_logic = self.get_in_connector('savelogic')
 
+        for name in ('drift_prediction', 'adaptive_refocus_interval', 'drift_tolerance'):
+            if name in self._statusVariables:
+                setattr(self, name, self._statusVariables[name])
+
         # initally add crosshair to the pois
         crosshair = PoI(point=[0, 0, 0], name='crosshair')
         crosshair._key = 'crosshair'
@@ -287,6 +306,9 @@ class PoiManagerLogic(GenericLogic):
         return new_track_point.get_key()
 
     def on_deactivate(self, e):
+        self._statusVariables['drift_prediction'] = self.drift_prediction
+        self._statusVariables['adaptive_refocus_interval'] = self.adaptive_refocus_interval
+        self._statusVariables['drift_tolerance'] = self.drift_tolerance
         return
 
     def get_confocal_image_data(self):
@@ -362,13 +384,112 @@ class PoiManagerLogic(GenericLogic):
         if poikey is not None and poikey in self.track_point_list.keys():
             self.track_point_list['crosshair'].add_position_to_trace(position=self._confocal_logic.get_position())
             self._current_poi_key = poikey
-            self._optimizer_logic.start_refocus(initial_pos=self.get_poi_position(poikey=poikey), caller_tag='poimanager')
+            initial_pos = self.get_poi_position(poikey=poikey)
+            if self.drift_prediction:
+                initial_pos = self._prepare_predicted_refocus(poikey)
+            self._optimizer_logic.start_refocus(initial_pos=initial_pos, caller_tag='poimanager')
             return 0
         else:
             self.log.error('Z. The given POI ({0}) does not exist.'.format(
                 poikey))
             return -1
 
+    def _update_drift_filter(self):
+        """ Feed the position trace of the sample into the drift filter.
+
+        The whole trace is filtered again, so deleted or reloaded points are
+        taken into account.
+
+        @return int: number of positions in the trace
+        """
+        trace = self.track_point_list['sample'].get_trace()
+        self._drift_filter.reset()
+        for point in trace:
+            self._drift_filter.update(point[0], point[1:4])
+        return len(trace)
+
+    def get_predicted_sample_shift(self, t=None):
+        """ Predict the position of the sample from its drift.
+
+        @param float t: time of the prediction in s since the epoch, default now
+
+        @return tuple: predicted sample position and its standard deviation
+                       for x, y and z
+        """
+        if t is None:
+            t = time.time()
+        self._update_drift_filter()
+        return self._drift_filter.predict(t)
+
+    def get_predicted_poi_position(self, poikey=None, t=None):
+        """ Predict the position of a poi from the drift of the sample.
+
+        @param string poikey: the key of the poi
+        @param float t: time of the prediction in s since the epoch, default now
+
+        @return tuple: predicted position and its standard deviation for x, y
+                       and z
+        """
+        if poikey is not None and poikey in self.track_point_list.keys():
+            sample_pos, sample_std = self.get_predicted_sample_shift(t)
+            poi_coords = self.track_point_list[poikey].get_coords_in_sample()
+            return sample_pos + poi_coords, sample_std
+        self.log.error('The given POI ({0}) does not exist.'.format(poikey))
+        return [-1., -1., -1.], [-1., -1., -1.]
+
+    def _prepare_predicted_refocus(self, poikey):
+        """ Start position of the refocus of a poi from the drift prediction,
+        and shrink the refocus range of the optimizer to its uncertainty.
+
+        The settings of the optimizer are restored when the refocus is done.
+
+        @param string poikey: the key of the poi
+
+        @return float[3]: the predicted position
+        """
+        # a velocity needs at least two and its uncertainty three positions
+        if self._update_drift_filter() < 3:
+            return self.get_poi_position(poikey=poikey)
+        position, std = self.get_predicted_poi_position(poikey=poikey)
+
+        optimizer = self._optimizer_logic
+        if self._optimizer_settings is None:
+            self._optimizer_settings = (optimizer.refocus_XY_size, optimizer.optimizer_XY_res,
+                                        optimizer.refocus_Z_size, optimizer.optimizer_Z_res)
+        xy_size, xy_res, z_size, z_res = self._optimizer_settings
+        # the spot still has to fit into the shrunk range, the resolution
+        # shrinks with the range to keep the pixel size
+        new_xy_size = min(xy_size, self.min_refocus_size_fraction * xy_size + 6 * max(std[0:2]))
+        new_z_size = min(z_size, self.min_refocus_size_fraction * z_size + 6 * std[2])
+        optimizer.refocus_XY_size = new_xy_size
+        optimizer.optimizer_XY_res = max(int(round(xy_res * new_xy_size / xy_size)), 5)
+        optimizer.refocus_Z_size = new_z_size
+        optimizer.optimizer_Z_res = max(int(round(z_res * new_z_size / z_size)), 5)
+        return position
+
+    def _restore_optimizer_settings(self):
+        """ Restore the refocus range changed for a predicted refocus. """
+        if self._optimizer_settings is None:
+            return
+        optimizer = self._optimizer_logic
+        (optimizer.refocus_XY_size, optimizer.optimizer_XY_res,
+         optimizer.refocus_Z_size, optimizer.optimizer_Z_res) = self._optimizer_settings
+        self._optimizer_settings = None
+
+    def _update_refocus_interval(self):
+        """ Time until the next periodic refocus from the drift model.
+
+        Without enough positions to predict the drift or if the adaptive
+        interval is switched off, timer_duration is used.
+        """
+        if not self.adaptive_refocus_interval or self._update_drift_filter() < 3:
+            self.refocus_interval = self.timer_duration
+            return
+        self.refocus_interval = self._drift_filter.interval(
+            self.drift_tolerance, self.min_refocus_interval, self.max_refocus_interval,
+            axes=(0, 1))
+        self.log.debug('Next periodic refocus in {0:.0f} s.'.format(self.refocus_interval))
+
     def go_to_poi(self, poikey=None):
         """ Goes to the given poi and saves it as the current one.
 
@@ -566,6 +687,7 @@ class PoiManagerLogic(GenericLogic):
         self.log.info('Periodic refocus on {0}.'.format(self._current_poi_key))
 
         self.timer_step = 0
+        self._update_refocus_interval()
         self.timer = QtCore.QTimer()
         self.timer.setSingleShot(False)
         self.timer.timeout.connect(self._periodic_refocus_loop)
@@ -583,6 +705,7 @@ class PoiManagerLogic(GenericLogic):
         else:
             self.log.warning('No timer duration given, using {0} s.'.format(
                 self.timer_duration))
+        self._update_refocus_interval()
 
     def _periodic_refocus_loop(self):
         """ This is the looped function that does the actual periodic refocus.
@@ -590,7 +713,7 @@ class PoiManagerLogic(GenericLogic):
         If the time has run out, it refocussed the current poi.
         Otherwise it just updates the time that is left.
         """
-        self.time_left = self.timer_step - time.time() + self.timer_duration
+        self.time_left = self.timer_step - time.time() + self.refocus_interval
         self.signal_timer_updated.emit()
         if self.time_left <= 0:
             self.timer_step = time.time()
@@ -625,10 +748,12 @@ class PoiManagerLogic(GenericLogic):
 
         # If the refocus was initiated here by poimanager, then update POI and sample
         elif caller_tag == 'poimanager':
+            self._restore_optimizer_settings()
 
             if self._current_poi_key is not None and self._current_poi_key in self.track_point_list.keys():
 
                 self.set_new_position(poikey=self._current_poi_key, point=optimized_position)
+                self._update_refocus_interval()
 
                 if self.go_to_crosshair_after_refocus:
                     temp_key = self._current_poi_key
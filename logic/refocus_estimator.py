@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains closed form estimators for the position of a fluorescent
+spot in the refocus scans, which are much cheaper than a full lmfit fit.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+
+def gaussian_2d(x, y, amplitude, x_zero, y_zero, sigma_x, sigma_y, offset):
+    """ Axis aligned two dimensional gaussian with an offset. """
+    return offset + amplitude * np.exp(-(x - x_zero)**2 / (2 * sigma_x**2)
+                                       - (y - y_zero)**2 / (2 * sigma_y**2))
+
+
+def gaussian_with_slope(x, amplitude, center, sigma, offset, slope):
+    """ One dimensional gaussian on a linear background. """
+    return offset + slope * x + amplitude * np.exp(-(x - center)**2 / (2 * sigma**2))
+
+
+def _moment_correction_1d(threshold):
+    """ Ratio of sigma**2 and the second moment of a gaussian from which
+    threshold times its amplitude is subtracted and which is cut at zero.
+    """
+    cutoff = np.sqrt(-2 * np.log(threshold))
+    # the step of the integration grid cancels in the ratio
+    x = np.linspace(0, cutoff, 1000)
+    weight = np.exp(-x**2 / 2) - threshold
+    return np.sum(weight) / np.sum(x**2 * weight)
+
+
+def _moment_correction_2d(threshold):
+    """ The same as _moment_correction_1d for a two dimensional gaussian. """
+    cutoff = -np.log(threshold)
+    return ((1 - threshold - threshold * cutoff)
+            / (1 - threshold * (1 + cutoff) - threshold * cutoff**2 / 2))
+
+
+def _gauss_newton_step(model, jacobian, parameters, x, data):
+    """ One Gauss-Newton step, which is only taken if it reduces the residuals.
+
+    @return tuple: parameters and sum of the squared residuals
+    """
+    residual = data - model(x, *parameters)
+    chi_squared = np.sum(residual**2)
+    try:
+        step = np.linalg.lstsq(jacobian(x, *parameters), residual, rcond=None)[0]
+    except np.linalg.LinAlgError:
+        return parameters, chi_squared
+    new_parameters = parameters + step
+    new_chi_squared = np.sum((data - model(x, *new_parameters))**2)
+    if np.all(np.isfinite(new_parameters)) and new_chi_squared < chi_squared:
+        return new_parameters, new_chi_squared
+    return parameters, chi_squared
+
+
+def _gaussian_2d_jacobian(xy, amplitude, x_zero, y_zero, sigma_x, sigma_y, offset):
+    x, y = xy
+    dx = x - x_zero
+    dy = y - y_zero
+    peak = np.exp(-dx**2 / (2 * sigma_x**2) - dy**2 / (2 * sigma_y**2))
+    return np.column_stack((peak,
+                            amplitude * peak * dx / sigma_x**2,
+                            amplitude * peak * dy / sigma_y**2,
+                            amplitude * peak * dx**2 / sigma_x**3,
+                            amplitude * peak * dy**2 / sigma_y**3,
+                            np.ones(x.shape)))
+
+
+def _gaussian_with_slope_jacobian(x, amplitude, center, sigma, offset, slope):
+    dx = x - center
+    peak = np.exp(-dx**2 / (2 * sigma**2))
+    return np.column_stack((peak,
+                            amplitude * peak * dx / sigma**2,
+                            amplitude * peak * dx**2 / sigma**3,
+                            np.ones(x.shape),
+                            x))
+
+
+def _quality(data, model_data, amplitude, min_snr, min_r_squared):
+    """ R squared of a model and True if it describes a clear peak. """
+    residual = data - model_data
+    total = np.sum((data - np.mean(data))**2)
+    r_squared = 1 - np.sum(residual**2) / total if total > 0 else 0
+    noise = 1.4826 * np.median(np.abs(residual - np.median(residual)))
+    return r_squared, bool(r_squared >= min_r_squared and amplitude > min_snr * noise)
+
+
+def estimate_gaussian_2d(x_values, y_values, image, threshold=0.3, polish=True,
+                         min_r_squared=0.7, min_snr=3):
+    """ Position of a spot in a xy refocus image from its image moments.
+
+    The offset is the median of the border pixels. The pixels which exceed
+    the offset by more than threshold times the amplitude are weighted with
+    their counts above that level, the weighted mean of their positions is the
+    center and the weighted variance gives the widths. Optionally a single
+    Gauss-Newton step of the full gaussian model refines all parameters.
+
+    @param numpy.ndarray x_values: x position of each column
+    @param numpy.ndarray y_values: y position of each row
+    @param numpy.ndarray image: counts with shape (y, x)
+    @param float threshold: fraction of the amplitude below which pixels are
+                            ignored
+    @param bool polish: do a Gauss-Newton step after the moments
+    @param float min_r_squared: minimal coefficient of determination
+    @param float min_snr: minimal amplitude in units of the noise
+
+    @return dict: 'amplitude', 'x_zero', 'y_zero', 'sigma_x', 'sigma_y',
+                  'offset', 'r_squared' and 'success', which is False if a
+                  quality check failed and a full fit should be done
+    """
+    x_values = np.asarray(x_values, dtype=float)
+    y_values = np.asarray(y_values, dtype=float)
+    image = np.asarray(image, dtype=float)
+    if image.shape != (len(y_values), len(x_values)) or min(image.shape) < 3:
+        return {'success': False}
+
+    border = np.concatenate((image[0], image[-1], image[1:-1, 0], image[1:-1, -1]))
+    x, y = np.meshgrid(x_values, y_values)
+    pixel_x = abs(x_values[-1] - x_values[0]) / (len(x_values) - 1)
+    pixel_y = abs(y_values[-1] - y_values[0]) / (len(y_values) - 1)
+    return _estimate_gaussian_2d(x.ravel(), y.ravel(), image.ravel(), np.median(border),
+                                 pixel_x, pixel_y, threshold, polish, min_r_squared, min_snr)
+
+
+def estimate_gaussian_2d_points(x, y, counts, spacing, threshold=0.3, polish=True,
+                                min_r_squared=0.7, min_snr=3):
+    """ Position of a spot from counts at scattered positions, e.g. along a
+    spiral around the spot.
+
+    Works like estimate_gaussian_2d, the offset is the median of the points in
+    the outer fifth of the distance from the middle of the positions. The
+    points should cover the area evenly.
+
+    @param numpy.ndarray x: x position of each point
+    @param numpy.ndarray y: y position of each point
+    @param numpy.ndarray counts: counts of each point
+    @param float spacing: typical distance between neighbouring points
+    @param float threshold: fraction of the amplitude below which points are
+                            ignored
+    @param bool polish: do a Gauss-Newton step after the moments
+    @param float min_r_squared: minimal coefficient of determination
+    @param float min_snr: minimal amplitude in units of the noise
+
+    @return dict: the same as estimate_gaussian_2d
+    """
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    counts = np.asarray(counts, dtype=float).ravel()
+    if not len(x) == len(y) == len(counts) or len(counts) < 9:
+        return {'success': False}
+
+    distance = np.hypot(x - (x.min() + x.max()) / 2, y - (y.min() + y.max()) / 2)
+    offset = np.median(counts[distance >= 0.8 * distance.max()])
+    return _estimate_gaussian_2d(x, y, counts, offset, spacing, spacing,
+                                 threshold, polish, min_r_squared, min_snr)
+
+
+def _estimate_gaussian_2d(x, y, counts, offset, spacing_x, spacing_y, threshold, polish,
+                          min_r_squared, min_snr):
+    """ Moment estimate of a two dimensional gaussian for flat arrays of
+    positions and counts with a known offset.
+    """
+    result = {'success': False}
+    amplitude = counts.max() - offset
+    if not amplitude > 0:
+        return result
+    weight = np.clip(counts - offset - threshold * amplitude, 0, None)
+    total = weight.sum()
+    if total <= 0:
+        return result
+    x_zero = np.sum(weight * x) / total
+    y_zero = np.sum(weight * y) / total
+    correction = _moment_correction_2d(threshold)
+    # a spot within a single pixel still has a width of about half a pixel
+    sigma_x = max(np.sqrt(correction * np.sum(weight * (x - x_zero)**2) / total), spacing_x / 2)
+    sigma_y = max(np.sqrt(correction * np.sum(weight * (y - y_zero)**2) / total), spacing_y / 2)
+
+    parameters = np.array((amplitude, x_zero, y_zero, sigma_x, sigma_y, offset))
+    if polish:
+        parameters, chi_squared = _gauss_newton_step(
+            lambda xy, *p: gaussian_2d(xy[0], xy[1], *p), _gaussian_2d_jacobian,
+            parameters, (x, y), counts)
+    amplitude, x_zero, y_zero, sigma_x, sigma_y, offset = parameters
+    sigma_x, sigma_y = abs(sigma_x), abs(sigma_y)
+
+    r_squared, clear_peak = _quality(counts, gaussian_2d(x, y, *parameters), amplitude,
+                                     min_snr, min_r_squared)
+    inside = x.min() <= x_zero <= x.max() and y.min() <= y_zero <= y.max()
+    sensible_width = (spacing_x / 4 < sigma_x < np.ptp(x)
+                      and spacing_y / 4 < sigma_y < np.ptp(y))
+    result.update({'amplitude': amplitude, 'x_zero': x_zero, 'y_zero': y_zero,
+                   'sigma_x': sigma_x, 'sigma_y': sigma_y, 'offset': offset,
+                   'r_squared': r_squared,
+                   'success': clear_peak and inside and sensible_width})
+    return result
+
+
+def estimate_gaussian_with_slope(x_values, data, threshold=0.3, polish=True,
+                                 min_r_squared=0.7, min_snr=3):
+    """ Position of a peak on a linear background, e.g. in a z refocus scan.
+
+    The background is the straight line through the mean of the first and the
+    last fifth of the data. The center and the width follow from the moments
+    of the data above the background, weighted like in estimate_gaussian_2d.
+
+    @param numpy.ndarray x_values: positions of the data points
+    @param numpy.ndarray data: counts of each position
+    @param float threshold: fraction of the amplitude below which points are
+                            ignored
+    @param bool polish: do a Gauss-Newton step after the moments
+    @param float min_r_squared: minimal coefficient of determination
+    @param float min_snr: minimal amplitude in units of the noise
+
+    @return dict: 'amplitude', 'center', 'sigma', 'offset', 'slope',
+                  'r_squared' and 'success', which is False if a quality check
+                  failed and a full fit should be done
+    """
+    x_values = np.asarray(x_values, dtype=float)
+    data = np.asarray(data, dtype=float)
+    result = {'success': False}
+    if len(x_values) != len(data) or len(data) < 5 or x_values[-1] == x_values[0]:
+        return result
+
+    edge = max(len(data) // 5, 2)
+    x_left, x_right = np.mean(x_values[:edge]), np.mean(x_values[-edge:])
+    data_left, data_right = np.mean(data[:edge]), np.mean(data[-edge:])
+    slope = (data_right - data_left) / (x_right - x_left)
+    offset = data_left - slope * x_left
+    peak = data - offset - slope * x_values
+    amplitude = peak.max()
+    if not amplitude > 0:
+        return result
+    weight = np.clip(peak - threshold * amplitude, 0, None)
+    total = weight.sum()
+    if total <= 0:
+        return result
+    center = np.sum(weight * x_values) / total
+    step = abs(x_values[-1] - x_values[0]) / (len(x_values) - 1)
+    sigma = max(np.sqrt(_moment_correction_1d(threshold)
+                        * np.sum(weight * (x_values - center)**2) / total), step / 2)
+
+    parameters = np.array((amplitude, center, sigma, offset, slope))
+    if polish:
+        parameters, chi_squared = _gauss_newton_step(
+            gaussian_with_slope, _gaussian_with_slope_jacobian, parameters, x_values, data)
+    amplitude, center, sigma, offset, slope = parameters
+    sigma = abs(sigma)
+
+    r_squared, clear_peak = _quality(data, gaussian_with_slope(x_values, *parameters),
+                                     amplitude, min_snr, min_r_squared)
+    inside = min(x_values[0], x_values[-1]) <= center <= max(x_values[0], x_values[-1])
+    sensible_width = step / 4 < sigma < abs(x_values[-1] - x_values[0])
+    result.update({'amplitude': amplitude, 'center': center, 'sigma': sigma,
+                   'offset': offset, 'slope': slope, 'r_squared': r_squared,
+                   'success': clear_peak and inside and sensible_width})
+    return result
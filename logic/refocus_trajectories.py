@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains scan trajectories for the xy refocus, which locate a single
+spot with fewer points than a full image.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+
+def clipped_line(center, size, resolution, position_range):
+    """ Positions of a line scan around a center inside of the scanner range.
+
+    @param float center: middle of the line
+    @param float size: length of the line
+    @param int resolution: number of points
+    @param list position_range: minimum and maximum position of the scanner
+
+    @return numpy.ndarray: the positions
+    """
+    start = np.clip(center - 0.5 * size, position_range[0], position_range[1])
+    stop = np.clip(center + 0.5 * size, position_range[0], position_range[1])
+    return np.linspace(start, stop, num=resolution)
+
+
+def line_path(x, y, z):
+    """ Scanner path through the given positions, scalars are kept constant.
+
+    @param x: x positions or a fixed x position
+    @param y: y positions or a fixed y position
+    @param z: z positions or a fixed z position
+
+    @return numpy.ndarray: path with the shape (4, points)
+    """
+    length = max(np.size(x), np.size(y), np.size(z))
+    path = np.zeros((4, length))
+    path[0], path[1], path[2] = x, y, z
+    return path
+
+
+def spiral_path(x0, y0, z0, size, ring_spacing, point_spacing, x_range, y_range):
+    """ Archimedean spiral from the center outwards with equally spaced points.
+
+    The spiral covers a circle with the diameter size. Points outside of the
+    scanner range are moved to its border.
+
+    @param float x0: x position of the center
+    @param float y0: y position of the center
+    @param float z0: z position of the spiral
+    @param float size: diameter of the spiral
+    @param float ring_spacing: radial distance between neighbouring turns
+    @param float point_spacing: distance between neighbouring points
+    @param list x_range: minimum and maximum x position of the scanner
+    @param list y_range: minimum and maximum y position of the scanner
+
+    @return numpy.ndarray: path with the shape (4, points)
+    """
+    # r = b * phi with the arc length b / 2 * phi**2 for large phi
+    b = ring_spacing / (2 * np.pi)
+    phi_max = 0.5 * size / b
+    length = b / 2 * phi_max**2
+    phi = np.sqrt(2 * np.linspace(0, length, max(int(round(length / point_spacing)), 2) + 1) / b)
+    x = np.clip(x0 + b * phi * np.cos(phi), x_range[0], x_range[1])
+    y = np.clip(y0 + b * phi * np.sin(phi), y_range[0], y_range[1])
+    return line_path(x, y, z0)
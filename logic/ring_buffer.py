@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains circular buffers and running filters for continuously
+acquired traces.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import bisect
+from collections import deque
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed length circular buffer for one or several channels.
+
+    New samples are written at the head index, so appending costs only the
+    size of the new data and not the length of the buffer. A chronologically
+    ordered copy of the data is only built when it is requested.
+    """
+    def __init__(self, length, channels=1, dtype=float):
+        """
+        @param int length: number of samples kept per channel
+        @param int channels: number of channels
+        @param dtype: numpy data type of the samples
+        """
+        self.length = int(length)
+        self.channels = int(channels)
+        self._data = np.zeros((self.channels, self.length), dtype=dtype)
+        self._head = 0
+        self.filled = 0
+        self.total = 0
+
+    def clear(self):
+        """ Set all samples to zero and reset the head index. """
+        self._data[:] = 0
+        self._head = 0
+        self.filled = 0
+        self.total = 0
+
+    def append(self, samples):
+        """ Add new samples to the end of the buffer.
+
+        @param numpy.ndarray samples: one value per channel with shape
+                                      (channels,) or a block of samples with
+                                      shape (channels, n)
+        """
+        samples = np.asarray(samples)
+        if samples.ndim < 2:
+            samples = samples.reshape(self.channels, -1)
+        number = samples.shape[1]
+        if number == 0:
+            return
+        if number >= self.length:
+            self._data[:] = samples[:, -self.length:]
+            self._head = 0
+        else:
+            end = self._head + number
+            if end <= self.length:
+                self._data[:, self._head:end] = samples
+            else:
+                split = self.length - self._head
+                self._data[:, self._head:] = samples[:, :split]
+                self._data[:, :end - self.length] = samples[:, split:]
+            self._head = end % self.length
+        self.filled = min(self.filled + number, self.length)
+        self.total += number
+
+    def latest(self, number=1):
+        """ The most recent samples in chronological order.
+
+        @param int number: number of samples per channel
+
+        @return numpy.ndarray: array with shape (channels, number)
+        """
+        indices = (np.arange(self._head - number, self._head)) % self.length
+        return self._data[:, indices]
+
+    def view(self):
+        """ All samples in chronological order, the newest sample is last.
+
+        @return numpy.ndarray: new array with shape (channels, length)
+        """
+        if self._head == 0:
+            return self._data.copy()
+        return np.concatenate((self._data[:, self._head:], self._data[:, :self._head]), axis=1)
+
+
+class RunningFilter:
+    """
+    Running median or mean over the last samples of a stream.
+
+    The median keeps the window sorted. Finding the positions of the new and
+    the oldest sample is a binary search, but inserting and removing them
+    moves the items behind them, so every sample costs O(window) instead of
+    the O(window log window) of sorting the window. For the short windows of
+    the counter trace this is faster than a heap or skip list. The mean keeps
+    a running sum.
+    """
+    def __init__(self, window, method='median'):
+        """
+        @param int window: number of samples the filter is calculated from
+        @param str method: 'median' or 'mean'
+        """
+        if method not in ('median', 'mean'):
+            raise ValueError('Unknown running filter method "{0}".'.format(method))
+        self.window = max(int(window), 1)
+        self.method = method
+        self.clear()
+
+    def clear(self):
+        """ Forget all samples. """
+        self._samples = deque()
+        self._sorted = list()
+        self._sum = 0.
+
+    def push(self, value):
+        """ Add a new sample.
+
+        The median costs O(window) per sample, the mean O(1).
+
+        @param float value: the new sample
+
+        @return float: median or mean of the current window
+        """
+        value = float(value)
+        self._samples.append(value)
+        if len(self._samples) > self.window:
+            oldest = self._samples.popleft()
+        else:
+            oldest = None
+
+        if self.method == 'mean':
+            self._sum += value
+            if oldest is not None:
+                self._sum -= oldest
+            return self._sum / len(self._samples)
+
+        if oldest is not None:
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+        bisect.insort(self._sorted, value)
+        number = len(self._sorted)
+        middle = number // 2
+        if number % 2:
+            return self._sorted[middle]
+        return 0.5 * (self._sorted[middle - 1] + self._sorted[middle])
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains a compact storage for scanned images, which behaves like
+the (rows, columns, 4) arrays of x, y, z and counts used by the confocal logic.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+
+class ScanImage:
+    """
+    Scanned image which only stores the counts of every pixel.
+
+    The positions x, y and z of a raster scan are the sum of a part which only
+    depends on the row (e.g. y in a xy scan) and a part which only depends on
+    the column (e.g. x), so they are kept as one vector per row and column
+    instead of a full plane each. Indexing with [rows, columns, plane] works
+    like for an array with shape (rows, columns, 4), where the planes 0, 1
+    and 2 are x, y and z and plane 3 holds the counts. The position planes are
+    only calculated for the indexed pixels.
+
+    Writing to a position plane keeps the compact form as long as it stays a
+    sum of a row and a column part, e.g. when the z value of a whole row is
+    set. Otherwise the plane is stored in full from then on.
+    """
+    ndim = 3
+
+    def __init__(self, row_positions, column_positions, counts=None, dtype=np.float64):
+        """
+        @param numpy.ndarray row_positions: x, y and z part of each row with
+                                            shape (3, rows)
+        @param numpy.ndarray column_positions: x, y and z part of each column
+                                               with shape (3, columns)
+        @param numpy.ndarray counts: counts of each pixel with shape
+                                     (rows, columns), zeros if None
+        @param dtype: numpy data type of the counts
+        """
+        self._rows = np.array(row_positions, dtype=float).reshape(3, -1)
+        self._columns = np.array(column_positions, dtype=float).reshape(3, -1)
+        shape = (self._rows.shape[1], self._columns.shape[1])
+        if counts is None:
+            self.counts = np.zeros(shape, dtype=dtype)
+        else:
+            self.counts = np.array(counts, dtype=dtype).reshape(shape)
+        # position planes which are no longer a sum of row and column part
+        self._planes = dict()
+
+    @classmethod
+    def from_array(cls, image, dtype=np.float64):
+        """ Create a compact image from a (rows, columns, 4) array.
+
+        @param numpy.ndarray image: the x, y, z and counts planes
+
+        @return ScanImage: the image, position planes which are no sum of a
+                           row and a column part are stored in full
+        """
+        image = np.asarray(image, dtype=float)
+        rows = image[:, 0, :3].transpose()
+        columns = image[0, :, :3].transpose() - image[0, 0, :3, np.newaxis]
+        compact = cls(rows, columns, image[:, :, 3], dtype=dtype)
+        for plane in range(3):
+            if not np.allclose(compact[:, :, plane], image[:, :, plane]):
+                compact._planes[plane] = image[:, :, plane].copy()
+        return compact
+
+    @classmethod
+    def from_state(cls, arrays, prefix=''):
+        """ Create an image from the arrays returned by get_state.
+
+        @param dict arrays: array name as key and numpy.ndarray as item, e.g.
+                            a file opened with numpy.load
+        @param str prefix: prefix of the array names of this image
+
+        @return ScanImage: the image
+        """
+        image = cls(arrays[prefix + 'rows'], arrays[prefix + 'columns'], arrays[prefix + 'counts'],
+                    dtype=arrays[prefix + 'counts'].dtype)
+        for plane in range(3):
+            if prefix + 'plane{0}'.format(plane) in arrays:
+                image._planes[plane] = np.array(arrays[prefix + 'plane{0}'.format(plane)])
+        return image
+
+    def get_state(self, prefix=''):
+        """ Arrays which fully describe the image, e.g. to save it with
+        numpy.savez_compressed.
+
+        @param str prefix: added in front of each array name
+
+        @return dict: array name as key and numpy.ndarray as item
+        """
+        arrays = {prefix + 'rows': self._rows,
+                  prefix + 'columns': self._columns,
+                  prefix + 'counts': self.counts}
+        for plane, values in self._planes.items():
+            arrays[prefix + 'plane{0}'.format(plane)] = values
+        return arrays
+
+    @property
+    def shape(self):
+        return self.counts.shape + (4,)
+
+    @property
+    def size(self):
+        return self.counts.size * 4
+
+    @property
+    def dtype(self):
+        return np.dtype(np.float64)
+
+    @property
+    def nbytes(self):
+        """ Memory actually used by the image in bytes. """
+        return (self.counts.nbytes + self._rows.nbytes + self._columns.nbytes
+                + sum(plane.nbytes for plane in self._planes.values()))
+
+    def copy(self):
+        """ Copy of the image which does not share memory with this one. """
+        image = ScanImage(self._rows, self._columns, self.counts, dtype=self.counts.dtype)
+        image._planes = {index: plane.copy() for index, plane in self._planes.items()}
+        return image
+
+    def position_plane(self, plane):
+        """ Full position plane.
+
+        @param int plane: 0, 1 or 2 for x, y or z
+
+        @return numpy.ndarray: array with shape (rows, columns)
+        """
+        return self._get_plane(plane, slice(None), slice(None))
+
+    def _get_plane(self, plane, rows, columns):
+        plane = plane % 4
+        if plane == 3:
+            return self.counts[rows, columns]
+        if plane in self._planes:
+            return self._planes[plane][rows, columns]
+        return np.add.outer(self._rows[plane][rows], self._columns[plane][columns])
+
+    def _set_plane(self, plane, rows, columns, value):
+        plane = plane % 4
+        if plane == 3:
+            self.counts[rows, columns] = value
+            return
+        if plane not in self._planes:
+            # a row which is set as a whole only changes the row part
+            if (isinstance(rows, (int, np.integer)) and isinstance(columns, slice)
+                    and columns == slice(None)):
+                offset = np.broadcast_to(value, self._columns[plane].shape) - self._columns[plane]
+                if np.allclose(offset, offset[0]):
+                    self._rows[plane][rows] = offset[0]
+                    return
+            self._planes[plane] = self.position_plane(plane)
+        self._planes[plane][rows, columns] = value
+
+    @staticmethod
+    def _split_key(key):
+        if not isinstance(key, tuple):
+            key = (key, )
+        if any(item is Ellipsis for item in key):
+            index = [item is Ellipsis for item in key].index(True)
+            key = key[:index] + (slice(None), ) * (4 - len(key)) + key[index + 1:]
+        return key + (slice(None), ) * (3 - len(key))
+
+    def __getitem__(self, key):
+        rows, columns, planes = self._split_key(key)
+        if isinstance(planes, (int, np.integer)):
+            return self._get_plane(planes, rows, columns)
+        return np.stack([self._get_plane(plane, rows, columns)
+                         for plane in np.arange(4)[planes]], axis=-1)
+
+    def __setitem__(self, key, value):
+        rows, columns, planes = self._split_key(key)
+        if isinstance(planes, (int, np.integer)):
+            self._set_plane(planes, rows, columns, value)
+            return
+        planes = np.arange(4)[planes]
+        value = np.asarray(value, dtype=float)
+        for index, plane in enumerate(planes):
+            self._set_plane(plane, rows, columns,
+                            value[..., index] if value.ndim > 0 and value.shape[-1] == len(planes)
+                            else value)
+
+    def __len__(self):
+        return self.counts.shape[0]
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def __array__(self, dtype=None, copy=None):
+        image = self[:, :, :]
+        return image if dtype is None else image.astype(dtype)
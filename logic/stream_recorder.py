@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains a recorder which streams continuously acquired data to a
+binary file on disk.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+
+import numpy as np
+
+
+class StreamRecorder:
+    """
+    Appends rows of a fixed number of columns to a binary file.
+
+    Rows are collected in a preallocated chunk in memory, which is written to
+    the file whenever it is full, so the memory usage does not grow with the
+    length of the recording. The file contains the plain rows as little endian
+    float64 values and can be loaded with
+
+        numpy.fromfile(path, dtype='<f8').reshape(-1, columns)
+
+    The recorder behaves like a read only 2D array of all rows recorded so far:
+    it has a length, supports indexing and slicing and can be converted with
+    numpy.array. Only the requested rows are read back from the file.
+    """
+    dtype = np.dtype('<f8')
+
+    def __init__(self, filepath, columns, chunk_length=4096):
+        """
+        @param str filepath: path of the binary file, existing files are appended
+        @param int columns: number of values in each row
+        @param int chunk_length: number of rows kept in memory before writing
+        """
+        self.filepath = filepath
+        self.columns = int(columns)
+        self._chunk = np.empty((int(chunk_length), self.columns), dtype=self.dtype)
+        self._chunk_rows = 0
+        self._file = None
+        if os.path.exists(filepath):
+            self._file_rows = os.path.getsize(filepath) // (self.dtype.itemsize * self.columns)
+        else:
+            self._file_rows = 0
+        self.open()
+
+    @property
+    def closed(self):
+        return self._file is None
+
+    def open(self):
+        """ Open the file for appending, if it is not open already. """
+        if self._file is None:
+            self._file = open(self.filepath, 'ab')
+
+    def append(self, rows):
+        """ Add rows to the recording.
+
+        @param numpy.ndarray rows: one row with shape (columns,) or several
+                                   rows with shape (n, columns)
+        """
+        rows = np.asarray(rows, dtype=self.dtype).reshape(-1, self.columns)
+        while len(rows) > 0:
+            number = min(len(rows), len(self._chunk) - self._chunk_rows)
+            self._chunk[self._chunk_rows:self._chunk_rows + number] = rows[:number]
+            self._chunk_rows += number
+            rows = rows[number:]
+            if self._chunk_rows == len(self._chunk):
+                self._write_chunk()
+
+    def _write_chunk(self):
+        if self._chunk_rows == 0:
+            return
+        self.open()
+        self._chunk[:self._chunk_rows].tofile(self._file)
+        self._file_rows += self._chunk_rows
+        self._chunk_rows = 0
+
+    def flush(self):
+        """ Write all rows to the file. """
+        self._write_chunk()
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        """ Write all rows and close the file. """
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def move(self, filepath):
+        """ Close the recording and move its file to a new path.
+
+        @param str filepath: the new path of the binary file
+        """
+        self.close()
+        os.replace(self.filepath, filepath)
+        self.filepath = filepath
+
+    def delete(self):
+        """ Close the recording and remove its file. """
+        self.close()
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+        self._file_rows = 0
+
+    def __len__(self):
+        return self._file_rows + self._chunk_rows
+
+    def read(self, start=0, stop=None):
+        """ Rows of the recording.
+
+        @param int start: index of the first row
+        @param int stop: index after the last row, all rows if None
+
+        @return numpy.ndarray: new array with shape (stop - start, columns)
+        """
+        length = len(self)
+        start, stop, _ = slice(start, stop).indices(length)
+        stop = max(start, stop)
+        data = np.empty((stop - start, self.columns), dtype=self.dtype)
+        if start < self._file_rows:
+            file_stop = min(stop, self._file_rows)
+            if self._file is not None:
+                self._file.flush()
+            stored = np.memmap(self.filepath, dtype=self.dtype, mode='r',
+                               shape=(self._file_rows, self.columns))
+            data[:file_stop - start] = stored[start:file_stop]
+            del stored
+        if stop > self._file_rows:
+            chunk_start = max(start, self._file_rows)
+            data[chunk_start - start:] = \
+                self._chunk[chunk_start - self._file_rows:stop - self._file_rows]
+        return data
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step > 0:
+                return self.read(start, stop)[::step]
+            return self.read()[item]
+        if isinstance(item, tuple):
+            return self[item[0]][item[1:]]
+        index = int(item)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Row index {0} out of range.'.format(item))
+        return self.read(index, index + 1)[0]
+
+    def __iter__(self):
+        for start in range(0, len(self), len(self._chunk)):
+            for row in self.read(start, start + len(self._chunk)):
+                yield row
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.read()
+        return data if dtype is None else data.astype(dtype)
+
+    @property
+    def shape(self):
+        return len(self), self.columns
+
+    def decimate(self, max_rows):
+        """ Block averages of the recording with a bounded number of rows.
+
+        @param int max_rows: maximum number of returned rows
+
+        @return numpy.ndarray: the recording averaged over blocks of
+                               ceil(len / max_rows) consecutive rows
+        """
+        length = len(self)
+        factor = max(int(np.ceil(length / max_rows)), 1) if max_rows > 0 else length
+        blocks = length // factor if factor > 0 else 0
+        decimated = np.empty((blocks, self.columns), dtype=self.dtype)
+        # average block wise in slices of bounded size
+        step = max(len(self._chunk) // factor, 1) * factor
+        for start in range(0, blocks * factor, step):
+            stop = min(start + step, blocks * factor)
+            data = self.read(start, stop)
+            decimated[start // factor:stop // factor] = \
+                data.reshape(-1, factor, self.columns).mean(axis=1)
+        # the remaining rows form a shorter last block
+        if length > blocks * factor:
+            rest = self.read(blocks * factor, length).mean(axis=0)
+            decimated = np.vstack((decimated, rest))
+        return decimated
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains a min/max/mean pyramid which provides continuously
+acquired traces at the resolution a plot can actually display.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+from logic.ring_buffer import RingBuffer
+
+
+class DecimationPyramid:
+    """
+    Multi resolution min/max/mean representation of a stream of samples.
+
+    Level 0 holds the raw samples. Every level above combines `factor`
+    consecutive entries of the level below into one block, for which the
+    minimum, the maximum and the sum of the samples are kept. Appending costs
+    on average a constant amount of work per sample and every request for
+    display data is answered from the coarsest level which still has enough
+    blocks, so the amount of data handed to a plot only depends on the number
+    of requested points and not on the length of the trace.
+
+    Positions of the returned data are given in samples relative to the
+    newest sample, which has the position 0; older samples are negative.
+    """
+    def __init__(self, length, channels=1, factor=4, history=None):
+        """
+        @param int length: number of raw samples kept per channel
+        @param int channels: number of channels
+        @param int factor: number of entries combined into one block of the
+                           next level
+        @param int history: number of samples covered by the coarse levels,
+                            the same as length if None
+        """
+        self.length = max(int(length), 1)
+        self.channels = int(channels)
+        self.factor = max(int(factor), 2)
+        self.history = self.length if history is None else max(int(history), self.length)
+
+        self._raw = RingBuffer(self.length, channels=self.channels)
+        self._levels = [None]
+        block_size = 1
+        while block_size < self.history:
+            block_size *= self.factor
+            capacity = self.history // block_size + 2
+            # rows are minimum, maximum and sum for each channel
+            self._levels.append(RingBuffer(capacity, channels=3 * self.channels))
+        self.clear()
+
+    def clear(self):
+        """ Forget all samples. """
+        self._raw.clear()
+        for level in self._levels[1:]:
+            level.clear()
+        self._pending = [np.empty((3 * self.channels, 0)) for level in self._levels]
+        self.total = 0
+
+    def append(self, samples):
+        """ Add new samples to the end of the stream.
+
+        @param numpy.ndarray samples: one value per channel with shape
+                                      (channels,) or a block of samples with
+                                      shape (channels, n)
+        """
+        samples = np.asarray(samples, dtype=float).reshape(self.channels, -1)
+        if samples.shape[1] == 0:
+            return
+        self._raw.append(samples)
+        self.total += samples.shape[1]
+
+        entries = np.concatenate((samples, samples, samples))
+        channels = self.channels
+        for index in range(1, len(self._levels)):
+            entries = np.concatenate((self._pending[index], entries), axis=1)
+            blocks = entries.shape[1] // self.factor
+            self._pending[index] = entries[:, blocks * self.factor:]
+            if blocks == 0:
+                break
+            entries = entries[:, :blocks * self.factor].reshape(3 * channels, blocks, self.factor)
+            entries = np.concatenate((entries[:channels].min(axis=2),
+                                      entries[channels:2 * channels].max(axis=2),
+                                      entries[2 * channels:].sum(axis=2)))
+            self._levels[index].append(entries)
+
+    def _tail(self, level):
+        """ Minimum, maximum and sum of the samples which are not yet part of a
+        complete block of the given level.
+
+        @return numpy.ndarray: array with shape (3 * channels,), None if empty
+        """
+        pending = [self._pending[index] for index in range(1, level + 1)
+                   if self._pending[index].shape[1] > 0]
+        if not pending:
+            return None
+        pending = np.concatenate(pending, axis=1)
+        channels = self.channels
+        return np.concatenate((pending[:channels].min(axis=1),
+                               pending[channels:2 * channels].max(axis=1),
+                               pending[2 * channels:].sum(axis=1)))
+
+    def get_blocks(self, max_blocks, number=None):
+        """ Block wise minimum, maximum and mean of the newest samples.
+
+        @param int max_blocks: maximum number of returned blocks
+        @param int number: number of newest samples to cover, all samples
+                           which are still available if None
+
+        @return tuple: block size in samples, block center positions, as well
+                       as minimum, maximum and mean with shape (channels, blocks)
+        """
+        max_blocks = max(int(max_blocks), 1)
+        available = min(self.total, self.history)
+        number = available if number is None else min(int(number), available)
+
+        if number <= min(max_blocks, self._raw.filled):
+            samples = self._raw.latest(number)
+            positions = np.arange(-number + 1, 1, dtype=float)
+            return 1, positions, samples, samples, samples
+
+        channels = self.channels
+        for index in range(1, len(self._levels)):
+            block_size = self.factor ** index
+            complete = self.total // block_size
+            first = (self.total - number) // block_size
+            first = max(first, complete - self._levels[index].filled)
+            blocks = complete - first
+            tail_length = self.total - complete * block_size
+            if blocks + (tail_length > 0) <= max_blocks or index == len(self._levels) - 1:
+                break
+        # drop the oldest blocks if even the coarsest level has too many
+        blocks = min(blocks, max_blocks - (tail_length > 0))
+        data = self._levels[index].latest(blocks)
+        starts = (complete - blocks + np.arange(blocks)) * block_size
+        lengths = np.full(blocks, block_size)
+        tail = self._tail(index)
+        if tail is not None:
+            data = np.concatenate((data, tail[:, np.newaxis]), axis=1)
+            starts = np.append(starts, complete * block_size)
+            lengths = np.append(lengths, tail_length)
+        positions = starts + (lengths - 1) / 2 - (self.total - 1)
+        return (block_size, positions, data[:channels], data[channels:2 * channels],
+                data[2 * channels:] / lengths)
+
+    def get_display_data(self, max_points, number=None, mode='minmax'):
+        """ The newest samples reduced to a bounded number of points for plotting.
+
+        @param int max_points: maximum number of returned points per channel,
+                               e.g. twice the width of the plot in pixels
+        @param int number: number of newest samples to cover, all samples
+                           which are still available if None
+        @param str mode: 'minmax' returns the minimum and the maximum of each
+                         block, so that peaks remain visible, 'mean' returns
+                         the block averages
+
+        @return tuple(numpy.ndarray, numpy.ndarray): positions with shape
+                    (points,) and data with shape (channels, points)
+        """
+        if mode == 'minmax':
+            block_size, positions, minimum, maximum, mean = self.get_blocks(
+                max(int(max_points) // 2, 1), number)
+            if block_size == 1:
+                return positions, mean
+            data = np.empty((self.channels, 2 * len(positions)))
+            data[:, 0::2] = minimum
+            data[:, 1::2] = maximum
+            return np.repeat(positions, 2), data
+        elif mode == 'mean':
+            block_size, positions, minimum, maximum, mean = self.get_blocks(max_points, number)
+            return positions, mean
+        raise ValueError('Unknown display mode "{0}".'.format(mode))
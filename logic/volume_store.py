@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains an on-disk 3D array for volumetric confocal scans, which
+is filled slice by slice.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+class VolumeStore:
+    """
+    Volume of counts with the shape (z, y, x) in a memory mapped .npy file.
+
+    Every xy slice is written to the file as soon as it is complete, so only
+    one slice has to be kept in memory. The maximum intensity projections
+    along z, y and x are updated with every slice, a rewritten slice makes
+    the projection along z anew from the file. The numbers of the
+    completed slices are kept in a small metadata file, so an interrupted scan
+    can be resumed at the first missing slice.
+    """
+    _metadata_file = 'volume.json'
+    _data_file = 'volume.npy'
+
+    def __init__(self, directory, x_positions=None, y_positions=None, z_positions=None,
+                 parameters=None, dtype=np.float32):
+        """
+        @param str directory: directory of the volume, an existing volume in it
+                              is opened and keeps its own positions
+        @param numpy.ndarray x_positions: x position of each column
+        @param numpy.ndarray y_positions: y position of each row
+        @param numpy.ndarray z_positions: z position of each slice
+        @param dict parameters: scan parameters kept with the volume, they
+                                have to be serializable with json
+        @param dtype: numpy data type of the counts in the file
+        """
+        self.directory = directory
+        metadata_path = os.path.join(directory, self._metadata_file)
+        if os.path.isfile(metadata_path):
+            with open(metadata_path, 'r') as metadata_file:
+                metadata = json.load(metadata_file)
+            self.x_positions = np.array(metadata['x_positions'])
+            self.y_positions = np.array(metadata['y_positions'])
+            self.z_positions = np.array(metadata['z_positions'])
+            self.parameters = metadata['parameters']
+            self.completed = metadata['completed']
+            self.data = np.load(os.path.join(directory, self._data_file), mmap_mode='r+')
+            self.projections = dict(np.load(os.path.join(directory, 'projections.npz')))
+        else:
+            self.x_positions = np.asarray(x_positions, dtype=float)
+            self.y_positions = np.asarray(y_positions, dtype=float)
+            self.z_positions = np.asarray(z_positions, dtype=float)
+            self.parameters = {} if parameters is None else parameters
+            self.completed = []
+            os.makedirs(directory, exist_ok=True)
+            self.data = np.lib.format.open_memmap(
+                os.path.join(directory, self._data_file), mode='w+', dtype=dtype,
+                shape=(len(self.z_positions), len(self.y_positions), len(self.x_positions)))
+            # NaN marks the parts of the projections whose slices are missing
+            self.projections = {
+                'xy': np.full(self.data.shape[1:], np.nan),
+                'xz': np.full((self.data.shape[0], self.data.shape[2]), np.nan),
+                'yz': np.full((self.data.shape[0], self.data.shape[1]), np.nan)}
+            self._save_metadata()
+
+    @classmethod
+    def exists(cls, directory):
+        """ True if the directory contains a volume. """
+        return os.path.isfile(os.path.join(directory, cls._metadata_file))
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def finished(self):
+        return len(self.completed) == self.data.shape[0]
+
+    def next_slice(self):
+        """ Index of the first slice which is not scanned yet.
+
+        @return int: the index, None if all slices are complete
+        """
+        for index in range(self.data.shape[0]):
+            if index not in self.completed:
+                return index
+        return None
+
+    def write_slice(self, index, counts):
+        """ Store a complete slice and update the projections.
+
+        @param int index: index of the slice
+        @param numpy.ndarray counts: counts with shape (y, x)
+        """
+        counts = np.asarray(counts)
+        self.data[index] = counts
+        self.data.flush()
+        if index in self.completed:
+            # the old counts of a rewritten slice may still be the maxima, so
+            # the projection is made anew from all stored slices
+            self.projections['xy'] = np.max(self.data[sorted(self.completed)], axis=0)
+        else:
+            self.projections['xy'] = np.fmax(self.projections['xy'], counts)
+            self.completed.append(index)
+        self.projections['xz'][index] = counts.max(axis=0)
+        self.projections['yz'][index] = counts.max(axis=1)
+        self._save_metadata()
+
+    def _save_metadata(self):
+        np.savez(os.path.join(self.directory, 'projections.npz'), **self.projections)
+        metadata = {'x_positions': self.x_positions.tolist(),
+                    'y_positions': self.y_positions.tolist(),
+                    'z_positions': self.z_positions.tolist(),
+                    'parameters': self.parameters,
+                    'completed': self.completed}
+        # write to a new file first, an interruption then never leaves a
+        # broken metadata file behind
+        path = os.path.join(self.directory, self._metadata_file)
+        with open(path + '.tmp', 'w') as metadata_file:
+            json.dump(metadata, metadata_file, indent=1)
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        """ Release the file of the volume. """
+        self.data.flush()
+        self.data = None
@@ -30,6 +30,7 @@ import matplotlib as mpl
 import matplotlib.pyplot as plt
 
 from logic.generic_logic import GenericLogic
+from logic.trace_decimation import DecimationPyramid
 from core.util.mutex import Mutex
 
 
@@ -142,6 +143,13 @@ class WavemeterLoggerLogic(GenericLogic):
         self._recent_wavelength_window = [0, 0]
         self.counts_with_wavelength = []
 
+        # number of stitched samples which are kept at full resolution and
+        # the number of samples which can be displayed at all
+        self._display_length = 10000
+        self._display_history = 1000000
+        self._display_pyramid = DecimationPyramid(
+            self._display_length, channels=3, history=self._display_history)
+
         self._xmin = 650
         self._xmax = 750
         # internal min and max wavelength determined by the measured wavelength
@@ -200,6 +208,25 @@ class WavemeterLoggerLogic(GenericLogic):
         self.hardware_thread.quit()
         self.sig_handle_timer.disconnect()
 
+    def get_display_data(self, max_points=1000):
+        """ Counts versus wavelength reduced to the number of points a plot can show.
+
+        Consecutive samples are combined into blocks. Each block is drawn at its
+        mean wavelength with the minimum and the maximum of its counts.
+
+        @param int max_points: maximum number of returned points
+
+        @return tuple(numpy.ndarray, numpy.ndarray): wavelength in nm and counts/s
+        """
+        block_size, positions, minimum, maximum, mean = self._display_pyramid.get_blocks(
+            max(int(max_points) // 2, 1))
+        if block_size == 1:
+            return mean[2], mean[1]
+        counts = np.empty(2 * len(positions))
+        counts[0::2] = minimum[1]
+        counts[1::2] = maximum[1]
+        return np.repeat(mean[2], 2), counts
+
     def get_max_wavelength(self):
         return self._xmax
 
@@ -250,6 +277,7 @@ class WavemeterLoggerLogic(GenericLogic):
 
             self._recent_wavelength_window = [0, 0]
             self.counts_with_wavelength = []
+            self._display_pyramid.clear()
 
             self.rawhisto = np.zeros(self._bins)
             self.sumhisto = np.ones(self._bins) * 1.0e-10
@@ -328,6 +356,8 @@ class WavemeterLoggerLogic(GenericLogic):
 
         # Add this latest data to the list of counts vs wavelength
         self.counts_with_wavelength += latest_stitched_data.tolist()
+        # time, counts of the first channel and wavelength
+        self._display_pyramid.append(latest_stitched_data[:, :3].transpose())
 
         # The start of the recent data window for the next round will be the end of this one.
         self._recent_wavelength_window[0] = self._recent_wavelength_window[1]
@@ -30,6 +30,13 @@ fi
 jupyter-nbconvert --execute notebooks/debug.ipynb
 jupyter-nbconvert --execute notebooks/matplotlib.ipynb
 
+if ! jupyter-nbconvert --execute notebooks/module_checks.ipynb; then
+    echo "Module checks have failed" >&2
+    jupyter-nbconvert --execute notebooks/shutdown.ipynb
+    print_log
+    exit 1
+fi
+
 
 if ! kill -0 $QUDIPID; then
     echo "Test run has failed: $QUDIPID not here" >&2